@@ -0,0 +1,1455 @@
+"""Asyncio-native serving mode for the healthcare chatbot gateway
+
+Serves the same routes as main.py, but backend calls are awaited on a shared
+non-blocking client instead of pinning a worker thread each. Run with:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+or with several worker processes, as configured by the SERVER_* settings:
+
+    python serve.py --mode asgi
+"""
+import asyncio
+import atexit
+import functools
+import json
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+
+import aiohttp
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse as StarletteJSONResponse
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Match, Route
+
+from gateway.adk import (
+    build_run_payload,
+    build_session_state,
+    session_already_exists,
+    session_creation_failed,
+    session_key,
+)
+from gateway import json_codec, tracing
+from gateway.admission import ADMITTED_ROUTES, AdmissionController, AdmissionRejected, create_admission_store
+from gateway.async_backend_client import AsyncBackendClient
+from gateway.backend_client import session_path
+from gateway.batch import encode_ndjson_async, parse_batch, run_batch_async
+from gateway.circuit_breaker import CircuitBreakerSet, CircuitOpenError
+from gateway.compression import maybe_compress
+from gateway.config import (
+    ADMISSION_BURST,
+    ADMISSION_CONTROL_ENABLED,
+    ADMISSION_LEASE_TTL,
+    ADMISSION_MAX_IN_FLIGHT_PER_SESSION,
+    ADMISSION_MAX_IN_FLIGHT_PER_USER,
+    ADMISSION_RATE,
+    ADMISSION_RETRY_AFTER,
+    ADMISSION_STORE_URL,
+    ASYNC_BACKEND_POOL_SIZE,
+    BACKEND_EJECT_AFTER_FAILURES,
+    BACKEND_HASH_VNODES,
+    BACKEND_KEEP_ALIVE,
+    BACKEND_RETRIES,
+    BACKEND_RETRY_BACKOFF,
+    BACKEND_TIMEOUTS,
+    BACKEND_URL,
+    BACKEND_URLS,
+    BATCH_DEFAULT_CONCURRENCY,
+    BATCH_MAX_CONCURRENCY,
+    BATCH_MAX_ITEMS,
+    CIRCUIT_BREAKER_RESET_TIMEOUT,
+    CIRCUIT_BREAKER_THRESHOLDS,
+    COMPRESSION_LEVELS,
+    COMPRESSION_MIN_SIZE,
+    DEFAULT_APP_NAME,
+    DEFAULT_USER_ID,
+    HEALTH_PROBE_INTERVAL,
+    HEALTH_PROBE_MAX_BACKOFF,
+    JSON_ENCODER,
+    LOG_ASYNC,
+    LOG_CHAT_TEXT,
+    LOG_CHAT_TEXT_SAMPLE_RATE,
+    LOG_FORMAT,
+    LOG_LEVEL,
+    LOG_MAX_BUFFER,
+    PROFILING_ENABLED,
+    PROFILING_MAX_SECONDS,
+    PROFILING_SAMPLE_INTERVAL,
+    PROFILING_TOP,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_MAX_SIZE,
+    RESPONSE_CACHE_TTL,
+    RUN_BODY_CHUNK_SIZE,
+    SESSION_POOL_ENABLED,
+    SESSION_POOL_MAX_IDLE,
+    SESSION_POOL_REFILL_CONCURRENCY,
+    SESSION_POOL_REFILL_INTERVAL,
+    SESSION_POOL_SIZE,
+    SESSION_QUEUE_DEDUP_WINDOW,
+    SESSION_QUEUE_MAX_DEPTH,
+    SESSION_QUEUE_TIMEOUT,
+    SESSION_REGISTRY_MAX_SIZE,
+    SESSION_REGISTRY_TTL,
+    SESSION_REGISTRY_URL,
+    TRACING_ENABLED,
+    TRACING_EXPORT_PATH,
+    TRACING_MAX_TRACES,
+    TRACING_SAMPLE_RATE,
+    TRAFFIC_CAPTURE_CHAT_TEXT,
+    TRAFFIC_CAPTURE_ENABLED,
+    TRAFFIC_CAPTURE_FLUSH_INTERVAL,
+    TRAFFIC_CAPTURE_MAX_BUFFER,
+    TRAFFIC_CAPTURE_PATH,
+    UI_ASSET_CACHE_CONTROL,
+    UI_INLINE_ASSETS,
+    UI_PAGE_CACHE_CONTROL,
+    settings,
+)
+from gateway.events import StreamingTextExtractor, summarize_run_body_async
+from gateway.health import BackendHealthProber
+from gateway.log_pipeline import configure_logging
+from gateway.metrics import (
+    ADMISSION_REJECTIONS,
+    CHAT_EVENTS,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    HTTP_IN_FLIGHT,
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS,
+    REGISTRY as METRICS,
+    route_label,
+)
+from gateway.profiler import Profiler, ProfilerBusy
+from gateway.replicas import AsyncBackendReplicaSet
+from gateway.response_cache import ResponseCache
+from gateway.session_pool import SessionPool
+from gateway.session_queue import AsyncSessionQueue, SessionBusyError
+from gateway.session_registry import RegistryFullError, create_session_registry
+from gateway.sse import SSEParser, format_sse
+from gateway.static_assets import StaticUI
+from gateway.tracing import TRACED_ROUTES, InMemoryCollector, JSONLTraceExporter, Tracer
+from gateway.traffic_capture import BufferedJSONLWriter, TrafficCapture
+
+# Structured logging, written out by a background thread
+log_pipeline = configure_logging(
+    LOG_LEVEL,
+    LOG_FORMAT,
+    async_=LOG_ASYNC,
+    max_buffer=LOG_MAX_BUFFER,
+    chat_text=LOG_CHAT_TEXT,
+    sample_rate=LOG_CHAT_TEXT_SAMPLE_RATE,
+)
+atexit.register(log_pipeline.stop)
+logger = logging.getLogger(__name__)
+
+json_codec.use(JSON_ENCODER)
+
+
+class JSONResponse(StarletteJSONResponse):
+    """JSONResponse through the gateway's JSON codec (orjson when installed)"""
+
+    def render(self, content):
+        trace_id = tracing.current_trace_id()
+        if trace_id and isinstance(content, dict):
+            # Echo the request's trace ID in every JSON answer of a traced route
+            content = {**content, "trace_id": trace_id}
+        return json_codec.dumps(content)
+
+# Chat UI page and assets, rendered and compressed once at startup
+ui = StaticUI(
+    Path(__file__).parent / 'templates' / 'index.html',
+    Path(__file__).parent / 'static',
+    inline_assets=UI_INLINE_ASSETS,
+    page_cache_control=UI_PAGE_CACHE_CONTROL,
+    asset_cache_control=UI_ASSET_CACHE_CONTROL,
+)
+
+def create_backend_client(url, replica=None):
+    """Non-blocking connection pool for one backend, with per-route circuit breakers"""
+    return AsyncBackendClient(
+        url,
+        pool_size=ASYNC_BACKEND_POOL_SIZE,
+        keep_alive=BACKEND_KEEP_ALIVE,
+        timeouts=BACKEND_TIMEOUTS,
+        retries=BACKEND_RETRIES,
+        backoff_factor=BACKEND_RETRY_BACKOFF,
+        breakers=CircuitBreakerSet(CIRCUIT_BREAKER_THRESHOLDS, reset_timeout=CIRCUIT_BREAKER_RESET_TIMEOUT),
+        replica=replica,
+    )
+
+
+# With several replicas, each session sticks to one of them (each replica
+# is health-probed by a task started in the lifespan)
+backend_replicas = AsyncBackendReplicaSet(
+    [create_backend_client(url, replica=url) for url in BACKEND_URLS],
+    session_state=build_session_state,
+    vnodes=BACKEND_HASH_VNODES,
+    probe_interval=HEALTH_PROBE_INTERVAL,
+    probe_max_backoff=HEALTH_PROBE_MAX_BACKOFF,
+    eject_after=BACKEND_EJECT_AFTER_FAILURES,
+) if len(BACKEND_URLS) > 1 else None
+
+# Shared non-blocking backend connection pool, or the replicas behind the same interface
+backend = backend_replicas or create_backend_client(BACKEND_URL)
+# Connection errors name the configured backend(s)
+BACKEND_UNREACHABLE = f"Cannot connect to backend - ensure it's running at {', '.join(BACKEND_URLS)}"
+
+async def _probe_backend():
+    response = await backend.list_apps()
+    if response.status_code != 200:
+        raise RuntimeError(f"Backend returned status {response.status_code}")
+
+
+# Backend health is refreshed in the background; /health only reads the cache.
+# Replicas are each probed already, and their set reports the overall health.
+health_prober = BackendHealthProber(
+    _probe_backend,
+    interval=HEALTH_PROBE_INTERVAL,
+    max_backoff=HEALTH_PROBE_MAX_BACKOFF,
+) if not backend_replicas else None
+
+# Track created sessions to avoid duplicate creation (bounded, TTL-evicting)
+created_sessions = create_session_registry(
+    SESSION_REGISTRY_URL,
+    max_size=SESSION_REGISTRY_MAX_SIZE,
+    ttl=SESSION_REGISTRY_TTL,
+)
+
+async def _create_pooled_session(session_id):
+    return await backend.create_session(
+        DEFAULT_APP_NAME, DEFAULT_USER_ID, session_id, build_session_state(DEFAULT_APP_NAME, DEFAULT_USER_ID)
+    )
+
+
+async def _delete_pooled_session(session_id):
+    return await backend.delete_session(DEFAULT_APP_NAME, DEFAULT_USER_ID, session_id)
+
+
+# Opt-in pool of pre-created sessions that new conversations are bound to
+# (refilled by a task started in the lifespan)
+session_pool = SessionPool(
+    DEFAULT_APP_NAME,
+    DEFAULT_USER_ID,
+    create=_create_pooled_session,
+    delete=_delete_pooled_session,
+    size=SESSION_POOL_SIZE,
+    max_idle=SESSION_POOL_MAX_IDLE,
+    concurrency=SESSION_POOL_REFILL_CONCURRENCY,
+    refill_interval=SESSION_POOL_REFILL_INTERVAL,
+) if SESSION_POOL_ENABLED else None
+# Two first turns of one conversation must not be bound to two pooled
+# sessions, even while a SQLite registry lookup is awaited
+session_binding_lock = asyncio.Lock()
+
+# Chat turns run one at a time per session; resends with the same Idempotency-Key share an answer
+session_queue = AsyncSessionQueue(dedup_window=SESSION_QUEUE_DEDUP_WINDOW, max_depth=SESSION_QUEUE_MAX_DEPTH)
+
+# Opt-in cache of answers to the first question of a conversation
+response_cache = ResponseCache(
+    create_session_registry(
+        SESSION_REGISTRY_URL,
+        max_size=SESSION_REGISTRY_MAX_SIZE,
+        ttl=SESSION_REGISTRY_TTL,
+        name='conversations',
+    ),
+    max_size=RESPONSE_CACHE_MAX_SIZE,
+    ttl=RESPONSE_CACHE_TTL,
+) if RESPONSE_CACHE_ENABLED else None
+
+# Opt-in capture of session and chat requests for benchmarks/replay.py
+traffic_capture = TrafficCapture(
+    BufferedJSONLWriter(
+        TRAFFIC_CAPTURE_PATH,
+        max_buffer=TRAFFIC_CAPTURE_MAX_BUFFER,
+        flush_interval=TRAFFIC_CAPTURE_FLUSH_INTERVAL,
+    ),
+    chat_text=TRAFFIC_CAPTURE_CHAT_TEXT,
+) if TRAFFIC_CAPTURE_ENABLED else None
+
+# Per-stage tracing of session and chat requests, kept for /debug/traces
+trace_collector = InMemoryCollector(TRACING_MAX_TRACES)
+trace_exporter = JSONLTraceExporter(BufferedJSONLWriter(TRACING_EXPORT_PATH)) if TRACING_EXPORT_PATH else None
+tracer = Tracer(
+    [trace_collector, *([trace_exporter] if trace_exporter else [])],
+    sample_rate=TRACING_SAMPLE_RATE,
+) if TRACING_ENABLED else None
+
+# Opt-in sampling profiler behind /debug/profile
+profiler = Profiler(
+    interval=PROFILING_SAMPLE_INTERVAL,
+    max_seconds=PROFILING_MAX_SECONDS,
+    top=PROFILING_TOP,
+) if PROFILING_ENABLED else None
+
+# Opt-in per-user rate limit and per-user/per-session in-flight caps
+admission = AdmissionController(
+    create_admission_store(ADMISSION_STORE_URL, lease_ttl=ADMISSION_LEASE_TTL),
+    rate=ADMISSION_RATE,
+    burst=ADMISSION_BURST,
+    max_in_flight_per_user=ADMISSION_MAX_IN_FLIGHT_PER_USER,
+    max_in_flight_per_session=ADMISSION_MAX_IN_FLIGHT_PER_SESSION,
+    concurrency_retry_after=ADMISSION_RETRY_AFTER,
+) if ADMISSION_CONTROL_ENABLED else None
+
+async def ensure_backend_session(app_name, user_id, session_id):
+    """Create the backend session on a registry miss
+
+    Returns (creation, backend_session_id). ``creation`` is the backend
+    response of the creation call (shared by concurrent callers for the same
+    session through the client's single-flight; for a pooled session, the
+    response that pre-created it), or None if the session was already known.
+    ``backend_session_id`` is the ID the backend knows the session by:
+    ``session_id`` itself unless it was bound to a pooled session.
+    """
+    key = session_key(app_name, user_id, session_id)
+    bound = await off_loop(created_sessions, created_sessions.get, key)
+    if bound is not None:
+        return None, bound or session_id
+
+    if session_pool and session_pool.serves(app_name, user_id):
+        async with session_binding_lock:
+            bound = await off_loop(created_sessions, created_sessions.get, key)
+            if bound is not None:
+                return None, bound or session_id
+            pooled = session_pool.take()
+            if pooled is not None:
+                try:
+                    await off_loop(created_sessions, created_sessions.add, key, pooled.session_id)
+                except RegistryFullError as e:
+                    # Evicting a binding would cut a live conversation off its history; a
+                    # session of the conversation's own ID needs no binding
+                    logger.warning("Not binding session to a pre-created one: %s", e, extra={"session_id": session_id})
+                    session_pool.give_back(pooled)
+                    pooled = None
+        if pooled is not None:
+            logger.info("Bound session to a pre-created one",
+                        extra={"session_id": session_id, "backend_session_id": pooled.session_id})
+            if response_cache:
+                await off_loop(response_cache.conversations, response_cache.record_new_session, key)
+            return pooled.response, pooled.session_id
+
+    logger.info("Creating session", extra={"app_name": app_name, "user_id": user_id, "session_id": session_id})
+
+    # Create session with the backend using official docs format; the span
+    # includes waiting for a concurrent creation of the same session
+    with tracing.span('ensure_session'):
+        response = await backend.create_session(
+            app_name, user_id, session_id, build_session_state(app_name, user_id)
+        )
+    if response.status_code == 200 or session_already_exists(response):
+        # Mark session as created
+        await off_loop(created_sessions, created_sessions.add, key)
+    if response.status_code == 200 and response_cache:
+        await off_loop(response_cache.conversations, response_cache.record_new_session, key)
+    return response, session_id
+
+
+async def send_pending_turn(app_name, user_id, backend_session_id, key):
+    """Send the agent the first turn of a conversation that the response cache answered
+
+    The question goes to the backend as it was asked, ahead of the
+    conversation's next one, so that the session holds every turn. Returns
+    (status code, detail) if the backend failed, else None.
+    """
+    if not response_cache:
+        return None
+    question = await off_loop(response_cache.conversations, response_cache.pending_turn, key)
+    if question is None:
+        return None
+    with tracing.span('pending_turn'):
+        async with backend.run_stream(build_run_payload(app_name, user_id, backend_session_id, question)) as response:
+            if response.status != 200:
+                return response.status, await response.text()
+            await summarize_run_body_async(response.content.iter_chunked(RUN_BODY_CHUNK_SIZE))
+    await off_loop(response_cache.conversations, response_cache.record_turn, key)
+    return None
+
+
+async def cache_lookup(app_name, key, message):
+    """(cache_key, cached answer) of a turn from the response cache, (None, None) if it is off"""
+    if not response_cache:
+        return None, None
+    return await off_loop(response_cache.conversations, response_cache.lookup, app_name, key, message)
+
+
+async def off_loop(store, call, *args):
+    """``call(*args)``, on a worker thread if ``store`` is blocking (SQLite waits for other workers' locks)"""
+    if store.blocking:
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(call, *args))
+    return call(*args)
+
+
+async def _get_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return {}
+
+
+def circuit_open_response(error):
+    """Fail fast while the backend's circuit is open"""
+    logger.warning("%s", error)
+    return JSONResponse({
+        "success": False,
+        "error": "Backend temporarily unavailable - circuit open",
+        "retry_after": error.retry_after_header
+    }, status_code=503, headers={"Retry-After": error.retry_after_header})
+
+
+def session_busy_response(error):
+    """Turn away a chat turn that cannot wait for its session any longer"""
+    logger.warning("%s", error)
+    return JSONResponse({
+        "success": False,
+        "error": "Session busy - earlier messages are still being answered",
+        "retry_after": error.retry_after_header
+    }, status_code=429, headers={"Retry-After": error.retry_after_header})
+
+
+class TurnStreamingResponse(StreamingResponse):
+    """StreamingResponse that frees its session turn once sent, or once the client has gone"""
+
+    def __init__(self, content, turn, **kwargs):
+        super().__init__(content, **kwargs)
+        self.turn = turn
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.turn.release()
+
+
+def admission_rejected_response(error):
+    """Turn away a request over its user's or session's limits"""
+    return JSONResponse({
+        "success": False,
+        "error": f"Too many requests ({error.reason.replace('_', ' ')})",
+        "retry_after": error.retry_after_header
+    }, status_code=429, headers={"Retry-After": error.retry_after_header})
+
+
+async def index(request):
+    """Serve the chatbot HTML interface"""
+    return static_response(request, ui.page)
+
+
+async def static_asset(request):
+    """Serve the chatbot CSS/JS"""
+    asset = ui.asset(request.path_params['filename'])
+    if asset is None:
+        return PlainTextResponse('Not Found', status_code=404)
+    return static_response(request, asset)
+
+
+def static_response(request, asset):
+    status, headers, body = asset.respond(
+        request.headers.get('accept-encoding'), request.headers.get('if-none-match')
+    )
+    return Response(body, status_code=status, headers=headers)
+
+
+async def health_check(request):
+    """Health check endpoint (answers from the background prober's cached status)"""
+    backend_status = health_prober.snapshot() if health_prober else backend_replicas.status()
+
+    return JSONResponse({
+        "status": (
+            "starting" if backend_status["checked_at"] is None
+            else "healthy" if backend_status["backend_connected"]
+            else "backend_unavailable"
+        ),
+        **backend_status,
+        "circuit_breakers": backend.breakers.snapshot(),
+        "replicas": backend_replicas.snapshot() if backend_replicas else None,
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+async def create_session(request):
+    """Create a session with the backend following official documentation"""
+    try:
+        data = await _get_json(request)
+        app_name = data.get('app_name', DEFAULT_APP_NAME)
+        user_id = data.get('user_id', DEFAULT_USER_ID)
+        session_id = data.get('session_id')
+
+        if not session_id:
+            return JSONResponse({
+                "success": False,
+                "error": "Session ID is required"
+            }, status_code=400)
+
+        response, backend_session_id = await ensure_backend_session(app_name, user_id, session_id)
+
+        # Check if session already created to avoid duplicates
+        if response is None or session_already_exists(response):
+            logger.info("Session already exists", extra={"session_id": session_id})
+            return JSONResponse({
+                "success": True,
+                "session_id": session_id,
+                "message": "Session already exists"
+            })
+
+        if response.status_code == 200:
+            logger.info("Session created successfully", extra={"session_id": session_id})
+            return JSONResponse({
+                "success": True,
+                "session_id": session_id,
+                "backend_session_id": backend_session_id,
+                "message": "Session created successfully",
+                "session_data": response.json()
+            })
+        else:
+            logger.error("Failed to create session: backend returned %s", response.status_code,
+                         extra={"session_id": session_id, "detail": response.text})
+            return JSONResponse({
+                "success": False,
+                "error": f"Backend returned status {response.status_code}",
+                "detail": response.text
+            }, status_code=400)
+
+    except asyncio.TimeoutError:
+        logger.error("Timeout creating session")
+        return JSONResponse({
+            "success": False,
+            "error": "Request timeout - backend may be slow or unavailable"
+        }, status_code=504)
+
+    except aiohttp.ClientError:
+        logger.error("Connection error creating session")
+        return JSONResponse({
+            "success": False,
+            "error": BACKEND_UNREACHABLE
+        }, status_code=503)
+
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
+
+    except Exception as e:
+        logger.error("Error creating session: %s", e)
+        return JSONResponse({
+            "success": False,
+            "error": "Internal server error",
+            "detail": str(e)
+        }, status_code=500)
+
+
+async def chat(request):
+    """Send a message to the healthcare assistant using /run endpoint"""
+    try:
+        data = await _get_json(request)
+        app_name = data.get('app_name', DEFAULT_APP_NAME)
+        user_id = data.get('user_id', DEFAULT_USER_ID)
+        session_id = data.get('session_id')
+        message = data.get('message', '')
+
+        if not message.strip():
+            return JSONResponse({
+                "success": False,
+                "error": "Message cannot be empty"
+            }, status_code=400)
+
+        if not session_id:
+            return JSONResponse({
+                "success": False,
+                "error": "Session ID is required"
+            }, status_code=400)
+
+        # Turns of one session reach the backend one at a time, in order
+        key = session_key(app_name, user_id, session_id)
+        with tracing.span('session_queue'):
+            turn = await session_queue.enter(key, request.headers.get('idempotency-key'), timeout=SESSION_QUEUE_TIMEOUT)
+        try:
+            if turn.deduplicated:
+                logger.info("Answered a retried request with its earlier answer", extra={"session_id": session_id})
+                return JSONResponse({**turn.result, "deduplicated": True})
+
+            # Create the session on first use so clients can skip /create_session
+            creation, backend_session_id = await ensure_backend_session(app_name, user_id, session_id)
+            if session_creation_failed(creation):
+                logger.error("Failed to create session: backend returned %s", creation.status_code,
+                             extra={"session_id": session_id, "detail": creation.text})
+                return JSONResponse({
+                    "success": False,
+                    "error": f"Failed to create session: backend returned status {creation.status_code}",
+                    "detail": creation.text
+                }, status_code=400)
+
+            # A repeated first question in a new session can be answered without calling the agent
+            cache_key, cached = await cache_lookup(app_name, key, message)
+            if cached is not None:
+                logger.info("Answered from response cache", extra={"session_id": session_id})
+                turn.result = {
+                    "success": True,
+                    "response": cached["response"],
+                    "session_id": session_id,
+                    "session_created": creation is not None,
+                    "cached": True,
+                    "events_count": cached["events_count"]
+                }
+                return JSONResponse(turn.result)
+
+            failed = await send_pending_turn(app_name, user_id, backend_session_id, key)
+            if failed:
+                logger.error("Backend error: %s", failed[0], extra={"session_id": session_id, "detail": failed[1]})
+                return JSONResponse({
+                    "success": False,
+                    "error": f"Backend error: {failed[0]}",
+                    "detail": failed[1]
+                }, status_code=400)
+
+            logger.info("Sending message", extra={"session_id": session_id, "chat_message": message})
+
+            # Send to backend /run endpoint without blocking the event loop, parsing
+            # the events one at a time as the body arrives instead of the whole trace
+            payload = build_run_payload(app_name, user_id, backend_session_id, message)
+            async with backend.run_stream(payload) as response:
+                if response.status == 200:
+                    with tracing.span('parse_run_body'):
+                        summary = await summarize_run_body_async(response.content.iter_chunked(RUN_BODY_CHUNK_SIZE))
+                else:
+                    detail = await response.text()
+
+            if response.status == 200:
+                ai_response = summary.response()
+
+                logger.info("AI response", extra={"session_id": session_id, "chat_response": ai_response})
+
+                events_count = summary.events_count
+                CHAT_EVENTS.observe(events_count, 'chat')
+                if response_cache:
+                    # Only cache real model answers, not tool-call or error fallbacks
+                    answer = {"response": ai_response, "events_count": events_count}
+                    await off_loop(response_cache.conversations, response_cache.record_turn,
+                                   key, cache_key, answer if summary.texts else None)
+
+                turn.result = {
+                    "success": True,
+                    "response": ai_response,
+                    "session_id": session_id,
+                    "session_created": creation is not None,
+                    "cached": False,
+                    "events_count": events_count
+                }
+                return JSONResponse(turn.result)
+            else:
+                logger.error("Backend error: %s", response.status, extra={"session_id": session_id, "detail": detail})
+                return JSONResponse({
+                    "success": False,
+                    "error": f"Backend error: {response.status}",
+                    "detail": detail
+                }, status_code=400)
+        finally:
+            turn.release()
+
+    except asyncio.TimeoutError:
+        logger.error("Timeout sending message")
+        return JSONResponse({
+            "success": False,
+            "error": "Request timeout - the AI is taking too long to respond"
+        }, status_code=504)
+
+    except aiohttp.ClientError:
+        logger.error("Connection error sending message")
+        return JSONResponse({
+            "success": False,
+            "error": BACKEND_UNREACHABLE
+        }, status_code=503)
+
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
+
+    except SessionBusyError as e:
+        return session_busy_response(e)
+
+    except Exception as e:
+        logger.error("Error sending message: %s", e)
+        return JSONResponse({
+            "success": False,
+            "error": "Internal server error",
+            "detail": str(e)
+        }, status_code=500)
+
+
+async def chat_stream(request):
+    """Stream the assistant's answer as it is generated using /run_sse endpoint"""
+    data = await _get_json(request)
+    app_name = data.get('app_name', DEFAULT_APP_NAME)
+    user_id = data.get('user_id', DEFAULT_USER_ID)
+    session_id = data.get('session_id')
+    message = data.get('message', '')
+
+    if not message.strip():
+        return JSONResponse({
+            "success": False,
+            "error": "Message cannot be empty"
+        }, status_code=400)
+
+    if not session_id:
+        return JSONResponse({
+            "success": False,
+            "error": "Session ID is required"
+        }, status_code=400)
+
+    # The done frame echoes the request's trace ID, as JSON answers do
+    trace_id = tracing.current_trace_id()
+    trace_echo = {"trace_id": trace_id} if trace_id else {}
+
+    # Turns of one session reach the backend one at a time, in order
+    key = session_key(app_name, user_id, session_id)
+    try:
+        with tracing.span('session_queue'):
+            turn = await session_queue.enter(key, request.headers.get('idempotency-key'), timeout=SESSION_QUEUE_TIMEOUT)
+    except SessionBusyError as e:
+        return session_busy_response(e)
+
+    if turn.deduplicated:
+        logger.info("Answered a retried request with its earlier answer", extra={"session_id": session_id})
+        return StreamingResponse(
+            iter([
+            format_sse({"type": "delta", "text": turn.result["response"]}),
+            format_sse({"type": "done", **turn.result, "deduplicated": True, **trace_echo})
+            ]),
+            media_type='text/event-stream',
+            headers={'Cache-Control': 'no-cache'}
+        )
+
+    # Until the stream takes the turn over, every way out of here releases it
+    stream = None
+    try:
+        # Create the session on first use, before the stream starts, so that
+        # failures still get a regular HTTP error status
+        try:
+            creation, backend_session_id = await ensure_backend_session(app_name, user_id, session_id)
+            # A repeated first question in a new session can be answered without calling the agent
+            cache_key, cached = await cache_lookup(app_name, key, message)
+            if cached is None:
+                backend.for_session(app_name, user_id, backend_session_id).breakers.for_route('run_sse').check()
+        except CircuitOpenError as e:
+            return circuit_open_response(e)
+        except asyncio.TimeoutError:
+            logger.error("Timeout creating session")
+            return JSONResponse({
+                "success": False,
+                "error": "Request timeout - backend may be slow or unavailable"
+            }, status_code=504)
+        except aiohttp.ClientError:
+            logger.error("Connection error creating session")
+            return JSONResponse({
+                "success": False,
+                "error": BACKEND_UNREACHABLE
+            }, status_code=503)
+        except Exception as e:
+            logger.error("Error creating session: %s", e)
+            return JSONResponse({
+                "success": False,
+                "error": "Internal server error",
+                "detail": str(e)
+            }, status_code=500)
+        if session_creation_failed(creation):
+            logger.error("Failed to create session: backend returned %s", creation.status_code,
+                         extra={"session_id": session_id, "detail": creation.text})
+            return JSONResponse({
+                "success": False,
+                "error": f"Failed to create session: backend returned status {creation.status_code}",
+                "detail": creation.text
+            }, status_code=400)
+
+        if cached is not None:
+            logger.info("Answered from response cache", extra={"session_id": session_id})
+            turn.result = {
+                "success": True,
+                "response": cached["response"],
+                "session_id": session_id,
+                "session_created": creation is not None,
+                "cached": True,
+                "events_count": cached["events_count"]
+            }
+            return StreamingResponse(
+                iter([
+                format_sse({"type": "delta", "text": cached["response"]}),
+                format_sse({"type": "done", **turn.result, **trace_echo})
+                ]),
+                media_type='text/event-stream',
+                headers={'Cache-Control': 'no-cache'}
+            )
+
+        logger.info("Streaming message", extra={"session_id": session_id, "chat_message": message})
+
+        payload = build_run_payload(app_name, user_id, backend_session_id, message)
+        payload["streaming"] = True
+
+        async def generate():
+            extractor = StreamingTextExtractor()
+            parser = SSEParser()
+            try:
+                failed = await send_pending_turn(app_name, user_id, backend_session_id, key)
+                if failed:
+                    logger.error("Backend error: %s", failed[0], extra={"session_id": session_id, "detail": failed[1]})
+                    yield format_sse({
+                        "type": "error",
+                        "error": f"Backend error: {failed[0]}",
+                        "detail": failed[1]
+                    })
+                    return
+
+                async with backend.run_sse(payload) as response:
+                    if response.status != 200:
+                        detail = await response.text()
+                        logger.error("Backend error: %s", response.status,
+                                     extra={"session_id": session_id, "detail": detail})
+                        yield format_sse({
+                            "type": "error",
+                            "error": f"Backend error: {response.status}",
+                            "detail": detail
+                        })
+                        return
+
+                    # Forward text as soon as each backend event arrives
+                    with tracing.span('relay_stream') as relay:
+                        async for chunk in response.content.iter_any():
+                            for event_data in parser.feed(chunk):
+                                event = json.loads(event_data)
+                                if isinstance(event, dict) and 'error' in event:
+                                    yield format_sse({"type": "error", "error": event['error']})
+                                    return
+                                delta = extractor.feed(event)
+                                if delta:
+                                    yield format_sse({"type": "delta", "text": delta})
+                        relay.set('events', extractor.events_count)
+
+                summary = extractor.summary()
+                ai_response = summary.response()
+                CHAT_EVENTS.observe(extractor.events_count, 'chat_stream')
+                if response_cache:
+                    # Only cache real model answers, not tool-call or error fallbacks
+                    answer = {"response": ai_response, "events_count": extractor.events_count}
+                    await off_loop(response_cache.conversations, response_cache.record_turn,
+                                   key, cache_key, answer if summary.texts else None)
+
+                turn.result = {
+                    "success": True,
+                    "response": ai_response,
+                    "session_id": session_id,
+                    "session_created": creation is not None,
+                    "cached": False,
+                    "events_count": extractor.events_count
+                }
+                turn.release()
+                yield format_sse({"type": "done", **turn.result, **trace_echo})
+
+            except asyncio.TimeoutError:
+                logger.error("Timeout streaming message")
+                yield format_sse({
+                    "type": "error",
+                    "error": "Request timeout - the AI is taking too long to respond"
+                })
+
+            except aiohttp.ClientError:
+                logger.error("Connection error streaming message")
+                yield format_sse({
+                    "type": "error",
+                    "error": BACKEND_UNREACHABLE
+                })
+
+            except CircuitOpenError as e:
+                logger.warning("%s", e)
+                yield format_sse({
+                    "type": "error",
+                    "error": "Backend temporarily unavailable - circuit open",
+                    "retry_after": e.retry_after_header
+                })
+
+            except Exception as e:
+                logger.error("Error streaming message: %s", e)
+                yield format_sse({
+                    "type": "error",
+                    "error": "Internal server error",
+                    "detail": str(e)
+                })
+
+        stream = TurnStreamingResponse(
+            generate(),
+            turn,
+            media_type='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'  # Stop reverse proxies from buffering the stream
+            }
+        )
+        return stream
+    finally:
+        if stream is None:
+            turn.release()
+
+
+async def _create_batch_session(item):
+    creation, item.backend_session_id = await ensure_backend_session(item.app_name, item.user_id, item.session_id)
+    if session_creation_failed(creation):
+        return item.result(
+            False,
+            error=f"Failed to create session: backend returned status {creation.status_code}",
+            detail=creation.text
+        )
+    return None
+
+
+async def _answer_batch_item(item):
+    key = session_key(item.app_name, item.user_id, item.session_id)
+    turn = await session_queue.enter(key, timeout=SESSION_QUEUE_TIMEOUT)
+    payload = build_run_payload(item.app_name, item.user_id, item.backend_session_id, item.message)
+    try:
+        failed = await send_pending_turn(item.app_name, item.user_id, item.backend_session_id, key)
+        if failed:
+            return item.result(False, error=f"Backend error: {failed[0]}", detail=failed[1])
+        async with backend.run_stream(payload) as response:
+            if response.status != 200:
+                return item.result(False, error=f"Backend error: {response.status}", detail=await response.text())
+            summary = await summarize_run_body_async(response.content.iter_chunked(RUN_BODY_CHUNK_SIZE))
+        if response_cache:
+            await off_loop(response_cache.conversations, response_cache.record_turn, key)
+    finally:
+        turn.release()
+    CHAT_EVENTS.observe(summary.events_count, 'chat_batch')
+    return item.result(True, response=summary.response(), events_count=summary.events_count)
+
+
+async def chat_batch(request):
+    """Answer a JSONL body of questions, streaming NDJSON results as each completes
+
+    Query parameters: concurrency (questions answered at once) and batch_id
+    (names the sessions of questions without a session_id).
+    """
+    body = await request.body()
+    if body.count(b'\n') >= BATCH_MAX_ITEMS:
+        return JSONResponse({
+            "success": False,
+            "error": f"Too many questions - at most {BATCH_MAX_ITEMS} per batch"
+        }, status_code=413)
+
+    try:
+        concurrency = int(request.query_params.get('concurrency', BATCH_DEFAULT_CONCURRENCY))
+    except ValueError:
+        concurrency = BATCH_DEFAULT_CONCURRENCY
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+    batch_id = request.query_params.get('batch_id') or uuid.uuid4().hex[:12]
+    logger.info("Starting batch", extra={"batch_id": batch_id, "concurrency": concurrency})
+
+    items = parse_batch(body, batch_id, DEFAULT_APP_NAME, DEFAULT_USER_ID)
+    results = run_batch_async(items, _create_batch_session, _answer_batch_item, concurrency)
+    return StreamingResponse(
+        encode_ndjson_async(results),
+        media_type='application/x-ndjson',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+async def debug_backend_status(request):
+    """Debug endpoint to check backend connectivity"""
+    try:
+        # Test basic connectivity
+        response = await backend.list_apps()
+
+        return JSONResponse({
+            "backend_url": backend.base_url,
+            "status_code": response.status_code,
+            "response": response.json() if response.status_code == 200 else response.text,
+            "connected": response.status_code == 200,
+            "singleflight": backend.singleflight.stats(),
+            "circuit_breakers": backend.breakers.snapshot()
+        })
+    except Exception as e:
+        return JSONResponse({
+            "backend_url": backend.base_url,
+            "error": str(e),
+            "connected": False,
+            "circuit_breakers": backend.breakers.snapshot()
+        })
+
+
+async def debug_test_session_creation(request):
+    """Test session creation endpoint directly"""
+    try:
+        test_session_id = f"debug_session_{int(datetime.now().timestamp())}"
+        session_client = backend.for_session(DEFAULT_APP_NAME, DEFAULT_USER_ID, test_session_id)
+        session_url = session_client.url(session_path(DEFAULT_APP_NAME, DEFAULT_USER_ID, test_session_id))
+
+        session_data = {
+            "state": {
+                "test": True,
+                "created_at": datetime.now().isoformat()
+            }
+        }
+
+        response = await backend.create_session(
+            DEFAULT_APP_NAME,
+            DEFAULT_USER_ID,
+            test_session_id,
+            session_data["state"]
+        )
+
+        return JSONResponse({
+            "session_url": session_url,
+            "session_data": session_data,
+            "status_code": response.status_code,
+            "response": response.json() if response.status_code == 200 else response.text,
+            "success": response.status_code == 200
+        })
+    except Exception as e:
+        return JSONResponse({
+            "error": str(e),
+            "success": False
+        })
+
+
+async def debug_test_run(request):
+    """Test the /run endpoint directly"""
+    try:
+        test_payload = build_run_payload(
+            DEFAULT_APP_NAME,
+            DEFAULT_USER_ID,
+            "debug_session_123",
+            "Hello, this is a test message"
+        )
+
+        response = await backend.run(test_payload)
+
+        return JSONResponse({
+            "test_payload": test_payload,
+            "status_code": response.status_code,
+            "response": response.json() if response.status_code == 200 else response.text,
+            "success": response.status_code == 200
+        })
+    except Exception as e:
+        return JSONResponse({
+            "error": str(e),
+            "success": False
+        })
+
+
+async def debug_sessions(request):
+    """Show created sessions, one page at a time (?cursor=...&limit=...), and the session pool"""
+    try:
+        limit = min(int(request.query_params.get('limit', 100)), 1000)
+    except ValueError:
+        limit = 100
+
+    def registry_page():
+        keys, next_cursor = created_sessions.page(request.query_params.get('cursor'), limit)
+        return keys, next_cursor, len(created_sessions), created_sessions.stats()
+
+    keys, next_cursor, count, stats = await off_loop(created_sessions, registry_page)
+    return JSONResponse({
+        "created_sessions": keys,
+        "count": count,
+        "next_cursor": next_cursor,
+        "registry": stats,
+        "queue": session_queue.stats(),
+        "pool": session_pool.stats() if session_pool else None
+    })
+
+
+async def debug_cache(request):
+    """Show response cache hit/miss counters"""
+    return JSONResponse({
+        "enabled": response_cache is not None,
+        "stats": response_cache.stats() if response_cache else None
+    })
+
+
+async def debug_admission(request):
+    """Show admission control limits, admitted/rejected counters and store usage"""
+    return JSONResponse({
+        "enabled": admission is not None,
+        "stats": await off_loop(admission.store, admission.stats) if admission else None
+    })
+
+
+async def debug_capture(request):
+    """Show traffic capture counters (records written, dropped, pending)"""
+    return JSONResponse({
+        "enabled": traffic_capture is not None,
+        "stats": traffic_capture.stats() if traffic_capture else None
+    })
+
+
+async def debug_config(request):
+    """Show the effective settings and where each came from (env, file or default)"""
+    return JSONResponse({**settings.snapshot(), "logging": log_pipeline.stats()})
+
+
+async def debug_traces(request):
+    """Show the slowest recent traces with their per-stage breakdown
+
+    ``?route=POST /chat`` keeps one route, ``?limit=`` caps the list and
+    ``?trace_id=`` looks up a single trace instead.
+    """
+    if tracer is None:
+        return JSONResponse({"enabled": False, "traces": []})
+    trace_id = request.query_params.get('trace_id')
+    if trace_id:
+        traces = trace_collector.get(trace_id)
+    else:
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            limit = 20
+        traces = trace_collector.slowest(limit, name=request.query_params.get('route'))
+    return JSONResponse({
+        "enabled": True,
+        "sample_rate": tracer.sample_rate,
+        "collector": trace_collector.stats(),
+        "exporter": trace_exporter.stats() if trace_exporter else None,
+        "traces": [trace.to_dict() for trace in traces],
+    })
+
+
+def _query_number(request, name, kind):
+    try:
+        return kind(request.query_params[name])
+    except (KeyError, ValueError):
+        return None
+
+
+async def debug_profile(request):
+    """Profile the gateway for ?seconds=N, or until ?requests=N more requests finish
+
+    Answers with collapsed stacks for a flame graph (only those, as text,
+    with ?format=collapsed), the functions most often on CPU and, with
+    ?memory=1, the allocation sites that grew most (tracemalloc). The event
+    loop keeps serving while the profile runs.
+    """
+    if profiler is None:
+        return JSONResponse({
+            "success": False,
+            "error": "Profiling is disabled - set PROFILING_ENABLED=1"
+        }, status_code=404)
+
+    try:
+        profile = profiler.start(
+            seconds=_query_number(request, 'seconds', float),
+            requests=_query_number(request, 'requests', int),
+            memory=request.query_params.get('memory') in ('1', 'true'),
+            top=_query_number(request, 'top', int),
+        )
+    except ProfilerBusy as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=409)
+
+    result = await asyncio.get_running_loop().run_in_executor(None, profile.wait)
+    if request.query_params.get('format') == 'collapsed':
+        return PlainTextResponse(result["collapsed"])
+    return JSONResponse({"success": True, **result})
+
+
+async def metrics(request):
+    """Prometheus metrics for gateway routes and backend calls"""
+    return Response(METRICS.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    """Record latency, status and in-flight count per route, until the last byte is sent"""
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+
+    def route_label(self, scope):
+        # Label by route template, not raw path, to keep the number of series bounded
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match is not Match.NONE:
+                return route_label(route.path)
+        return 'unmatched'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        route = self.route_label(scope)
+        status = '500'
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = str(message['status'])
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(route)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec(route)
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, route, scope['method'])
+            HTTP_REQUESTS.inc(route, scope['method'], status)
+
+
+class TracingMiddleware:
+    """Trace session and chat requests until the last byte is sent, echoing X-Trace-Id"""
+
+    def __init__(self, app, tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] not in TRACED_ROUTES:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        root = self.tracer.start(
+            f"{scope['method']} {scope['path']}",
+            traceparent=headers.get('traceparent'),
+            trace_id=headers.get('x-trace-id'),
+        )
+        status = 500
+        error = None
+
+        async def send_with_trace_id(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                MutableHeaders(scope=message).append('X-Trace-Id', root.trace.trace_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.tracer.finish(root, status, error=error)
+
+
+class ProfiledRequestsMiddleware:
+    """Count finished requests for ?requests=N profiles, once the last byte is sent"""
+
+    def __init__(self, app, profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] == '/debug/profile':
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.request_finished()
+
+
+class TrafficCaptureMiddleware:
+    """Capture session and chat requests, with their backend calls, once the response is sent"""
+
+    def __init__(self, app, capture):
+        self.app = app
+        self.capture = capture
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.capture.captures(scope['path']):
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        status = 500
+
+        async def receive_and_keep_body():
+            message = await receive()
+            if message['type'] == 'http.request':
+                chunks.append(message.get('body', b''))
+            return message
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        started_at = self.capture.now()
+        start = time.perf_counter()
+        calls = self.capture.start()
+        try:
+            await self.app(scope, receive_and_keep_body, send_with_status)
+        finally:
+            try:
+                body = json_codec.loads(b''.join(chunks))
+            except ValueError:
+                body = None
+            self.capture.finish(
+                scope['path'], scope['method'], body, status, started_at, time.perf_counter() - start, calls
+            )
+
+
+class AdmissionMiddleware:
+    """Admit session and chat requests by their user and session, or answer 429
+
+    The (small) JSON body is read up front to find the user and session and
+    handed on unchanged. In-flight slots are freed once the response,
+    streamed or not, has been sent. A SQLite store is called from a thread.
+    """
+
+    def __init__(self, app, admission):
+        self.app = app
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] not in ADMITTED_ROUTES:
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] != 'http.request':
+                return  # Client went away before sending its request
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        body = b''.join(chunks)
+        try:
+            data = json_codec.loads(body)
+        except ValueError:
+            data = None
+        data = data if isinstance(data, dict) else {}
+        app_name = data.get('app_name', DEFAULT_APP_NAME)
+        user_id = data.get('user_id', DEFAULT_USER_ID)
+        session_id = data.get('session_id')
+        try:
+            release = await off_loop(
+                self.admission.store, self.admission.admit,
+                user_id, session_key(app_name, user_id, session_id) if session_id else None
+            )
+        except AdmissionRejected as e:
+            ADMISSION_REJECTIONS.inc(scope['path'], e.reason)
+            await admission_rejected_response(e)(scope, receive, send)
+            return
+
+        body_sent = False
+
+        async def replay_body():
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        try:
+            await self.app(scope, replay_body, send)
+        finally:
+            await off_loop(self.admission.store, release)
+
+
+class CompressionMiddleware:
+    """gzip/brotli for complete response bodies of at least ``min_size`` bytes
+
+    Streamed responses (more than one body message, e.g. SSE) pass through
+    untouched so nothing is buffered.
+    """
+
+    def __init__(self, app, min_size=1024, levels=None):
+        self.app = app
+        self.min_size = min_size
+        self.levels = levels
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get('accept-encoding')
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message['type'] == 'http.response.start':
+                # Held back until the first body message shows whether it is complete
+                start = message
+                return
+            if start is not None and message['type'] == 'http.response.body':
+                start_message, start = start, None
+                headers = MutableHeaders(raw=start_message['headers'])
+                if not message.get('more_body') and 'content-encoding' not in headers:
+                    headers.add_vary_header('Accept-Encoding')
+                    encoding, body = maybe_compress(
+                        message.get('body', b''),
+                        headers.get('content-type'),
+                        accept_encoding,
+                        min_size=self.min_size,
+                        levels=self.levels,
+                    )
+                    if encoding:
+                        headers['Content-Encoding'] = encoding
+                        headers['Content-Length'] = str(len(body))
+                        message = {**message, 'body': body}
+                await send(start_message)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    prober = asyncio.create_task(health_prober.run_async()) if health_prober else None
+    refiller = asyncio.create_task(session_pool.run_async()) if session_pool else None
+    replica_probers = asyncio.create_task(backend_replicas.run_async()) if backend_replicas else None
+    yield
+    if prober:
+        prober.cancel()
+    if replica_probers:
+        replica_probers.cancel()
+    if refiller:
+        refiller.cancel()
+    await backend.close()
+    if traffic_capture:
+        traffic_capture.close()
+    if trace_exporter:
+        trace_exporter.close()
+
+
+routes = [
+    Route('/', index),
+    Route('/static/{filename:path}', static_asset),
+    Route('/health', health_check),
+    Route('/create_session', create_session, methods=['POST']),
+    Route('/chat', chat, methods=['POST']),
+    Route('/chat/stream', chat_stream, methods=['POST']),
+    Route('/chat/batch', chat_batch, methods=['POST']),
+    Route('/debug/backend_status', debug_backend_status),
+    Route('/debug/test_session_creation', debug_test_session_creation),
+    Route('/debug/test_run', debug_test_run),
+    Route('/debug/sessions', debug_sessions),
+    Route('/debug/cache', debug_cache),
+    Route('/debug/capture', debug_capture),
+    Route('/debug/admission', debug_admission),
+    Route('/debug/config', debug_config),
+    Route('/debug/traces', debug_traces),
+    Route('/debug/profile', debug_profile),
+    Route('/metrics', metrics),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[
+        Middleware(MetricsMiddleware, routes=routes),
+        *([Middleware(TracingMiddleware, tracer=tracer)] if tracer else []),
+        *([Middleware(ProfiledRequestsMiddleware, profiler=profiler)] if profiler else []),
+        *([Middleware(TrafficCaptureMiddleware, capture=traffic_capture)] if traffic_capture else []),
+        Middleware(CompressionMiddleware, min_size=COMPRESSION_MIN_SIZE, levels=COMPRESSION_LEVELS),
+        # Enable CORS for all routes
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+        # Inside CORS so 429s carry its headers too
+        *([Middleware(AdmissionMiddleware, admission=admission)] if admission else []),
+    ],
+    lifespan=lifespan,
+)
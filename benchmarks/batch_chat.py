@@ -0,0 +1,125 @@
+"""Answer a JSONL file of questions through the gateway's /chat/batch endpoint
+
+Each input line is a JSON object with a ``message`` and optionally an
+``id``, ``session_id``, ``user_id`` and ``app_name``; lines without an id
+are given their line number. Results are appended to --output as NDJSON,
+one line per question in the order they complete, and flushed as they
+arrive:
+
+    python -m benchmarks.batch_chat questions.jsonl --url http://localhost:5000 \\
+        --concurrency 32 --output answers.jsonl
+
+Running the same command again after a crash or an interrupted run resumes
+it: questions that already have a successful result in --output are
+skipped, and failed ones are asked again. Questions without a session_id
+are each answered in a fresh session.
+"""
+import argparse
+import json
+import sys
+import time
+
+import requests
+
+
+def load_questions(path):
+    """Questions from a JSONL file, each with an ``id`` (its line number if missing)"""
+    questions = []
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                question = json.loads(line)
+            except ValueError:
+                question = None
+            if not isinstance(question, dict):
+                raise ValueError(f"{path}:{number}: not a JSON object")
+            question['id'] = str(question.get('id', number))
+            questions.append(question)
+    return questions
+
+
+def answered_ids(path):
+    """IDs that already have a successful result in an output file, if it exists"""
+    done = set()
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash
+                    continue
+                if isinstance(result, dict) and result.get('success') is True:
+                    done.add(str(result.get('id')))
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def run(url, questions, output, concurrency, batch_id=None, timeout=None, progress=sys.stderr):
+    """Send the questions as one batch, appending each result to ``output``; returns (succeeded, failed)"""
+    params = {'concurrency': concurrency}
+    if batch_id:
+        params['batch_id'] = batch_id
+    body = b''.join(json.dumps(question).encode() + b'\n' for question in questions)
+    succeeded = failed = 0
+    started = last_report = time.monotonic()
+
+    with requests.post(f"{url}/chat/batch", params=params, data=body, stream=True, timeout=timeout,
+                       headers={'Content-Type': 'application/x-ndjson'}) as response:
+        response.raise_for_status()
+        with open(output, 'a', encoding='utf-8') as out:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                result = json.loads(line)
+                out.write(json.dumps(result) + '\n')
+                out.flush()
+                if result.get('success'):
+                    succeeded += 1
+                else:
+                    failed += 1
+                now = time.monotonic()
+                if now - last_report >= 1.0:
+                    last_report = now
+                    done = succeeded + failed
+                    print(f"{done}/{len(questions)} answered ({failed} failed), "
+                          f"{done / (now - started):.1f} questions/s", file=progress)
+    return succeeded, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('input', help='JSONL file of questions')
+    parser.add_argument('--url', default='http://localhost:5000', help='gateway to send the batch to')
+    parser.add_argument('--output', required=True, help='NDJSON file results are appended to')
+    parser.add_argument('--concurrency', type=int, default=8, help='questions answered at once')
+    parser.add_argument('--batch-id', help='names the sessions of questions without a session_id')
+    parser.add_argument('--timeout', type=float, help='seconds to wait for each result (default: no limit)')
+    args = parser.parse_args()
+
+    try:
+        questions = load_questions(args.input)
+    except ValueError as e:
+        parser.error(str(e))
+    done = answered_ids(args.output)
+    todo = [question for question in questions if question['id'] not in done]
+    print(f"{len(questions)} questions, {len(questions) - len(todo)} already answered, "
+          f"{len(todo)} to ask", file=sys.stderr)
+    if not todo:
+        return
+
+    started = time.monotonic()
+    succeeded, failed = run(args.url.rstrip('/'), todo, args.output, args.concurrency,
+                            batch_id=args.batch_id, timeout=args.timeout)
+    elapsed = time.monotonic() - started
+    print(f"{succeeded} answered, {failed} failed in {elapsed:.1f}s "
+          f"({(succeeded + failed) / elapsed:.1f} questions/s); results in {args.output}", file=sys.stderr)
+    if failed or succeeded + failed < len(todo):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Gateway CPU and egress for large JSON responses: encoder and compression
+
+First times the JSON encoders alone on a debug-dump sized payload (a /run
+trace of --events events), then sends /chat requests with a --answer-kb KB
+answer through the Flask gateway: stdlib encoder without compression (how
+the API used to respond) versus the configured fast encoder with
+negotiated compression, reporting CPU time per request and bytes sent.
+
+    python -m benchmarks.bench_api_responses --events 400 --answer-kb 32
+"""
+import argparse
+import json
+import os
+import random
+import time
+import timeit
+
+from benchmarks.fake_adk import start_fake_backend
+from gateway import json_codec
+
+
+def trace(events):
+    return [
+        {"id": f"e{i}", "author": "assistant", "timestamp": 1_700_000_000 + i, "content": {
+            "role": "model" if i % 2 else "user",
+            "parts": [{"functionResponse": {"name": "search_records", "response": {
+                "output": {"records": [{"id": j, "title": f"Record {j}", "score": j / 7} for j in range(10)]},
+            }}}],
+        }}
+        for i in range(events)
+    ]
+
+
+def cpu_per_request(client, requests, payload, headers):
+    response = client.post('/chat', json=payload, headers=headers)
+    assert response.status_code == 200
+    started = time.process_time()
+    for _ in range(requests):
+        client.post('/chat', json=payload, headers=headers)
+    return (time.process_time() - started) / requests, len(response.data), response.headers.get('Content-Encoding')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=400)
+    parser.add_argument('--answer-kb', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    payload = trace(args.events)
+    size = len(json.dumps(payload))
+    print(f"encoding a {size / 1024:.0f} KB debug payload ({args.events} events):")
+    for name in json_codec.CODECS:
+        codec = json_codec.get_codec(name)
+        seconds = timeit.timeit(lambda: codec.dumps(payload), number=50) / 50
+        print(f"{name:>12}: {seconds * 1000:6.2f} ms")
+    flask_default = timeit.timeit(lambda: json.dumps(payload, sort_keys=True), number=50) / 50
+    print(f"{'flask default':>12}: {flask_default * 1000:6.2f} ms (stdlib, sorted keys)")
+
+    os.environ['BACKEND_URL'] = start_fake_backend().url
+    import main as gateway
+
+    client = gateway.app.test_client()
+    rng = random.Random(0)
+    vocabulary = ('drink water rest see a doctor if the fever lasts more than three days take '
+                  'medication as prescribed avoid symptoms persist blood pressure sleep diet').split()
+    words = ' '.join(rng.choice(vocabulary) for _ in range(args.answer_kb * 256))
+    chat = {"session_id": "bench", "message": words[:args.answer_kb * 1024]}
+    browser = {'Accept-Encoding': 'gzip, deflate, br'}
+    print(f"\n/chat with a {args.answer_kb} KB answer:")
+    min_size = gateway.COMPRESSION_MIN_SIZE
+    for name, codec, compression, headers in (
+        ("stdlib, identity", 'stdlib', False, browser),
+        ("fast, identity", 'auto', False, browser),
+        ("fast, gzip", 'auto', True, {'Accept-Encoding': 'gzip'}),
+        ("fast, negotiated", 'auto', True, browser),
+    ):
+        json_codec.use(codec)
+        gateway.COMPRESSION_MIN_SIZE = min_size if compression else float('inf')
+        cpu, sent, encoding = cpu_per_request(client, args.requests, chat, headers)
+        print(f"{name:>17}: {cpu * 1000:6.2f} ms CPU/request, {sent:6d} bytes sent ({encoding or 'identity'})")
+
+
+if __name__ == '__main__':
+    main()
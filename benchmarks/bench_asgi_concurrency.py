@@ -0,0 +1,131 @@
+"""Compare in-flight /chat concurrency of the Flask and ASGI gateways
+
+Both gateways talk to a fake ADK backend whose /run sleeps for --latency
+seconds. The Flask app is served by a fixed pool of --threads workers (like
+gunicorn's gthread worker); the ASGI app runs on a single uvicorn event loop.
+Every server runs in its own process so they do not share a GIL with the
+load driver.
+
+    python -m benchmarks.bench_asgi_concurrency --concurrency 1000 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, timeout=15):
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.exceptions.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def spawn(args, env=None):
+    return subprocess.Popen(
+        [sys.executable, *args],
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def serve_flask(port, threads):
+    """Serve main.app with a fixed pool of worker threads"""
+    from werkzeug.serving import BaseWSGIServer
+
+    from main import app
+
+    class PooledWSGIServer(BaseWSGIServer):
+        request_queue_size = 2048
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.pool = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    PooledWSGIServer('127.0.0.1', port, app).serve_forever()
+
+
+async def fire(url, concurrency):
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def one(i):
+            payload = {"session_id": f"bench-{i}", "message": "What are flu symptoms?"}
+            async with session.post(f"{url}/chat", json=payload) as response:
+                await response.read()
+                return response.status
+
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(one(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return elapsed, sum(1 for status in statuses if status == 200)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--threads', type=int, default=16, help='Flask worker threads')
+    parser.add_argument('--serve-flask', type=int, metavar='PORT', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_flask:
+        serve_flask(args.serve_flask, args.threads)
+        return
+
+    backend_port, flask_port, asgi_port = free_port(), free_port(), free_port()
+    env = {'BACKEND_URL': f"http://127.0.0.1:{backend_port}"}
+    processes = [
+        spawn(['-m', 'benchmarks.fake_adk', '--port', str(backend_port), '--latency', str(args.latency)]),
+        spawn(['-m', 'benchmarks.bench_asgi_concurrency', '--serve-flask', str(flask_port),
+               '--threads', str(args.threads)], env),
+        spawn(['-m', 'uvicorn', 'asgi:app', '--port', str(asgi_port), '--backlog', '4096',
+               '--log-level', 'warning'], env),
+    ]
+    try:
+        gateways = (
+            (f"flask ({args.threads} threads)", f"http://127.0.0.1:{flask_port}"),
+            ("asgi (1 event loop)", f"http://127.0.0.1:{asgi_port}"),
+        )
+        for _, url in gateways:
+            wait_for(f"{url}/health")
+        for name, url in gateways:
+            elapsed, ok = asyncio.run(fire(url, args.concurrency))
+            print(
+                f"{name:>22}: {args.concurrency} concurrent chats in {elapsed:6.2f}s "
+                f"-> {ok / elapsed:7.1f} chats/s, {ok} ok"
+            )
+    finally:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Compare pooled BackendClient calls with one-connection-per-call requests
+
+    python -m benchmarks.bench_backend_pool --requests 2000 --threads 8
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.fake_adk import start_fake_backend
+from gateway.backend_client import BackendClient
+
+
+def drive(call, total, threads):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for response in pool.map(lambda _: call(), range(total)):
+            response.raise_for_status()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    server = start_fake_backend()
+    payload = {
+        "appName": "app",
+        "userId": "user",
+        "sessionId": "bench",
+        "newMessage": {"role": "user", "parts": [{"text": "hello"}]},
+    }
+
+    def unpooled():
+        return requests.post(f"{server.url}/run", json=payload, timeout=30)
+
+    client = BackendClient(server.url, pool_size=args.threads)
+
+    def pooled():
+        return client.run(payload)
+
+    for name, call in (("unpooled", unpooled), ("pooled", pooled)):
+        connections_before = server.connections
+        elapsed = drive(call, args.requests, args.threads)
+        print(
+            f"{name:>9}: {args.requests / elapsed:8.0f} req/s "
+            f"({elapsed:.2f}s, {server.connections - connections_before} TCP connections)"
+        )
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Measure /chat/batch throughput against a sequential create-then-chat client
+
+A fake ADK backend (/run sleeping --latency seconds, session creation
+--control-latency seconds) and the chosen gateway run in subprocesses. The
+baseline sends each question the way a simple evaluation script would: a
+/create_session call, then a /chat call, one question at a time. Each
+--concurrency level then sends all --questions in one /chat/batch request.
+
+    python -m benchmarks.bench_batch --gateway asgi --questions 400 --concurrency 1 4 16 64
+
+The Flask gateway holds batch concurrency to its backend pool size
+(BACKEND_POOL_SIZE), so levels above it run no faster there.
+"""
+import argparse
+import json
+import time
+import uuid
+from types import SimpleNamespace
+
+import requests
+
+from benchmarks.load_test import MESSAGES, start_stack
+
+
+def sequential(url, questions):
+    """Create a session and ask one question in it, one question at a time; returns (seconds, ok)"""
+    ok = 0
+    started = time.perf_counter()
+    with requests.Session() as http:
+        for question in questions:
+            session_id = f"bench-seq-{uuid.uuid4().hex[:8]}"
+            http.post(f"{url}/create_session", json={"session_id": session_id}).raise_for_status()
+            response = http.post(f"{url}/chat", json={"session_id": session_id, "message": question['message']})
+            ok += response.status_code == 200 and response.json().get('success') is True
+    return time.perf_counter() - started, ok
+
+
+def batch(url, questions, concurrency):
+    """Send every question in one /chat/batch request; returns (seconds, ok)"""
+    body = b''.join(json.dumps(question).encode() + b'\n' for question in questions)
+    ok = 0
+    started = time.perf_counter()
+    with requests.post(f"{url}/chat/batch", params={'concurrency': concurrency}, data=body, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                ok += json.loads(line).get('success') is True
+    return time.perf_counter() - started, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--gateway', choices=['flask', 'asgi'], default='asgi')
+    parser.add_argument('--threads', type=int, default=16, help='Flask worker threads')
+    parser.add_argument('--questions', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--latency', type=float, default=0.05, help='fake backend /run latency')
+    parser.add_argument('--control-latency', type=float, default=0.01,
+                        help='fake backend session creation latency')
+    parser.add_argument('--skip-sequential', action='store_true', help='only measure /chat/batch')
+    args = parser.parse_args()
+
+    url, processes = start_stack(SimpleNamespace(
+        gateway=args.gateway, threads=args.threads, latency=args.latency,
+        control_latency=args.control_latency, payload_size=0, error_rate=0.0, seed=0,
+    ))
+    questions = [{"id": str(i), "message": MESSAGES[i % len(MESSAGES)]} for i in range(args.questions)]
+    try:
+        runs = [] if args.skip_sequential else [("sequential create + chat", lambda: sequential(url, questions))]
+        runs += [(f"/chat/batch concurrency {concurrency}", lambda c=concurrency: batch(url, questions, c))
+                 for concurrency in args.concurrency]
+        baseline = None
+        for name, run in runs:
+            elapsed, ok = run()
+            rate = ok / elapsed
+            baseline = baseline or rate
+            print(f"{name:>30}: {args.questions} questions in {elapsed:6.2f}s -> {rate:7.1f} questions/s "
+                  f"({rate / baseline:5.1f}x), {ok} ok")
+    finally:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Time-to-first-byte and total time of /chat versus /chat/stream
+
+The fake ADK backend streams its answer word by word with --token-delay
+seconds between words, like a model generating tokens.
+
+    python -m benchmarks.bench_chat_ttfb --words 40 --token-delay 0.05
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+from benchmarks.fake_adk import start_fake_backend
+
+
+def measure(url, payload):
+    started = time.perf_counter()
+    with requests.post(url, json=payload, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        chunks = response.iter_content(chunk_size=None)
+        next(chunks)
+        first_byte = time.perf_counter() - started
+        for _ in chunks:
+            pass
+    return first_byte, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--words', type=int, default=40)
+    parser.add_argument('--token-delay', type=float, default=0.05)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    fake = start_fake_backend(token_delay=args.token_delay)
+    os.environ['BACKEND_URL'] = fake.url
+    from main import app
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    payload = {"session_id": "ttfb", "message": " ".join(["word"] * args.words)}
+    # The fake /run answers in one piece, so make it take as long as the
+    # whole streamed answer ("Echo:" plus the echoed words)
+    generation_time = args.token_delay * (args.words + 1)
+
+    for path, latency in (("/chat", generation_time), ("/chat/stream", 0.0)):
+        fake.latency = latency
+        samples = [measure(f"{base}{path}", payload) for _ in range(args.rounds)]
+        ttfb = statistics.median(sample[0] for sample in samples)
+        total = statistics.median(sample[1] for sample in samples)
+        print(f"{path:>13}: ttfb {ttfb * 1000:7.1f} ms, total {total * 1000:7.1f} ms")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Single-pass event summary versus the previous two-pass extractor
+
+Builds synthetic /run results for multi-tool agent runs (--steps function
+call/response pairs, some with intermediate model text) and times the
+previous gateway work per answer -- extract_ai_response_from_events walking
+the list backwards, plus the has_model_text scan done for the response
+cache -- against one summarize_events pass.
+
+    python -m benchmarks.bench_event_extractor --steps 200 --repeat 2000
+"""
+import argparse
+import io
+import logging
+import timeit
+
+from gateway.events import _model_text, summarize_events
+
+logger = logging.getLogger('legacy_extractor')
+
+
+def legacy_extract(events):
+    """extract_ai_response_from_events as it was before the single-pass rewrite"""
+    try:
+        if not isinstance(events, list):
+            logger.warning("Response is not a list of events")
+            return "I'm sorry, I received an unexpected response format."
+        for event in reversed(events):
+            if not isinstance(event, dict):
+                continue
+            content = event.get('content', {})
+            if not content:
+                continue
+            role = content.get('role')
+            if role != 'model':
+                continue
+            parts = content.get('parts', [])
+            if not parts:
+                continue
+            for part in parts:
+                if isinstance(part, dict) and 'text' in part:
+                    text = part['text'].strip()
+                    if text:
+                        logger.info(f"Found AI response in event: {event.get('id', 'unknown')}")
+                        return text
+        logger.warning("No text response found in events, checking for function calls...")
+        for event in reversed(events):
+            if not isinstance(event, dict):
+                continue
+            content = event.get('content', {})
+            parts = content.get('parts', [])
+            for part in parts:
+                if isinstance(part, dict):
+                    if 'functionCall' in part:
+                        func_call = part['functionCall']
+                        func_name = func_call.get('name', 'unknown function')
+                        return f"I'm processing your request using {func_name}. Please wait a moment for the response."
+                    if 'functionResponse' in part:
+                        func_resp = part['functionResponse']
+                        response_data = func_resp.get('response', {})
+                        if isinstance(response_data, dict) and 'output' in response_data:
+                            return response_data['output']
+        logger.warning("Could not extract meaningful response from events")
+        return "I'm sorry, I'm having trouble processing your request right now. Please try rephrasing your question."
+    except Exception as e:
+        logger.error(f"Error extracting AI response from events: {str(e)}")
+        return "I'm experiencing some technical difficulties. Please try again."
+
+
+def legacy_has_model_text(events):
+    return isinstance(events, list) and any(
+        isinstance(event, dict) and _model_text(event) for event in events
+    )
+
+
+def legacy_chat(events):
+    """What /chat did per answer: extract, count, and check for cacheable model text"""
+    response = legacy_extract(events)
+    events_count = len(events) if isinstance(events, list) else 0
+    return response, events_count, legacy_has_model_text(events)
+
+
+def summary_chat(events):
+    summary = summarize_events(events)
+    return summary.response(), summary.events_count, bool(summary.texts)
+
+
+def tool_step(i, with_text):
+    parts = [{"functionCall": {"id": f"call-{i}", "name": "lookup_condition", "args": {"query": f"q{i}"}}}]
+    if with_text:
+        parts.insert(0, {"text": f"Let me look up step {i}."})
+    return [
+        {"id": f"e{i}a", "author": "assistant", "content": {"role": "model", "parts": parts}},
+        {"id": f"e{i}b", "author": "assistant", "content": {"role": "user", "parts": [
+            {"functionResponse": {"id": f"call-{i}", "name": "lookup_condition",
+                                  "response": {"output": f"Result {i}: " + "detail " * 20}}},
+        ]}},
+    ]
+
+
+def build_run(steps, final_text, text_every):
+    events = [{"id": "u", "author": "user", "content": {"role": "user", "parts": [{"text": "question"}]}}]
+    for i in range(steps):
+        events.extend(tool_step(i, with_text=bool(text_every) and i % text_every == 0))
+    if final_text:
+        events.append({"id": "final", "author": "assistant", "content": {
+            "role": "model", "parts": [{"text": "Here is what I found. " * 10}]}})
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    # Log at INFO like main.py does, into memory so the terminal stays readable
+    logging.basicConfig(level=logging.INFO, stream=io.StringIO())
+
+    scenarios = {
+        "final answer after tools": build_run(args.steps, final_text=True, text_every=0),
+        "tools with interim text": build_run(args.steps, final_text=True, text_every=10),
+        "tool calls only": build_run(args.steps, final_text=False, text_every=0),
+    }
+    for name, events in scenarios.items():
+        legacy = timeit.timeit(lambda: legacy_chat(events), number=args.repeat) / args.repeat
+        single = timeit.timeit(lambda: summary_chat(events), number=args.repeat) / args.repeat
+        print(
+            f"{name:>25} ({len(events)} events): "
+            f"legacy {legacy * 1e6:8.1f} us, single pass {single * 1e6:8.1f} us, "
+            f"{legacy / single:4.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
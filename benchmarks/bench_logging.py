@@ -0,0 +1,99 @@
+"""Measure what gateway logging costs per call and in request throughput
+
+First, the CPU time a chat-path log call takes on the calling thread, with
+logging off (level above INFO), written synchronously, and buffered for the
+background writer; an f-string call that is formatted even though its level
+is disabled is shown for comparison. Then a load test against a gateway
+subprocess (fake ADK backend, log output to /dev/null) with the same
+settings:
+
+    python -m benchmarks.bench_logging --gateway flask --sessions 200 --turns 5
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from types import SimpleNamespace
+
+from benchmarks.load_test import run_load, start_stack
+from gateway.log_pipeline import configure_logging
+
+MESSAGE = "How can I maintain a healthy heart? " * 50
+
+CONFIGS = (
+    ("logging off", {'LOG_LEVEL': 'WARNING'}),
+    ("sync, json", {'LOG_LEVEL': 'INFO', 'LOG_ASYNC': '0'}),
+    ("async buffer, json", {'LOG_LEVEL': 'INFO', 'LOG_ASYNC': '1'}),
+)
+
+
+def per_call(calls):
+    """Microseconds per log call on the calling thread, for each configuration"""
+    logger = logging.getLogger('bench')
+    devnull = open(os.devnull, 'w')
+    results = []
+
+    def lazy():
+        logger.info("Sending message", extra={"session_id": "bench-1", "chat_message": MESSAGE})
+
+    def eager():
+        logger.info(f"Sending message: {MESSAGE[:50]}... (session: bench-1)")
+
+    cases = [("f-string, logging off", 'WARNING', True, eager)]
+    cases += [(name, env['LOG_LEVEL'], env.get('LOG_ASYNC', '1') == '1', lazy) for name, env in CONFIGS]
+    for name, level, async_, call in cases:
+        # A buffer large enough that no record is dropped while timing
+        pipeline = configure_logging(level, 'json', async_=async_, max_buffer=calls + 1, stream=devnull)
+        # CPU time of this thread only: what a request thread pays, not the writer
+        started = time.thread_time()
+        for _ in range(calls):
+            call()
+        elapsed = time.thread_time() - started
+        pipeline.stop()
+        results.append((name, elapsed / calls * 1e6))
+    devnull.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--gateway', choices=['flask', 'asgi'], default='asgi')
+    parser.add_argument('--threads', type=int, default=16, help='Flask worker threads')
+    parser.add_argument('--calls', type=int, default=50_000, help='log calls per configuration')
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--turns', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=3, help='load test rounds per setting (median reported)')
+    parser.add_argument('--latency', type=float, default=0.01, help='fake backend /run latency')
+    args = parser.parse_args()
+
+    print(f"per call ({len(MESSAGE)}-char chat message):")
+    for name, micros in per_call(args.calls):
+        print(f"{name:>24}: {micros:6.2f} us")
+
+    print(f"{args.gateway} gateway, {args.sessions} sessions x {args.turns} turns, "
+          f"concurrency {args.concurrency}:")
+    stack = SimpleNamespace(
+        gateway=args.gateway, threads=args.threads, latency=args.latency, control_latency=0.0,
+        payload_size=0, error_rate=0.0, seed=0,
+    )
+    for name, env in CONFIGS:
+        url, processes = start_stack(stack, env)
+        try:
+            runs = [asyncio.run(run_load(url, args.sessions, args.turns, args.concurrency))
+                    for _ in range(args.rounds)]
+        finally:
+            for process in processes:
+                process.terminate()
+        # The round with the median throughput
+        summaries = sorted((recorder.summary(duration) for recorder, duration in runs),
+                           key=lambda summary: summary[1]['throughput_rps'])
+        routes, total = summaries[len(summaries) // 2]
+        chat = routes['/chat']['latency_ms']
+        print(f"{name:>24}: {total['throughput_rps']:7.1f} req/s, /chat p50 {chat['p50']:6.1f} ms, "
+              f"p99 {chat['p99']:6.1f} ms, errors {total['error_rate']:.2%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Cost of the /metrics instrumentation on the request hot path
+
+Times the raw metric operations one request performs (route and backend
+counters, histograms and in-flight gauges), single-threaded and from
+--threads threads at once, then the rendering of a /metrics scrape.
+
+    python -m benchmarks.bench_metrics --operations 200000 --threads 8
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gateway.metrics import (
+    BACKEND_IN_FLIGHT,
+    BACKEND_REQUEST_DURATION,
+    BACKEND_REQUESTS,
+    CHAT_EVENTS,
+    HTTP_IN_FLIGHT,
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS,
+    REGISTRY,
+)
+
+
+def instrumented_request(i):
+    """The metric updates one /chat request makes (route plus one backend call)"""
+    latency = (i % 1000) / 10000
+    HTTP_IN_FLIGHT.inc('/chat')
+    BACKEND_IN_FLIGHT.inc('run')
+    BACKEND_IN_FLIGHT.dec('run')
+    BACKEND_REQUEST_DURATION.observe(latency, 'run')
+    BACKEND_REQUESTS.inc('run', '200')
+    CHAT_EVENTS.observe(i % 7, 'chat')
+    HTTP_IN_FLIGHT.dec('/chat')
+    HTTP_REQUEST_DURATION.observe(latency, '/chat', 'POST')
+    HTTP_REQUESTS.inc('/chat', 'POST', '200')
+
+
+def run(operations, threads):
+    chunk = operations // threads
+
+    def worker(offset):
+        for i in range(offset, offset + chunk):
+            instrumented_request(i)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(0, chunk * threads, chunk)))
+    return (time.perf_counter() - started) / (chunk * threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--operations', type=int, default=200_000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    for threads in (1, args.threads):
+        per_request = run(args.operations, threads)
+        print(f"{threads:>2} thread(s): {per_request * 1e6:6.2f} us of metric updates per request")
+
+    started = time.perf_counter()
+    body = REGISTRY.render()
+    print(f"scrape: {len(body.splitlines())} lines rendered in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
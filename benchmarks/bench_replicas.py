@@ -0,0 +1,168 @@
+"""Measure session-affinity routing across several fake ADK backend replicas
+
+First, how the consistent hash ring spreads --keys session keys over
+--replicas replicas, and what share of them move to another replica when
+one is added or removed, next to plain ``hash % n`` placement. Then a live
+run: --replicas fake backends (each answering 404 to runs of sessions it
+never created, as the real server does) behind one gateway, with
+--sessions conversations of --turns turns in flight. The first replica is
+killed --kill-after seconds into the run and restarted, empty,
+--restart-after seconds in. Errors, latency and each replica's share of the
+runs are reported, with the failovers and session recreations it caused:
+
+    python -m benchmarks.bench_replicas --gateway asgi --replicas 3 --sessions 300 --turns 6
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import urllib.request
+
+import aiohttp
+
+from benchmarks.bench_asgi_concurrency import free_port, spawn, wait_for
+from benchmarks.load_test import MESSAGES, LoadRecorder, call
+from gateway.replicas import HashRing, _hash
+
+
+def placement(keys, names, ring=None):
+    """Replica of each key, on ``ring`` or by ``hash % n`` without one"""
+    if ring is not None:
+        return [ring.owner(key) for key in keys]
+    return [names[_hash(key) % len(names)] for key in keys]
+
+
+def remapping(replicas, keys, vnodes):
+    """Key spread, and the share of keys moved by adding or removing a replica"""
+    keys = [f"app:user:session-{i}" for i in range(keys)]
+    names = [f"http://10.0.0.{i + 1}:8000" for i in range(replicas)]
+    print(f"{len(keys)} session keys over {replicas} replicas ({vnodes} points per replica on the ring):")
+    for label, build in (("hash ring", lambda n: HashRing(n, vnodes)), ("hash % n", lambda n: None)):
+        before = placement(keys, names, build(names))
+        counts = [before.count(name) for name in names]
+        spread = f"keys per replica {min(counts)}-{max(counts)} (ideal {len(keys) // replicas})"
+        for change, after_names in (("+1 replica", names + ["http://10.0.0.99:8000"]),
+                                    ("-1 replica", names[1:])):
+            after = placement(keys, after_names, build(after_names))
+            moved = sum(a != b for a, b in zip(before, after)) / len(keys)
+            spread += f", {change}: {moved:.1%} moved"
+        print(f"{label:>12}: {spread}")
+
+
+def metric_values(url, name):
+    """{labels: value} for one metric, from the gateway's /metrics"""
+    with urllib.request.urlopen(f"{url}/metrics") as response:
+        lines = response.read().decode().splitlines()
+    values = {}
+    for line in lines:
+        if line.startswith(name + '{'):
+            labels, value = line[len(name):].rsplit(' ', 1)
+            values[labels] = float(value)
+    return values
+
+
+def start_replica(port, args):
+    return spawn([
+        '-m', 'benchmarks.fake_adk', '--port', str(port), '--latency', str(args.latency), '--strict-sessions',
+    ])
+
+
+async def conversations(url, sessions, turns, concurrency, think_time, seed=0):
+    """Send the chat turns of ``sessions`` conversations; returns the /chat summary"""
+    recorder = LoadRecorder()
+    rng = random.Random(seed)
+    queue = asyncio.Queue()
+    for i in range(sessions):
+        queue.put_nowait(f"replicas-{seed}-{i}")
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as http:
+        async def user():
+            while not queue.empty():
+                session_id = queue.get_nowait()
+                for _ in range(turns):
+                    await asyncio.sleep(rng.uniform(0, 2 * think_time))
+                    await call(http, recorder, '/chat', f"{url}/chat",
+                               {"session_id": session_id, "message": rng.choice(MESSAGES)})
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        duration = time.perf_counter() - started
+    return recorder.summary(duration)[0]['/chat']
+
+
+async def live_run(url, args, replicas, ports):
+    load = asyncio.create_task(conversations(url, args.sessions, args.turns, args.concurrency, args.think_time))
+    await asyncio.sleep(args.kill_after)
+    replicas[0].terminate()
+    print(f"  killed replica 0 at {args.kill_after:g}s")
+    await asyncio.sleep(args.restart_after - args.kill_after)
+    replicas[0] = start_replica(ports[0], args)
+    print(f"  restarted replica 0 (without its sessions) at {args.restart_after:g}s")
+    return await load
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--gateway', choices=['flask', 'asgi'], default='asgi')
+    parser.add_argument('--threads', type=int, default=32, help='Flask worker threads')
+    parser.add_argument('--replicas', type=int, default=3)
+    parser.add_argument('--keys', type=int, default=100_000, help='session keys for the placement analysis')
+    parser.add_argument('--vnodes', type=int, default=160, help='ring points per replica')
+    parser.add_argument('--sessions', type=int, default=300)
+    parser.add_argument('--turns', type=int, default=6, help='chat turns per conversation')
+    parser.add_argument('--concurrency', type=int, default=50, help='conversations in progress at once')
+    parser.add_argument('--think-time', type=float, default=0.1, help='mean seconds between turns')
+    parser.add_argument('--latency', type=float, default=0.05, help='fake backend /run latency')
+    parser.add_argument('--kill-after', type=float, default=2.0)
+    parser.add_argument('--restart-after', type=float, default=5.0)
+    args = parser.parse_args()
+
+    remapping(args.replicas, args.keys, args.vnodes)
+
+    ports = [free_port() for _ in range(args.replicas)]
+    backend_urls = [f"http://127.0.0.1:{port}" for port in ports]
+    replicas = [start_replica(port, args) for port in ports]
+    gateway_port = free_port()
+    env = {
+        'BACKEND_URLS': ','.join(backend_urls), 'BACKEND_HASH_VNODES': str(args.vnodes), 'LOG_LEVEL': 'WARNING',
+        # Notice the dead replica, and take it back, within about a second
+        'HEALTH_PROBE_INTERVAL': '0.5', 'HEALTH_PROBE_MAX_BACKOFF': '1', 'CIRCUIT_BREAKER_RESET_TIMEOUT': '1',
+    }
+    if args.gateway == 'asgi':
+        gateway = ['-m', 'uvicorn', 'asgi:app', '--port', str(gateway_port), '--log-level', 'warning']
+    else:
+        gateway = ['-m', 'benchmarks.bench_asgi_concurrency', '--serve-flask', str(gateway_port),
+                   '--threads', str(args.threads)]
+    processes = [spawn(gateway, env)]
+    url = f"http://127.0.0.1:{gateway_port}"
+    print(f"{args.gateway} gateway, {args.replicas} replicas, {args.sessions} conversations x {args.turns} turns:")
+    try:
+        for backend_url in backend_urls:
+            wait_for(f"{backend_url}/list-apps")
+        wait_for(f"{url}/health")
+        chat = asyncio.run(live_run(url, args, replicas, ports))
+        runs = metric_values(url, 'gateway_backend_replica_requests_total')
+        failovers = metric_values(url, 'gateway_backend_replica_failovers_total')
+        recreated = metric_values(url, 'gateway_backend_replica_sessions_recreated_total')
+        with urllib.request.urlopen(f"{url}/health") as response:
+            health = json.loads(response.read())
+    finally:
+        for process in processes + replicas:
+            process.terminate()
+
+    latency = chat['latency_ms']
+    print(f"  /chat: {chat['requests']} turns, errors {chat['error_rate']:.2%} (statuses {chat['statuses']}), "
+          f"p50 {latency['p50']:.1f} ms, p99 {latency['p99']:.1f} ms")
+    total_runs = sum(value for labels, value in runs.items() if 'route="run"' in labels) or 1
+    for i, backend_url in enumerate(backend_urls):
+        replica = f'replica="{backend_url}"'
+        served = {labels: value for labels, value in runs.items() if replica in labels and 'route="run"' in labels}
+        not_found = sum(value for labels, value in served.items() if 'status="404"' in labels)
+        print(f"  replica {i}: {sum(served.values()) / total_runs:6.1%} of runs ({not_found:g} found no session), "
+              f"{failovers.get('{' + replica + '}', 0):g} calls failed over to other replicas, "
+              f"{recreated.get('{' + replica + '}', 0):g} sessions recreated here, "
+              f"ejected at the end: {health['replicas'][i]['ejected']}")
+
+
+if __name__ == '__main__':
+    main()
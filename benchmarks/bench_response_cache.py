@@ -0,0 +1,88 @@
+"""Backend calls and latency saved by the response cache on FAQ-style traffic
+
+Each simulated conversation opens a new session and asks one question drawn
+from a small FAQ set with random casing/punctuation variations, against a
+fake ADK backend whose /run takes --latency seconds. Both passes ask the
+same questions, each in sessions of its own. Finally a follow-up turn in a
+conversation whose first turn came from the cache checks that the agent is
+sent that first question, as it was asked, before the follow-up.
+
+    python -m benchmarks.bench_response_cache --conversations 200 --latency 0.05
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+from benchmarks.fake_adk import start_fake_backend
+from gateway.adk import session_key
+
+FAQ = [
+    "What are the symptoms of flu?",
+    "How can I maintain a healthy heart?",
+    "Tell me about diabetes prevention",
+    "What should I do for a headache?",
+    "What are the symptoms of a common cold?",
+]
+
+
+def variant(question, rng):
+    question = question.upper() if rng.random() < 0.2 else question.lower()
+    return question.rstrip('?') + rng.choice(['', '?', '??', ' ?', '!'])
+
+
+def run(client, conversations, seed, prefix):
+    rng = random.Random(seed)
+    latencies = []
+    for i in range(conversations):
+        payload = {"session_id": f"{prefix}-{i}", "message": variant(rng.choice(FAQ), rng)}
+        started = time.perf_counter()
+        response = client.post('/chat', json=payload)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.get_json()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--conversations', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    fake = start_fake_backend(latency=args.latency)
+    os.environ['BACKEND_URL'] = fake.url
+    os.environ['RESPONSE_CACHE_ENABLED'] = '1'
+    import main as gateway
+
+    cache = gateway.response_cache
+    client = gateway.app.test_client()
+    for name, enabled in (("cache off", False), ("cache on", True)):
+        gateway.response_cache = cache if enabled else None
+        runs_before = fake.calls['run']
+        latencies = run(client, args.conversations, seed=1, prefix=f"faq-{'on' if enabled else 'off'}")
+        print(
+            f"{name:>9}: {fake.calls['run'] - runs_before:4d} backend /run calls, "
+            f"mean {statistics.mean(latencies) * 1000:6.1f} ms, "
+            f"p95 {statistics.quantiles(latencies, n=20)[-1] * 1000:6.1f} ms"
+        )
+    print(f"cache stats: {cache.stats()}")
+
+    # The last conversation answered from the cache; the fake backend echoes the message it was sent
+    for i in reversed(range(args.conversations)):
+        key = session_key(gateway.DEFAULT_APP_NAME, gateway.DEFAULT_USER_ID, f"faq-on-{i}")
+        if cache.pending_turn(key) is not None:
+            break
+    runs_before = fake.calls['run']
+    follow_up = client.post('/chat', json={"session_id": f"faq-on-{i}", "message": "And how long does it last?"})
+    sent_first_turn = (
+        fake.calls['run'] - runs_before == 2
+        and cache.pending_turn(key) is None
+        and follow_up.get_json()["response"] == "Echo: And how long does it last?"
+    )
+    print(f"follow-up after a cached first turn: first turn sent to the agent: {sent_first_turn}")
+    raise SystemExit(0 if sent_first_turn else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Peak memory and time to answer from a multi-megabyte /run body
+
+Writes a synthetic /run result (an agent trace with --steps tool
+call/response pairs of --output-kb KB each, then the model's answer) and
+answers from it in a fresh process per strategy, so each one's peak RSS is
+its own: parsing the whole body at once (what response.json() did) versus
+feeding 64 KB chunks through the incremental parser.
+
+    python -m benchmarks.bench_run_parsing --steps 200 --output-kb 50
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from gateway.config import RUN_BODY_CHUNK_SIZE
+from gateway.events import summarize_events, summarize_run_body
+
+
+def write_trace(path, steps, output_kb):
+    filler = 'x' * 1024
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for i in range(steps):
+            f.write(json.dumps({"id": f"c{i}", "author": "assistant", "content": {"role": "model", "parts": [
+                {"functionCall": {"id": f"call-{i}", "name": "search_records", "args": {"page": i}}},
+            ]}}))
+            f.write(',')
+            f.write(json.dumps({"id": f"r{i}", "author": "assistant", "content": {"role": "user", "parts": [
+                {"functionResponse": {"id": f"call-{i}", "name": "search_records",
+                                      "response": {"output": [filler] * output_kb}}},
+            ]}}))
+            f.write(',')
+        f.write(json.dumps({"id": "final", "author": "assistant", "content": {
+            "role": "model", "parts": [{"text": "Based on the records, here is a summary."}]}}))
+        f.write(']')
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(strategy, path):
+    """Run one strategy in this process and print its result as JSON"""
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    with open(path, 'rb') as f:
+        if strategy == 'full':
+            summary = summarize_events(json.loads(f.read().decode('utf-8')))
+        else:
+            summary = summarize_run_body(iter(lambda: f.read(RUN_BODY_CHUNK_SIZE), b''))
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "seconds": elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_growth_mb": peak_rss_mb() - baseline,
+        "response": summary.response(),
+        "events": summary.events_count,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('--output-kb', type=int, default=50)
+    parser.add_argument('--measure', choices=['full', 'incremental'], help=argparse.SUPPRESS)
+    parser.add_argument('--path', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.path)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'run.json')
+        write_trace(path, args.steps, args.output_kb)
+        print(f"/run body: {os.path.getsize(path) / 2**20:.1f} MB, {2 * args.steps + 1} events")
+        results = {}
+        for strategy in ('full', 'incremental'):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_run_parsing', '--measure', strategy, '--path', path],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            results[strategy] = result = json.loads(output)
+            print(
+                f"{strategy:>12}: {result['seconds'] * 1000:7.1f} ms, "
+                f"peak RSS {result['peak_rss_mb']:6.1f} MB (+{result['peak_rss_growth_mb']:.1f} MB while parsing)"
+            )
+        assert results['full']['response'] == results['incremental']['response']
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Measure how the pre-warmed session pool shortens the first turn of a conversation
+
+New conversations arrive at --rate per second (Poisson arrivals) for
+--duration seconds, each sending its first message straight to /chat as the
+chat UI does, so the gateway has to create (or take from the pool) its
+backend session first. The fake ADK backend spends --control-latency
+seconds per session creation and checks that every run names a session it
+created. The first-turn latency and the pool's hit rate are reported with
+the pool off and for each --sizes pool size:
+
+    python -m benchmarks.bench_session_pool --gateway asgi --rate 50 --sizes 4 16 64
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import urllib.request
+
+import aiohttp
+
+from benchmarks.bench_asgi_concurrency import free_port, spawn, wait_for
+from benchmarks.load_test import LoadRecorder, call
+
+
+def start_stack(args, env):
+    backend_port, gateway_port = free_port(), free_port()
+    backend = spawn([
+        '-m', 'benchmarks.fake_adk', '--port', str(backend_port), '--latency', str(args.latency),
+        '--control-latency', str(args.control_latency), '--strict-sessions',
+    ])
+    env = {**env, 'BACKEND_URL': f"http://127.0.0.1:{backend_port}", 'LOG_LEVEL': 'WARNING'}
+    if args.gateway == 'asgi':
+        gateway = ['-m', 'uvicorn', 'asgi:app', '--port', str(gateway_port), '--log-level', 'warning']
+    else:
+        gateway = ['-m', 'benchmarks.bench_asgi_concurrency', '--serve-flask', str(gateway_port),
+                   '--threads', str(args.threads)]
+    processes = [backend, spawn(gateway, env)]
+    url = f"http://127.0.0.1:{gateway_port}"
+    wait_for(f"{url}/health")
+    return url, processes
+
+
+async def arrivals(url, rate, duration, seed):
+    """First turns of conversations arriving at ``rate`` per second; returns the recorder"""
+    recorder = LoadRecorder()
+    rng = random.Random(seed)
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as http:
+        tasks = []
+        started = time.perf_counter()
+        i = 0
+        while time.perf_counter() - started < duration:
+            payload = {"session_id": f"pool-bench-{seed}-{i}", "message": "What are the symptoms of flu?"}
+            tasks.append(asyncio.create_task(call(http, recorder, '/chat', f"{url}/chat", payload)))
+            i += 1
+            await asyncio.sleep(rng.expovariate(rate))
+        await asyncio.gather(*tasks)
+    return recorder
+
+
+def pool_stats(url):
+    with urllib.request.urlopen(f"{url}/debug/sessions?limit=1") as response:
+        return json.loads(response.read())["pool"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--gateway', choices=['flask', 'asgi'], default='asgi')
+    parser.add_argument('--threads', type=int, default=32, help='Flask worker threads')
+    parser.add_argument('--rate', type=float, default=50.0, help='new conversations per second')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of arrivals per setting')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[4, 16, 64], help='pool sizes to compare')
+    parser.add_argument('--latency', type=float, default=0.05, help='fake backend /run latency')
+    parser.add_argument('--control-latency', type=float, default=0.05,
+                        help='fake backend session creation latency')
+    args = parser.parse_args()
+
+    print(f"{args.gateway} gateway, {args.rate:g} new conversations/s for {args.duration:g}s, "
+          f"session creation {args.control_latency * 1000:g} ms, /run {args.latency * 1000:g} ms:")
+    settings = [("no pool", {})]
+    settings += [(f"pool of {size}", {'SESSION_POOL_ENABLED': '1', 'SESSION_POOL_SIZE': str(size)})
+                 for size in args.sizes]
+    for name, env in settings:
+        url, processes = start_stack(args, env)
+        try:
+            # Let the pool fill before conversations arrive
+            time.sleep(1.0 + args.control_latency * max(args.sizes))
+            recorder = asyncio.run(arrivals(url, args.rate, args.duration, seed=0))
+            pool = pool_stats(url)
+        finally:
+            for process in processes:
+                process.terminate()
+        chat = recorder.summary(args.duration)[0]['/chat']
+        latency = chat['latency_ms']
+        hit_rate = f"{pool['hit_rate']:.0%}" if pool and pool['hit_rate'] is not None else "-"
+        print(f"{name:>12}: first turn p50 {latency['p50']:6.1f} ms, p95 {latency['p95']:6.1f} ms, "
+              f"p99 {latency['p99']:6.1f} ms, errors {chat['error_rate']:.2%}, pool hit rate {hit_rate}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Show that N concurrent identical backend calls produce one upstream hit
+
+Fires --callers concurrent /debug/backend_status requests (GET /list-apps
+upstream) and concurrent /create_session requests for one new session
+(session creation upstream) at the Flask gateway, then the same storm at
+the async client, and reports how many calls reached the fake backend.
+
+Concurrent first /chat turns of one session used to be such a storm too.
+Since the session queue they run one at a time instead: the first creates
+the session and the others find it registered, so the session is still
+created once, but by queueing rather than single-flight. That storm is
+reported after the /create_session one, with the queue deep enough to hold
+every caller.
+
+    python -m benchmarks.bench_singleflight --callers 50
+"""
+import argparse
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_adk import start_fake_backend
+
+
+def storm(fn, callers):
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        return list(pool.map(lambda _: fn(), range(callers)))
+
+
+def report(name, fake, route, before, callers):
+    hits = fake.calls[route] - before
+    print(f"{name:>38}: {callers} callers -> {hits} upstream {route} call(s)")
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--callers', type=int, default=50)
+    parser.add_argument('--control-latency', type=float, default=0.2)
+    args = parser.parse_args()
+
+    fake = start_fake_backend(control_latency=args.control_latency)
+    os.environ['BACKEND_URL'] = fake.url
+    os.environ['SESSION_QUEUE_MAX_DEPTH'] = str(args.callers)
+    import asgi
+    import main as gateway
+
+    client = gateway.app.test_client()
+    failures = 0
+    # A background probe in flight would absorb the /list-apps storm
+    gateway.shutdown()
+
+    before = fake.calls['list_apps']
+    storm(lambda: client.get('/debug/backend_status'), args.callers)
+    failures += report("flask /debug/backend_status", fake, 'list_apps', before, args.callers) != 1
+
+    before = fake.calls['create_session']
+    responses = storm(lambda: client.post('/create_session', json={"session_id": "storm"}), args.callers)
+    assert all(response.status_code == 200 for response in responses)
+    failures += report("flask /create_session on a new session", fake, 'create_session', before, args.callers) != 1
+
+    before = fake.calls['create_session']
+    responses = storm(lambda: client.post('/chat', json={"session_id": "queued", "message": "hi"}), args.callers)
+    assert all(response.status_code == 200 for response in responses)
+    failures += report("flask /chat on a new session (queued)", fake, 'create_session', before, args.callers) != 1
+
+    async def async_storm():
+        before = fake.calls['list_apps']
+        await asyncio.gather(*(asgi.backend.list_apps() for _ in range(args.callers)))
+        hits = report("AsyncBackendClient.list_apps", fake, 'list_apps', before, args.callers)
+        await asgi.backend.close()
+        return hits != 1
+
+    failures += asyncio.run(async_storm())
+    print(f"single-flight stats (flask): {gateway.backend.singleflight.stats()}")
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
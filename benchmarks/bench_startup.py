@@ -0,0 +1,90 @@
+"""Measure gateway startup: settings validation, app import and time to first response
+
+Three numbers, each the median of --runs fresh processes:
+
+* reading and validating every setting (re-running gateway.config);
+* importing the Flask app (main) and the ASGI app (asgi), which builds the
+  backend clients, stores and UI bundle;
+* launching ``python serve.py`` in each mode with --workers workers until
+  /health answers, against a fake ADK backend.
+
+    python -m benchmarks.bench_startup --runs 5 --workers 1 4
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_asgi_concurrency import free_port, spawn, wait_for
+
+SERVE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'serve.py')
+
+IMPORT_TIMER = (
+    "import time; started = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - started)"
+)
+# Re-executes gateway.config, i.e. reads and validates every setting again
+SETTINGS_TIMER = (
+    "import importlib, time; import gateway.config as config; started = time.perf_counter(); "
+    "[importlib.reload(config) for _ in range(100)]; print((time.perf_counter() - started) / 100)"
+)
+
+
+def timed(code, env):
+    """Seconds printed by ``code`` run in a fresh interpreter"""
+    output = subprocess.run(
+        [sys.executable, '-c', code],
+        env={**os.environ, **env}, capture_output=True, text=True, check=True,
+    ).stdout
+    return float(output.split()[-1])
+
+
+def time_to_ready(mode, workers, env):
+    """Seconds from launching serve.py until /health answers"""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, SERVE, '--mode', mode, '--workers', str(workers), '--host', '127.0.0.1',
+         '--port', str(port)],
+        env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for(f"http://127.0.0.1:{port}/health", timeout=60)
+        return time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def report(name, samples):
+    print(f"{name:>34}: median {statistics.median(samples) * 1000:8.1f} ms "
+          f"(min {min(samples) * 1000:.1f}, max {max(samples) * 1000:.1f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--modes', nargs='+', choices=['flask', 'asgi'], default=['flask', 'asgi'])
+    args = parser.parse_args()
+
+    backend_port = free_port()
+    env = {'BACKEND_URL': f"http://127.0.0.1:{backend_port}"}
+    backend = spawn(['-m', 'benchmarks.fake_adk', '--port', str(backend_port)])
+    try:
+        wait_for(f"{env['BACKEND_URL']}/list-apps")
+        report("load and validate settings", [timed(SETTINGS_TIMER, env) for _ in range(args.runs)])
+        for module in ('main', 'asgi'):
+            report(f"import {module}", [timed(IMPORT_TIMER.format(module=module), env) for _ in range(args.runs)])
+        for mode in args.modes:
+            for workers in args.workers:
+                report(f"serve.py --mode {mode} --workers {workers}",
+                       [time_to_ready(mode, workers, env) for _ in range(args.runs)])
+    finally:
+        backend.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Requests per second and bytes on the wire for GET / (the chat UI)
+
+Compares rendering the page through Jinja on every request (how / used to
+be served, with the CSS/JS inline) against the prebuilt in-memory page:
+a first visit with brotli/gzip, and a repeat visit revalidated with
+If-None-Match. Requests go through the Flask test client in-process, so
+the numbers are gateway CPU cost per request, not network throughput.
+
+    python -m benchmarks.bench_static_ui --requests 5000
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+
+from flask import Flask, render_template_string
+
+from benchmarks.fake_adk import start_fake_backend
+from gateway.static_assets import StaticUI
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def legacy_app():
+    """/ as it was: the whole page (CSS/JS inline) rendered by Jinja per request"""
+    html = StaticUI(ROOT / 'templates' / 'index.html', ROOT / 'static', inline_assets=True).page.body.decode()
+    app = Flask('legacy')
+    app.add_url_rule('/', 'index', lambda: render_template_string(html))
+    return app
+
+
+def measure(client, requests, headers):
+    response = client.get('/', headers=headers)
+    size = len(response.data)
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get('/', headers=headers)
+    return requests / (time.perf_counter() - started), response.status_code, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    os.environ['BACKEND_URL'] = start_fake_backend().url
+    import main as gateway
+
+    client = gateway.app.test_client()
+    etag = client.get('/', headers={'Accept-Encoding': 'br, gzip'}).headers['ETag']
+    cases = [
+        ("render per request", legacy_app().test_client(), {'Accept-Encoding': 'br, gzip'}),
+        ("prebuilt, identity", client, {}),
+        ("prebuilt, gzip", client, {'Accept-Encoding': 'gzip'}),
+        ("prebuilt, brotli", client, {'Accept-Encoding': 'br, gzip'}),
+        ("prebuilt, revalidated", client, {'Accept-Encoding': 'br, gzip', 'If-None-Match': etag}),
+    ]
+    for name, test_client, headers in cases:
+        rps, status, size = measure(test_client, args.requests, headers)
+        print(f"{name:>22}: {rps:8.0f} req/s, {status} with {size:6d} body bytes")
+
+    assets = sum(len(asset.variants.get('br', asset.body)) for asset in gateway.ui.assets.values())
+    print(f"CSS/JS fetched once per deploy with brotli: {assets} bytes, then served from the browser cache")
+
+
+if __name__ == '__main__':
+    main()
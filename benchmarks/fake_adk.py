@@ -0,0 +1,277 @@
+"""Local stand-in for the ADK API server used by the gateway benchmarks
+
+Run standalone with ``python -m benchmarks.fake_adk --port 8000`` or start it
+in-process with ``start_fake_backend()``.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SESSION_PATH = re.compile(r"^/apps/([^/]+)/users/([^/]+)/sessions/([^/]+)$")
+
+
+class FakeADKHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _inject_failure(self):
+        """Answer with a 500 instead, at the server's configured error rate"""
+        if not self.server.should_fail():
+            return False
+        self._send_json(500, {"detail": "Injected failure"})
+        return True
+
+    def _unknown_session(self, payload):
+        """Answer 404 instead, if sessions are checked and the run's session was never created"""
+        if not self.server.strict_sessions:
+            return False
+        if self.server.has_session(payload.get('appName'), payload.get('userId'), payload.get('sessionId')):
+            return False
+        self._send_json(404, {"detail": "Session not found"})
+        return True
+
+    def _stream_run(self, payload):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def send_event(event):
+            data = f"data: {json.dumps(event)}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+        text = reply_text(payload)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if payload.get('streaming'):
+            for word in re.findall(r"\S+\s*", text):
+                if self.server.token_delay:
+                    time.sleep(self.server.token_delay)
+                send_event(model_event(word, partial=True))
+        send_event(model_event(text))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        self.server.record('list_apps' if self.path == '/list-apps' else 'other')
+        if self.server.control_latency:
+            time.sleep(self.server.control_latency)
+        if self.path == '/list-apps':
+            if self._inject_failure():
+                return
+            self._send_json(200, ['app'])
+        else:
+            self._send_json(404, {"detail": "Not Found"})
+
+    def do_POST(self):
+        match = SESSION_PATH.match(self.path)
+        if match:
+            self.server.record('create_session')
+            body = self._read_json()
+            if self.server.control_latency:
+                time.sleep(self.server.control_latency)
+            if self._inject_failure():
+                return
+            app_name, user_id, session_id = match.groups()
+            self.server.add_session(app_name, user_id, session_id)
+            self._send_json(200, {
+                "id": session_id,
+                "appName": app_name,
+                "userId": user_id,
+                "state": body.get('state', {}),
+                "events": [],
+                "lastUpdateTime": time.time(),
+            })
+        elif self.path == '/run':
+            self.server.record('run')
+            payload = self._read_json()
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            if self._inject_failure() or self._unknown_session(payload):
+                return
+            self._send_json(200, [*tool_events(self.server.payload_size), model_event(reply_text(payload))])
+        elif self.path == '/run_sse':
+            self.server.record('run_sse')
+            payload = self._read_json()
+            if self._inject_failure() or self._unknown_session(payload):
+                return
+            self._stream_run(payload)
+        else:
+            self._send_json(404, {"detail": "Not Found"})
+
+    def do_DELETE(self):
+        match = SESSION_PATH.match(self.path)
+        if not match:
+            self._send_json(404, {"detail": "Not Found"})
+            return
+        self.server.record('delete_session')
+        if self.server.control_latency:
+            time.sleep(self.server.control_latency)
+        if self._inject_failure():
+            return
+        self.server.remove_session(*match.groups())
+        self._send_json(200, None)
+
+
+def reply_text(payload):
+    text = payload.get('newMessage', {}).get('parts', [{}])[0].get('text', '')
+    return f"Echo: {text}"
+
+
+def model_event(text, partial=False):
+    event = {
+        "id": "evt-1",
+        "author": "root_agent",
+        "content": {"role": "model", "parts": [{"text": text}]},
+    }
+    if partial:
+        event["partial"] = True
+    return event
+
+
+def tool_events(payload_size):
+    """A tool call and a tool output padding a /run result by about ``payload_size`` bytes"""
+    if not payload_size:
+        return []
+    return [
+        {"id": "evt-call", "author": "root_agent", "content": {"role": "model", "parts": [
+            {"functionCall": {"id": "call-1", "name": "search_records", "args": {}}},
+        ]}},
+        {"id": "evt-output", "author": "root_agent", "content": {"role": "user", "parts": [
+            {"functionResponse": {"id": "call-1", "name": "search_records",
+                                  "response": {"output": "x" * payload_size}}},
+        ]}},
+    ]
+
+
+class FakeADKServer(ThreadingHTTPServer):
+    """Fake ADK API server
+
+    ``latency`` delays /run and /run_sse, ``control_latency`` the session and
+    app-listing calls. ``payload_size`` pads each /run result with a tool
+    output of that many bytes, and ``error_rate`` is the fraction of calls
+    answered with a 500. With ``strict_sessions``, runs of sessions that were
+    never created (or were deleted) get a 404, as from the real server.
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, latency=0.0, token_delay=0.0, control_latency=0.0,
+                 payload_size=0, error_rate=0.0, seed=None, strict_sessions=False):
+        super().__init__(address, FakeADKHandler)
+        self.latency = latency
+        self.token_delay = token_delay
+        self.control_latency = control_latency
+        self.payload_size = payload_size
+        self.error_rate = error_rate
+        self.strict_sessions = strict_sessions
+        self.sessions = set()
+        self._random = random.Random(seed)
+        self.calls = Counter()
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def get_request(self):
+        conn = super().get_request()
+        with self._lock:
+            self.connections += 1
+        return conn
+
+    def record(self, route):
+        with self._lock:
+            self.calls[route] += 1
+
+    def add_session(self, app_name, user_id, session_id):
+        with self._lock:
+            self.sessions.add((app_name, user_id, session_id))
+
+    def remove_session(self, app_name, user_id, session_id):
+        with self._lock:
+            self.sessions.discard((app_name, user_id, session_id))
+
+    def has_session(self, app_name, user_id, session_id):
+        with self._lock:
+            return (app_name, user_id, session_id) in self.sessions
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.calls['injected_failures'] += 1
+            return failed
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_fake_backend(host='127.0.0.1', port=0, **options):
+    """Start a fake ADK server on a background thread and return it"""
+    server = FakeADKServer((host, port), **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to sleep in /run')
+    parser.add_argument('--token-delay', type=float, default=0.0,
+                        help='seconds between streamed words in /run_sse')
+    parser.add_argument('--control-latency', type=float, default=0.0,
+                        help='seconds to sleep in /list-apps and session creation')
+    parser.add_argument('--payload-size', type=int, default=0,
+                        help='bytes of tool output added to each /run result')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of calls answered with a 500')
+    parser.add_argument('--seed', type=int, help='seed for the injected failures')
+    parser.add_argument('--strict-sessions', action='store_true',
+                        help='answer 404 to runs of sessions that were never created')
+    args = parser.parse_args()
+
+    server = FakeADKServer(
+        (args.host, args.port),
+        latency=args.latency,
+        token_delay=args.token_delay,
+        control_latency=args.control_latency,
+        payload_size=args.payload_size,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        strict_sessions=args.strict_sessions,
+    )
+    print(f"Fake ADK backend listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
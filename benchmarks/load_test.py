@@ -0,0 +1,240 @@
+"""Load-test the gateway with realistic session flows and write the results as JSON
+
+Each simulated user creates a session and then sends --turns chat messages
+in it, one after another; --concurrency users run at once until --sessions
+sessions are done. Throughput, latency percentiles (p50/p95/p99) and error
+rates are reported per route. A request counts as an error when it fails,
+returns a non-2xx status, or answers ``"success": false`` (or an SSE error
+frame).
+
+Without --url a fake ADK backend and the chosen gateway are started in
+subprocesses, with the backend's latency, payload size and error rate
+taken from the options below:
+
+    python -m benchmarks.load_test --gateway asgi --sessions 200 --turns 5 \\
+        --concurrency 50 --latency 0.2 --error-rate 0.01 --output results.json
+
+Against an already running gateway:
+
+    python -m benchmarks.load_test --url http://localhost:5000 --output results.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import platform
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import aiohttp
+
+from benchmarks.bench_asgi_concurrency import free_port, spawn, wait_for
+
+MESSAGES = [
+    "What are the symptoms of flu?",
+    "How can I maintain a healthy heart?",
+    "Tell me about diabetes prevention",
+    "What should I do for a headache?",
+    "How much water should I drink every day?",
+    "Is it safe to exercise with a cold?",
+]
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LoadRecorder:
+    """Latencies and outcomes per route"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, route, latency, status, ok):
+        self.latencies[route].append(latency)
+        self.statuses[route][str(status)] += 1
+        if not ok:
+            self.errors[route] += 1
+
+    def summary(self, duration):
+        routes = {}
+        for route, latencies in sorted(self.latencies.items()):
+            ordered = sorted(latencies)
+            routes[route] = {
+                "requests": len(ordered),
+                "errors": self.errors[route],
+                "error_rate": self.errors[route] / len(ordered),
+                "throughput_rps": len(ordered) / duration,
+                "statuses": dict(self.statuses[route]),
+                "latency_ms": {
+                    "mean": sum(ordered) / len(ordered) * 1000,
+                    "p50": percentile(ordered, 50) * 1000,
+                    "p95": percentile(ordered, 95) * 1000,
+                    "p99": percentile(ordered, 99) * 1000,
+                    "max": ordered[-1] * 1000,
+                },
+            }
+        total = sum(route["requests"] for route in routes.values())
+        errors = sum(route["errors"] for route in routes.values())
+        return routes, {
+            "requests": total,
+            "errors": errors,
+            "error_rate": errors / total if total else 0.0,
+            "throughput_rps": total / duration,
+        }
+
+
+async def call(http, recorder, route, url, payload):
+    started = time.perf_counter()
+    status = 'error'
+    ok = False
+    try:
+        async with http.post(url, json=payload) as response:
+            status = response.status
+            body = await response.read()
+            ok = 200 <= status < 300
+            if ok and route.endswith('/stream'):
+                ok = b'"type":"error"' not in body.replace(b' ', b'')
+            elif ok:
+                ok = json.loads(body).get('success', True) is not False
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        status = type(e).__name__
+    recorder.record(route, time.perf_counter() - started, status, ok)
+    return ok
+
+
+async def session_flow(http, recorder, base_url, session_id, turns, stream, think_time, rng):
+    await call(http, recorder, '/create_session', f"{base_url}/create_session", {"session_id": session_id})
+    chat_route = '/chat/stream' if stream else '/chat'
+    for _ in range(turns):
+        if think_time:
+            await asyncio.sleep(rng.uniform(0, 2 * think_time))
+        await call(http, recorder, chat_route, f"{base_url}{chat_route}", {
+            "session_id": session_id,
+            "message": rng.choice(MESSAGES),
+        })
+
+
+async def run_load(base_url, sessions, turns, concurrency, stream=False, think_time=0.0, seed=0, timeout=60):
+    recorder = LoadRecorder()
+    rng = random.Random(seed)
+    run_id = f"{int(time.time())}-{seed}"
+    queue = asyncio.Queue()
+    for i in range(sessions):
+        queue.put_nowait(f"load-{run_id}-{i}")
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as http:
+        async def user():
+            while not queue.empty():
+                session_id = queue.get_nowait()
+                await session_flow(http, recorder, base_url, session_id, turns, stream, think_time, rng)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        duration = time.perf_counter() - started
+    return recorder, duration
+
+
+def print_summary(routes, total, duration):
+    for route, stats in routes.items():
+        latency = stats["latency_ms"]
+        print(
+            f"{route:>16}: {stats['requests']:6d} req, {stats['throughput_rps']:8.1f} req/s, "
+            f"p50 {latency['p50']:7.1f} ms, p95 {latency['p95']:7.1f} ms, p99 {latency['p99']:7.1f} ms, "
+            f"errors {stats['error_rate']:.2%}"
+        )
+    print(f"{'total':>16}: {total['requests']:6d} req in {duration:.2f}s, {total['throughput_rps']:.1f} req/s, "
+          f"errors {total['error_rate']:.2%}")
+
+
+def start_stack(args, env=None):
+    """Start the fake ADK backend and a gateway in subprocesses; returns (url, processes)
+
+    ``env`` adds gateway settings to the environment of the gateway process.
+    """
+    backend_port, gateway_port = free_port(), free_port()
+    env = {**(env or {}), 'BACKEND_URL': f"http://127.0.0.1:{backend_port}"}
+    backend = [
+        '-m', 'benchmarks.fake_adk', '--port', str(backend_port),
+        '--latency', str(args.latency), '--control-latency', str(args.control_latency),
+        '--payload-size', str(args.payload_size), '--error-rate', str(args.error_rate),
+        '--seed', str(args.seed),
+    ]
+    if args.gateway == 'asgi':
+        gateway = ['-m', 'uvicorn', 'asgi:app', '--port', str(gateway_port), '--backlog', '4096',
+                   '--log-level', 'warning']
+    else:
+        gateway = ['-m', 'benchmarks.bench_asgi_concurrency', '--serve-flask', str(gateway_port),
+                   '--threads', str(args.threads)]
+    processes = [spawn(backend), spawn(gateway, env)]
+    url = f"http://127.0.0.1:{gateway_port}"
+    wait_for(f"{url}/health")
+    return url, processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='gateway to test; omit to start a fake backend and a gateway')
+    parser.add_argument('--gateway', choices=['flask', 'asgi'], default='asgi')
+    parser.add_argument('--threads', type=int, default=16, help='Flask worker threads')
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--turns', type=int, default=5, help='chat messages per session')
+    parser.add_argument('--concurrency', type=int, default=50, help='sessions in progress at once')
+    parser.add_argument('--stream', action='store_true', help='chat through /chat/stream')
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help='mean seconds a user waits between turns')
+    parser.add_argument('--timeout', type=float, default=60.0, help='per-request timeout (seconds)')
+    parser.add_argument('--latency', type=float, default=0.1, help='fake backend /run latency')
+    parser.add_argument('--control-latency', type=float, default=0.0,
+                        help='fake backend session creation latency')
+    parser.add_argument('--payload-size', type=int, default=0, help='fake backend /run tool output bytes')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fake backend failure fraction')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    processes = []
+    url = args.url
+    if url is None:
+        url, processes = start_stack(args)
+    try:
+        recorder, duration = asyncio.run(run_load(
+            url.rstrip('/'), args.sessions, args.turns, args.concurrency,
+            stream=args.stream, think_time=args.think_time, seed=args.seed, timeout=args.timeout,
+        ))
+    finally:
+        for process in processes:
+            process.terminate()
+
+    routes, total = recorder.summary(duration)
+    results = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "duration_seconds": duration,
+        "config": {
+            **{key: value for key, value in vars(args).items() if key != 'output'},
+            "url": url if args.url else None,
+            "python": platform.python_version(),
+        },
+        "total": total,
+        "routes": routes,
+    }
+
+    print_summary(routes, total, duration)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
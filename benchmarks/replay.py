@@ -0,0 +1,180 @@
+"""Replay captured gateway traffic against a running gateway
+
+Reads a capture file written by the gateway with TRAFFIC_CAPTURE_ENABLED=1
+(one JSON record per /create_session, /chat or /chat/stream request) and
+sends the same requests again, spaced as they were originally. --speed
+scales the timeline (2 replays twice as fast, 0 sends everything as fast as
+--concurrency allows); requests of one session are always sent in their
+captured order, each after the previous one has answered. Lines that are
+not capture records are skipped.
+
+Replay latencies are reported next to the captured ones (gateway and
+upstream backend time), together with how far behind schedule requests
+were sent:
+
+    python -m benchmarks.replay requests.jsonl --url http://localhost:5000 --speed 2 \\
+        --output replay.json
+
+Session IDs get a per-run prefix so replayed conversations start fresh on
+the backend; --keep-session-ids sends them unchanged. Captures are redacted
+by default (TRAFFIC_CAPTURE_CHAT_TEXT), so their messages replay as filler
+of the original length.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import aiohttp
+
+from benchmarks.load_test import LoadRecorder, call, percentile, print_summary
+from gateway.config import TRAFFIC_CAPTURE_PATH
+
+
+def load_capture(path, limit=None):
+    """Capture records from a JSONL file, oldest first, and the number of lines skipped"""
+    records, skipped = [], 0
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if not isinstance(record, dict) or not {'ts', 'route', 'body'} <= record.keys():
+                skipped += 1
+                continue
+            records.append(record)
+    records.sort(key=lambda record: record['ts'])
+    return records[:limit] if limit else records, skipped
+
+
+def captured_summary(records):
+    """Summaries of the captured gateway and upstream latencies, for comparison"""
+    gateway, upstream = LoadRecorder(), LoadRecorder()
+    for record in records:
+        status = record.get('status')
+        gateway.record(record['route'], record.get('duration_ms', 0) / 1000, status,
+                       isinstance(status, int) and 200 <= status < 300)
+        for backend_call in record.get('upstream') or ():
+            upstream.record(backend_call['route'], backend_call['ms'] / 1000, backend_call['status'],
+                            backend_call['status'].startswith('2'))
+    last = records[-1]
+    duration = max(last['ts'] - records[0]['ts'] + last.get('duration_ms', 0) / 1000, 1e-9)
+    return gateway.summary(duration), upstream.summary(duration), duration
+
+
+def session_chains(records, session_prefix):
+    """Records grouped by session, in captured order; session IDs get ``session_prefix``"""
+    chains = defaultdict(list)
+    for i, record in enumerate(records):
+        body = dict(record['body']) if isinstance(record['body'], dict) else record['body']
+        session_id = body.get('session_id') if isinstance(body, dict) else None
+        if session_id and session_prefix:
+            body['session_id'] = f"{session_prefix}{session_id}"
+        chains[session_id or f"request-{i}"].append((record, body))
+    return list(chains.values())
+
+
+async def replay(base_url, records, speed=1.0, concurrency=100, session_prefix='', timeout=60):
+    recorder = LoadRecorder()
+    lags = []
+    first_ts = records[0]['ts']
+    limit = asyncio.Semaphore(concurrency)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as http:
+        started = time.perf_counter()
+
+        async def run_chain(chain):
+            for record, body in chain:
+                if speed:
+                    due = started + (record['ts'] - first_ts) / speed
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    lags.append(max(0.0, -delay))
+                async with limit:
+                    await call(http, recorder, record['route'], f"{base_url}{record['route']}", body)
+
+        await asyncio.gather(*(run_chain(chain) for chain in session_chains(records, session_prefix)))
+        duration = time.perf_counter() - started
+    return recorder, duration, sorted(lags)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('capture', nargs='?', default=TRAFFIC_CAPTURE_PATH, help='capture JSONL file')
+    parser.add_argument('--url', required=True, help='gateway to replay against')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='timeline speed-up (1 = original pacing, 0 = as fast as possible)')
+    parser.add_argument('--concurrency', type=int, default=100, help='requests in flight at most')
+    parser.add_argument('--limit', type=int, help='replay only the first N captured requests')
+    parser.add_argument('--keep-session-ids', action='store_true',
+                        help='send the captured session IDs instead of prefixing them per run')
+    parser.add_argument('--timeout', type=float, default=60.0, help='per-request timeout (seconds)')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    records, skipped = load_capture(args.capture, args.limit)
+    if not records:
+        parser.error(f"no capture records in {args.capture} ({skipped} lines skipped)")
+    session_prefix = '' if args.keep_session_ids else f"replay-{int(time.time())}-"
+    print(f"replaying {len(records)} requests from {args.capture} at speed {args.speed:g} "
+          f"({skipped} lines skipped)")
+
+    recorder, duration, lags = asyncio.run(replay(
+        args.url.rstrip('/'), records, speed=args.speed, concurrency=args.concurrency,
+        session_prefix=session_prefix, timeout=args.timeout,
+    ))
+    routes, total = recorder.summary(duration)
+    (captured_routes, captured_total), (upstream_routes, upstream_total), captured_duration = \
+        captured_summary(records)
+    schedule_lag_ms = {
+        "p50": percentile(lags, 50) * 1000,
+        "p99": percentile(lags, 99) * 1000,
+        "max": lags[-1] * 1000,
+    } if lags else None
+
+    print("captured:")
+    print_summary(captured_routes, captured_total, captured_duration)
+    if upstream_routes:
+        print("captured upstream (ADK backend):")
+        print_summary(upstream_routes, upstream_total, captured_duration)
+    print("replayed:")
+    print_summary(routes, total, duration)
+    if schedule_lag_ms:
+        print(f"sent behind schedule by p50 {schedule_lag_ms['p50']:.1f} ms, p99 {schedule_lag_ms['p99']:.1f} ms, "
+              f"max {schedule_lag_ms['max']:.1f} ms")
+
+    if args.output:
+        results = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "duration_seconds": duration,
+            "config": {
+                **{key: value for key, value in vars(args).items() if key != 'output'},
+                "requests": len(records),
+                "skipped_lines": skipped,
+                "python": platform.python_version(),
+            },
+            "schedule_lag_ms": schedule_lag_ms,
+            "total": total,
+            "routes": routes,
+            "captured": {
+                "duration_seconds": captured_duration,
+                "total": captured_total,
+                "routes": captured_routes,
+                "upstream": {"total": upstream_total, "routes": upstream_routes},
+            },
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
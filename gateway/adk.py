@@ -0,0 +1,47 @@
+from datetime import datetime
+
+
+def session_key(app_name, user_id, session_id):
+    """Key used by the gateway to track a backend session"""
+    return f"{app_name}:{user_id}:{session_id}"
+
+
+def build_session_state(app_name, user_id):
+    """Initial state for a new session (as per official docs)"""
+    return {
+        "initialized": True,
+        "created_at": datetime.now().isoformat(),
+        "app_name": app_name,
+        "user_id": user_id
+    }
+
+
+def build_run_payload(app_name, user_id, session_id, message):
+    """Prepare a message for the /run endpoint (official docs format)"""
+    return {
+        "appName": app_name,
+        "userId": user_id,
+        "sessionId": session_id,
+        "newMessage": {
+            "role": "user",
+            "parts": [
+                {
+                    "text": message
+                }
+            ]
+        }
+    }
+
+
+def session_already_exists(response):
+    """Whether a failed session creation only failed because the session exists"""
+    return response.status_code in (400, 409) and 'already exists' in response.text.lower()
+
+
+def session_creation_failed(response):
+    """Whether an on-demand session creation (None if skipped) actually failed"""
+    return (
+        response is not None
+        and response.status_code != 200
+        and not session_already_exists(response)
+    )
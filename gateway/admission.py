@@ -0,0 +1,299 @@
+import math
+import sqlite3
+import threading
+import time
+import uuid
+
+# Gateway routes that go through admission control
+ADMITTED_ROUTES = frozenset({'/create_session', '/chat', '/chat/stream'})
+
+
+class AdmissionRejected(Exception):
+    """Raised instead of handling a request that is over its user's or session's limits"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Request rejected ({reason}); retry in {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self):
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class AdmissionStore:
+    """Token buckets and in-flight leases behind an AdmissionController
+
+    ``take`` spends one token from a bucket refilling at ``rate`` tokens per
+    second up to ``burst``, and returns 0 on success or the seconds until a
+    token is available. ``acquire`` takes an in-flight slot under ``limit``
+    and returns a lease to ``release``, or None when the limit is reached.
+    ``blocking`` stores may wait on I/O (such as another process's lock), so
+    an async server calls them from a thread.
+    """
+
+    blocking = False
+
+    def take(self, key, rate, burst):
+        raise NotImplementedError
+
+    def acquire(self, key, limit):
+        raise NotImplementedError
+
+    def release(self, lease):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+
+class InMemoryAdmissionStore(AdmissionStore):
+    """Process-local store; limits apply per worker process
+
+    Buckets that have refilled completely are indistinguishable from new
+    ones, so they are pruned once more than ``max_keys`` are held.
+    """
+
+    def __init__(self, max_keys=100_000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> (tokens, updated_at, seconds until full)
+        self._in_flight = {}  # key -> count
+
+    def take(self, key, rate, burst):
+        now = self._clock()
+        with self._lock:
+            tokens, updated_at, _ = self._buckets.get(key, (burst, now, 0.0))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now, (burst - tokens) / rate)
+                return (1 - tokens) / rate
+            tokens -= 1
+            self._buckets[key] = (tokens, now, (burst - tokens) / rate)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return 0.0
+
+    def _prune(self, now):
+        full = [key for key, (_, updated_at, refill) in self._buckets.items() if now - updated_at >= refill]
+        for key in full:
+            del self._buckets[key]
+
+    def acquire(self, key, limit):
+        with self._lock:
+            count = self._in_flight.get(key, 0)
+            if count >= limit:
+                return None
+            self._in_flight[key] = count + 1
+        return key
+
+    def release(self, lease):
+        with self._lock:
+            count = self._in_flight.get(lease, 0) - 1
+            if count > 0:
+                self._in_flight[lease] = count
+            else:
+                self._in_flight.pop(lease, None)
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "buckets": len(self._buckets),
+            "in_flight": sum(self._in_flight.values()),
+        }
+
+
+class SqliteAdmissionStore(AdmissionStore):
+    """Store in a SQLite file, so limits hold across every worker on the host
+
+    In-flight slots are rows that expire after ``lease_ttl`` seconds, so
+    slots held by a worker that died are freed instead of leaking. Buckets
+    that have refilled completely are pruned every ``trim_interval`` tokens.
+    """
+
+    # Transactions wait up to 5s for other workers' write locks
+    blocking = True
+
+    def __init__(self, path, lease_ttl=120.0, trim_interval=100, clock=time.time):
+        self.path = path
+        self.lease_ttl = lease_ttl
+        self.trim_interval = trim_interval
+        self._clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._takes = 0
+        with self._transaction() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS admission_buckets ('
+                ' key TEXT PRIMARY KEY,'
+                ' tokens REAL NOT NULL,'
+                ' updated_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS admission_leases ('
+                ' id TEXT PRIMARY KEY,'
+                ' key TEXT NOT NULL,'
+                ' expires_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS admission_leases_key ON admission_leases (key)')
+
+    def _connect(self):
+        # sqlite3 connections may not be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _ImmediateTransaction(self._connect())
+
+    def take(self, key, rate, burst):
+        now = self._clock()
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT tokens, updated_at FROM admission_buckets WHERE key = ?', (key,)
+            ).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            admitted = tokens >= 1
+            if admitted:
+                tokens -= 1
+            conn.execute(
+                'INSERT INTO admission_buckets (key, tokens, updated_at) VALUES (?, ?, ?)'
+                ' ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at',
+                (key, tokens, now),
+            )
+            if not admitted:
+                return (1 - tokens) / rate
+        with self._lock:
+            self._takes += 1
+            trim = self._takes % self.trim_interval == 0
+        if trim:
+            # Buckets idle long enough to be full again carry no information
+            self._connect().execute('DELETE FROM admission_buckets WHERE updated_at < ?', (now - burst / rate,))
+        return 0.0
+
+    def acquire(self, key, limit):
+        now = self._clock()
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM admission_leases WHERE key = ? AND expires_at <= ?', (key, now))
+            count = conn.execute('SELECT COUNT(*) FROM admission_leases WHERE key = ?', (key,)).fetchone()[0]
+            if count >= limit:
+                return None
+            lease = uuid.uuid4().hex
+            conn.execute(
+                'INSERT INTO admission_leases (id, key, expires_at) VALUES (?, ?, ?)',
+                (lease, key, now + self.lease_ttl),
+            )
+        return lease
+
+    def release(self, lease):
+        self._connect().execute('DELETE FROM admission_leases WHERE id = ?', (lease,))
+
+    def stats(self):
+        conn = self._connect()
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "buckets": conn.execute('SELECT COUNT(*) FROM admission_buckets').fetchone()[0],
+            "in_flight": conn.execute(
+                'SELECT COUNT(*) FROM admission_leases WHERE expires_at > ?', (self._clock(),)
+            ).fetchone()[0],
+            "lease_ttl_seconds": self.lease_ttl,
+        }
+
+
+class _ImmediateTransaction:
+    """BEGIN IMMEDIATE ... COMMIT, so concurrent workers read and update a row one at a time"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+class AdmissionController:
+    """Per-user rate limit and per-user/per-session in-flight caps for chat requests
+
+    Each user gets a token bucket of ``burst`` requests refilling at ``rate``
+    per second, and may have at most ``max_in_flight_per_user`` requests (and
+    ``max_in_flight_per_session`` per session) being handled at once. A limit
+    of None turns that check off. ``admit`` raises AdmissionRejected or
+    returns a callable that frees the in-flight slots; call it exactly once
+    when the response is finished.
+    """
+
+    def __init__(self, store, rate=2.0, burst=10, max_in_flight_per_user=4, max_in_flight_per_session=4,
+                 concurrency_retry_after=1.0):
+        self.store = store
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight_per_user = max_in_flight_per_user
+        self.max_in_flight_per_session = max_in_flight_per_session
+        self.concurrency_retry_after = concurrency_retry_after
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.rejected = {"rate_limited": 0, "user_concurrency": 0, "session_concurrency": 0}
+
+    def admit(self, user_id, session_key):
+        leases = []
+        try:
+            # Concurrency first, so a request turned away there spends no token
+            for reason, key, limit in (
+                ("user_concurrency", f"user:{user_id}", self.max_in_flight_per_user),
+                ("session_concurrency", f"session:{session_key}", self.max_in_flight_per_session),
+            ):
+                if limit is None or (session_key is None and reason == "session_concurrency"):
+                    continue
+                lease = self.store.acquire(key, limit)
+                if lease is None:
+                    self._reject(reason, self.concurrency_retry_after)
+                leases.append(lease)
+            if self.rate is not None:
+                retry_after = self.store.take(f"rate:{user_id}", self.rate, self.burst)
+                if retry_after:
+                    self._reject("rate_limited", retry_after)
+        except BaseException:
+            for lease in leases:
+                self.store.release(lease)
+            raise
+        with self._lock:
+            self.admitted += 1
+        return lambda: self._release(leases)
+
+    def _reject(self, reason, retry_after):
+        with self._lock:
+            self.rejected[reason] += 1
+        raise AdmissionRejected(reason, retry_after)
+
+    def _release(self, leases):
+        while leases:
+            self.store.release(leases.pop())
+
+    def stats(self):
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "max_in_flight_per_user": self.max_in_flight_per_user,
+            "max_in_flight_per_session": self.max_in_flight_per_session,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "store": self.store.stats(),
+        }
+
+
+def create_admission_store(url, lease_ttl=120.0):
+    """Build a store from a URL: ``memory://`` or ``sqlite:///path/to/file.db``"""
+    if url == 'memory://':
+        return InMemoryAdmissionStore()
+    if url.startswith('sqlite:///'):
+        return SqliteAdmissionStore(url[len('sqlite:///'):], lease_ttl=lease_ttl)
+    raise ValueError(f"Unsupported admission store URL: {url}")
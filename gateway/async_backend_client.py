@@ -0,0 +1,194 @@
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+from . import tracing
+from .backend_client import DEFAULT_TIMEOUT, DEFAULT_TIMEOUTS, session_path
+from .circuit_breaker import CircuitBreakerSet, CircuitOpenError
+from .metrics import BACKEND_IN_FLIGHT, BACKEND_REQUESTS, record_backend_call
+from .singleflight import AsyncSingleFlight
+
+
+class BackendResponse:
+    """Fully read backend response with the same surface as requests.Response"""
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.content = body
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncBackendClient:
+    """Non-blocking counterpart of BackendClient for the ASGI gateway
+
+    All calls share one aiohttp session, so thousands of in-flight chats can
+    wait on the backend from a single event loop. Idempotent calls are
+    single-flighted and each route has a circuit breaker, like in BackendClient.
+    """
+
+    def __init__(self, base_url, pool_size=1000, keep_alive=True, timeouts=None,
+                 retries=2, backoff_factor=0.2, breakers=None, replica=None):
+        self.base_url = base_url.rstrip('/')
+        self.replica = replica
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self._session = None
+        self.singleflight = AsyncSingleFlight()
+        self.breakers = breakers or CircuitBreakerSet()
+
+    def _get_session(self):
+        # Created lazily so it binds to the server's running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                force_close=not self.keep_alive,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={'Content-Type': 'application/json'},
+            )
+        return self._session
+
+    def url(self, path):
+        """Build an absolute backend URL for a path like /list-apps"""
+        return f"{self.base_url}{path}"
+
+    def timeout_for(self, route):
+        """Timeout configured for a named route"""
+        return self.timeouts.get(route, DEFAULT_TIMEOUT)
+
+    def _admit(self, route):
+        breaker = self.breakers.for_route(route)
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            BACKEND_REQUESTS.inc(route, 'circuit_open')
+            raise
+        return breaker
+
+    async def request(self, route, method, path, **kwargs):
+        """Send a request through the shared pool using the route's timeout"""
+        route_timeout = kwargs.pop('timeout', self.timeout_for(route))
+        # Bounds the connect and each read, as requests' timeout does, so that a
+        # connect timing out is told apart (ConnectionTimeoutError) from a read
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=route_timeout, sock_read=route_timeout)
+        breaker = self._admit(route)
+        BACKEND_IN_FLIGHT.inc(route)
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"backend.{route}") as span:
+                kwargs['headers'] = tracing.inject(kwargs.get('headers'))
+                response = await self._send(method, path, timeout, **kwargs)
+                span.set('status', response.status_code)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            breaker.record_failure()
+            record_backend_call(route, type(e).__name__, time.perf_counter() - start, self.replica)
+            raise
+        finally:
+            BACKEND_IN_FLIGHT.dec(route)
+        record_backend_call(route, str(response.status_code), time.perf_counter() - start, self.replica)
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    async def _send(self, method, path, timeout, **kwargs):
+        session = self._get_session()
+        attempt = 0
+        while True:
+            try:
+                async with session.request(method, self.url(path), timeout=timeout, **kwargs) as response:
+                    return BackendResponse(response.status, await response.read())
+            except aiohttp.ClientConnectorError:
+                # Nothing reached the backend yet, so retrying is safe for every method
+                if attempt >= self.retries:
+                    raise
+                await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+                attempt += 1
+
+    @asynccontextmanager
+    async def stream(self, route, method, path, **kwargs):
+        """Open a streamed request; the timeout applies to each read, not the whole body"""
+        route_timeout = kwargs.pop('timeout', self.timeout_for(route))
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=route_timeout, sock_read=route_timeout)
+        breaker = self._admit(route)
+        BACKEND_IN_FLIGHT.inc(route)
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"backend.{route}") as span:
+                kwargs['headers'] = tracing.inject(kwargs.get('headers'))
+                response = await self._get_session().request(method, self.url(path), timeout=timeout, **kwargs)
+                span.set('status', response.status)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            breaker.record_failure()
+            record_backend_call(route, type(e).__name__, time.perf_counter() - start, self.replica)
+            raise
+        finally:
+            BACKEND_IN_FLIGHT.dec(route)
+        record_backend_call(route, str(response.status), time.perf_counter() - start, self.replica)
+        if response.status >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        try:
+            yield response
+        finally:
+            response.release()
+
+    async def shared_request(self, route, method, path, **kwargs):
+        """Like request(), but concurrent calls for the same method and path share one response"""
+        return await self.singleflight.do(
+            (method, path),
+            lambda: self.request(route, method, path, **kwargs),
+            timeout=self.timeout_for(route),
+        )
+
+    def for_session(self, app_name, user_id, session_id):
+        """The client that serves a session's calls: this one"""
+        return self
+
+    async def list_apps(self):
+        """GET /list-apps"""
+        return await self.shared_request('list_apps', 'GET', '/list-apps')
+
+    async def create_session(self, app_name, user_id, session_id, state):
+        """POST /apps/{app}/users/{user}/sessions/{session}"""
+        return await self.shared_request(
+            'create_session',
+            'POST',
+            session_path(app_name, user_id, session_id),
+            json={"state": state},
+        )
+
+    async def delete_session(self, app_name, user_id, session_id):
+        """DELETE /apps/{app}/users/{user}/sessions/{session}"""
+        return await self.request('delete_session', 'DELETE', session_path(app_name, user_id, session_id))
+
+    async def run(self, payload):
+        """POST /run"""
+        return await self.request('run', 'POST', '/run', json=payload)
+
+    def run_stream(self, payload):
+        """POST /run as a streamed response (use with ``async with``)"""
+        return self.stream('run', 'POST', '/run', json=payload)
+
+    def run_sse(self, payload):
+        """POST /run_sse as a streamed response (use with ``async with``)"""
+        return self.stream('run_sse', 'POST', '/run_sse', json=payload)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
@@ -0,0 +1,168 @@
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import tracing
+from .circuit_breaker import CircuitBreakerSet, CircuitOpenError
+from .metrics import BACKEND_IN_FLIGHT, BACKEND_REQUESTS, record_backend_call
+from .singleflight import SingleFlight
+
+# Per-route timeouts (seconds) used when a call does not pass its own
+DEFAULT_TIMEOUTS = {
+    "list_apps": 5,
+    "create_session": 10,
+    "delete_session": 10,
+    "run": 30,
+    "run_sse": 30,
+}
+DEFAULT_TIMEOUT = 10
+
+
+class BackendClient:
+    """Shared HTTP client for all calls from the gateway to the ADK backend
+
+    Wraps a single requests.Session so every route reuses pooled keep-alive
+    connections instead of opening a new TCP connection per call. Idempotent
+    calls (listing apps, creating a given session) are single-flighted:
+    concurrent identical calls share one upstream request and its result.
+    Each route has a circuit breaker, so while the backend is failing calls
+    raise CircuitOpenError immediately instead of waiting out their timeout.
+    With ``replica`` (one of several backends, see BackendReplicaSet), calls
+    are also counted under that name in the per-replica metrics.
+    """
+
+    def __init__(self, base_url, pool_size=20, keep_alive=True, timeouts=None,
+                 retries=2, backoff_factor=0.2, status_forcelist=(502, 503, 504),
+                 breakers=None, replica=None):
+        self.base_url = base_url.rstrip('/')
+        self.replica = replica
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=status_forcelist,
+            # Only idempotent calls are retried on read errors/bad statuses;
+            # connect errors are retried for every method since nothing was sent
+            allowed_methods=frozenset(["GET", "HEAD", "OPTIONS"]),
+            raise_on_status=False,
+        )
+        self._session = self._build_session()
+        self.singleflight = SingleFlight()
+        self.breakers = breakers or CircuitBreakerSet()
+
+    def _build_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            max_retries=self.retry,
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['Content-Type'] = 'application/json'
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def url(self, path):
+        """Build an absolute backend URL for a path like /list-apps"""
+        return f"{self.base_url}{path}"
+
+    def timeout_for(self, route):
+        """Timeout configured for a named route"""
+        return self.timeouts.get(route, DEFAULT_TIMEOUT)
+
+    def _admit(self, route):
+        breaker = self.breakers.for_route(route)
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            BACKEND_REQUESTS.inc(route, 'circuit_open')
+            raise
+        return breaker
+
+    def request(self, route, method, path, **kwargs):
+        """Send a request through the shared pool using the route's timeout"""
+        kwargs.setdefault('timeout', self.timeout_for(route))
+        breaker = self._admit(route)
+        BACKEND_IN_FLIGHT.inc(route)
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"backend.{route}") as span:
+                kwargs['headers'] = tracing.inject(kwargs.get('headers'))
+                response = self._session.request(method, self.url(path), **kwargs)
+                span.set('status', response.status_code)
+        except requests.exceptions.RequestException as e:
+            breaker.record_failure()
+            record_backend_call(route, type(e).__name__, time.perf_counter() - start, self.replica)
+            raise
+        finally:
+            BACKEND_IN_FLIGHT.dec(route)
+        record_backend_call(route, str(response.status_code), time.perf_counter() - start, self.replica)
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    def shared_request(self, route, method, path, **kwargs):
+        """Like request(), but concurrent calls for the same method and path share one response
+
+        Waiters give up after the route's timeout with requests' Timeout.
+        """
+        try:
+            return self.singleflight.do(
+                (method, path),
+                lambda: self.request(route, method, path, **kwargs),
+                timeout=self.timeout_for(route),
+            )
+        except TimeoutError as e:
+            raise requests.exceptions.Timeout(str(e)) from e
+
+    def for_session(self, app_name, user_id, session_id):
+        """The client that serves a session's calls: this one"""
+        return self
+
+    def list_apps(self):
+        """GET /list-apps"""
+        return self.shared_request('list_apps', 'GET', '/list-apps')
+
+    def create_session(self, app_name, user_id, session_id, state):
+        """POST /apps/{app}/users/{user}/sessions/{session}"""
+        return self.shared_request(
+            'create_session',
+            'POST',
+            session_path(app_name, user_id, session_id),
+            json={"state": state},
+        )
+
+    def delete_session(self, app_name, user_id, session_id):
+        """DELETE /apps/{app}/users/{user}/sessions/{session}"""
+        return self.request('delete_session', 'DELETE', session_path(app_name, user_id, session_id))
+
+    def run(self, payload):
+        """POST /run"""
+        return self.request('run', 'POST', '/run', json=payload)
+
+    def run_stream(self, payload):
+        """POST /run, returning a streamed response so the body can be parsed incrementally"""
+        return self.request('run', 'POST', '/run', json=payload, stream=True)
+
+    def run_sse(self, payload):
+        """POST /run_sse, returning a streamed response to iterate as events arrive"""
+        return self.request('run_sse', 'POST', '/run_sse', json=payload, stream=True)
+
+    def close(self):
+        self._session.close()
+
+
+def session_path(app_name, user_id, session_id):
+    """Backend path of a single ADK session"""
+    return f"/apps/{app_name}/users/{user_id}/sessions/{session_id}"
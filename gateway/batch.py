@@ -0,0 +1,307 @@
+import asyncio
+import contextvars
+import io
+import queue
+import threading
+import time
+
+from . import json_codec
+
+
+class BatchItem:
+    """One question of a /chat/batch request
+
+    ``error`` is set (and nothing is sent to the backend) when the line
+    could not be used.
+    """
+
+    __slots__ = ('index', 'id', 'app_name', 'user_id', 'session_id', 'message', 'error', 'started',
+                 'backend_session_id', 'next', 'waiting', 'failed', 'finished')
+
+    def __init__(self, index, id, app_name, user_id, session_id, message, error=None):
+        self.index = index
+        self.id = id
+        self.app_name = app_name
+        self.user_id = user_id
+        self.session_id = session_id
+        self.message = message
+        self.error = error
+        self.started = None
+        # The backend session answering it (see ensure_backend_session), once created
+        self.backend_session_id = session_id
+        # Chaining with the items of the same session (see _Sequencer)
+        self.next = None
+        self.waiting = 1
+        self.failed = False
+        self.finished = False
+
+    def result(self, success, **fields):
+        latency = time.perf_counter() - self.started if self.started is not None else 0.0
+        return {
+            "index": self.index,
+            "id": self.id,
+            "session_id": self.session_id,
+            "success": success,
+            **fields,
+            "latency_ms": round(latency * 1000, 3),
+        }
+
+
+def parse_batch(body, batch_id, default_app_name, default_user_id):
+    """Yield a BatchItem for each non-blank JSONL line of ``body`` (bytes)
+
+    Lines are JSON objects with a ``message`` and optionally an ``id``,
+    ``session_id``, ``user_id`` and ``app_name``. Without a session ID each
+    question gets a fresh session of its own, named after ``batch_id``.
+    """
+    index = 0
+    for line in io.BytesIO(body):
+        if not line.strip():
+            continue
+        try:
+            data = json_codec.loads(line)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            yield BatchItem(index, str(index), None, None, None, None, error="Line is not a JSON object")
+        else:
+            item_id = str(data.get('id', index))
+            message = data.get('message')
+            yield BatchItem(
+                index,
+                item_id,
+                data.get('app_name', default_app_name),
+                data.get('user_id', default_user_id),
+                str(data.get('session_id') or f"batch-{batch_id}-{item_id}"),
+                message,
+                error=None if isinstance(message, str) and message.strip() else "Message cannot be empty",
+            )
+        index += 1
+
+
+def encode_ndjson(results):
+    for result in results:
+        yield json_codec.dumps(result) + b'\n'
+
+
+async def encode_ndjson_async(results):
+    async for result in results:
+        yield json_codec.dumps(result) + b'\n'
+
+
+def _call(fn, item):
+    """Run one pipeline stage for an item; an exception becomes the item's error result"""
+    try:
+        return fn(item)
+    except Exception as e:
+        return item.result(False, error=str(e) or type(e).__name__)
+
+
+class _Sequencer:
+    """Chains the items of a shared session so they are answered in file order
+
+    An item can be answered once its session exists (``created``) and the
+    item before it in the same session has finished (``finished``);
+    whichever comes second hands it back. Waiting items stay in their chain
+    instead of holding a worker, so a session whose first item is slow to
+    create cannot tie up the workers needed by the rest of the batch.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last = {}
+
+    def link(self, item):
+        key = (item.app_name, item.user_id, item.session_id)
+        with self._lock:
+            previous = self._last.get(key)
+            self._last[key] = item
+            if previous is not None and not previous.finished:
+                previous.next = item
+                item.waiting = 2
+
+    def created(self, item, failed=False):
+        """The item's session creation is over; returns the item if it can be answered now"""
+        with self._lock:
+            item.failed = failed
+            return self._release(item)
+
+    def finished(self, item):
+        """An answered item is done; returns the next item of its session if that can be answered now"""
+        with self._lock:
+            item.finished = True
+            return self._release(item.next)
+
+    def _release(self, item):
+        # Called with the lock held, when one of the item's conditions is met
+        while item is not None:
+            item.waiting -= 1
+            if item.waiting:
+                return None
+            if not item.failed:
+                return item
+            # Its creation failed, so there is nothing to answer: pass the turn on
+            item.finished = True
+            item = item.next
+        return None
+
+
+_STOP = object()
+
+
+def run_batch(items, create, answer, concurrency):
+    """Answer batch items on ``concurrency`` threads, yielding results as they complete
+
+    ``create(item)`` makes sure the item's session exists and returns an
+    error result or None; ``answer(item)`` returns the item's result. A
+    quarter as many threads run ``create`` up to ``concurrency`` items
+    ahead of the answering threads, so session creation is pipelined with
+    answering instead of adding to each question's latency. Only items
+    whose session is free are queued for answering; the thread that answers
+    an item goes on with the next item of the same session. Closing the
+    generator (the client went away) stops taking new items.
+    """
+    items = iter(items)
+    creators = max(1, concurrency // 4)
+    ready = queue.Queue(maxsize=concurrency)
+    results = queue.Queue()
+    stop = threading.Event()
+    lock = threading.Lock()
+    sequencer = _Sequencer()
+    remaining = {'creators': creators, 'answerers': concurrency}
+
+    def put(target, value):
+        while not stop.is_set():
+            try:
+                target.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def finish(role, target, sentinels):
+        with lock:
+            remaining[role] -= 1
+            last = remaining[role] == 0
+        if last:
+            for _ in range(sentinels):
+                put(target, _STOP)
+
+    def create_sessions():
+        try:
+            while not stop.is_set():
+                with lock:
+                    item = next(items, None)
+                    if item is not None and item.error is None:
+                        sequencer.link(item)
+                if item is None:
+                    return
+                item.started = time.perf_counter()
+                if item.error is not None:
+                    results.put(item.result(False, error=item.error))
+                    continue
+                failure = _call(create, item)
+                if failure is not None:
+                    results.put(failure)
+                item = sequencer.created(item, failed=failure is not None)
+                if item is not None:
+                    put(ready, item)
+        finally:
+            finish('creators', ready, concurrency)
+
+    def answer_items():
+        try:
+            while True:
+                item = ready.get()
+                if item is _STOP:
+                    return
+                while item is not None:
+                    if stop.is_set():
+                        return
+                    results.put(_call(answer, item))
+                    item = sequencer.finished(item)
+        finally:
+            finish('answerers', results, 1)
+
+    # Each thread runs in a copy of the caller's context, so the request's trace carries over
+    threads = [threading.Thread(target=contextvars.copy_context().run, args=(create_sessions,), daemon=True)
+               for _ in range(creators)]
+    threads += [threading.Thread(target=contextvars.copy_context().run, args=(answer_items,), daemon=True)
+                for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            result = results.get()
+            if result is _STOP:
+                return
+            yield result
+    finally:
+        stop.set()
+        # Wake answering threads still waiting for work
+        for _ in range(concurrency):
+            try:
+                ready.put_nowait(_STOP)
+            except queue.Full:
+                break
+
+
+async def run_batch_async(items, create, answer, concurrency):
+    """asyncio version of run_batch: coroutines ``create`` and ``answer`` on ``concurrency`` tasks
+
+    Closing the generator cancels the work still in progress.
+    """
+    items = iter(items)
+    creators = max(1, concurrency // 4)
+    ready = asyncio.Queue(maxsize=concurrency)
+    results = asyncio.Queue()
+    sequencer = _Sequencer()
+
+    async def call(fn, item):
+        try:
+            return await fn(item)
+        except Exception as e:
+            return item.result(False, error=str(e) or type(e).__name__)
+
+    async def create_sessions():
+        for item in items:
+            item.started = time.perf_counter()
+            if item.error is not None:
+                results.put_nowait(item.result(False, error=item.error))
+                continue
+            sequencer.link(item)
+            failure = await call(create, item)
+            if failure is not None:
+                results.put_nowait(failure)
+            item = sequencer.created(item, failed=failure is not None)
+            if item is not None:
+                await ready.put(item)
+
+    async def answer_items():
+        while True:
+            item = await ready.get()
+            if item is _STOP:
+                return
+            while item is not None:
+                results.put_nowait(await call(answer, item))
+                item = sequencer.finished(item)
+
+    async def run():
+        await asyncio.gather(*(create_sessions() for _ in range(creators)))
+        for _ in range(concurrency):
+            await ready.put(_STOP)
+        await asyncio.gather(*answerers)
+        results.put_nowait(_STOP)
+
+    answerers = [asyncio.ensure_future(answer_items()) for _ in range(concurrency)]
+    runner = asyncio.ensure_future(run())
+    try:
+        while True:
+            result = await results.get()
+            if result is _STOP:
+                return
+            yield result
+    finally:
+        runner.cancel()
+        for task in answerers:
+            task.cancel()
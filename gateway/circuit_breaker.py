@@ -0,0 +1,139 @@
+import math
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the backend while a route's circuit is open"""
+
+    def __init__(self, route, retry_after):
+        super().__init__(f"Circuit for backend route '{route}' is open; retry in {retry_after:.1f}s")
+        self.route = route
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self):
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class CircuitBreaker:
+    """Closed/open/half-open circuit breaker for one backend route
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls fail immediately. Once ``reset_timeout`` seconds have passed it goes
+    half-open and lets ``half_open_max_calls`` trial calls through; a success
+    closes it again, a failure re-opens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, route, failure_threshold=5, reset_timeout=30.0, half_open_max_calls=1,
+                 clock=time.monotonic):
+        self.route = route
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trial_calls = 0
+        self.trial_started_at = None
+        self.rejected = 0
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call must not reach the backend"""
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self.opened_at + self.reset_timeout - self._clock()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.route, remaining)
+                self.state = self.HALF_OPEN
+                self.trial_calls = 0
+            if self.state == self.HALF_OPEN:
+                now = self._clock()
+                if self.trial_calls >= self.half_open_max_calls:
+                    # A trial that never reported back (e.g. a cancelled request)
+                    # must not keep the circuit half-open forever
+                    if now - self.trial_started_at < self.reset_timeout:
+                        self.rejected += 1
+                        raise CircuitOpenError(self.route, self.trial_started_at + self.reset_timeout - now)
+                    self.trial_calls = 0
+                if self.trial_calls == 0:
+                    self.trial_started_at = now
+                self.trial_calls += 1
+
+    def check(self):
+        """Raise CircuitOpenError while the circuit is open, without using up a trial call"""
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self.opened_at + self.reset_timeout - self._clock()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.route, remaining)
+
+    def is_open(self):
+        """Whether calls are being turned away right now, without counting a rejection"""
+        with self._lock:
+            return self.state == self.OPEN and self._clock() < self.opened_at + self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self._clock()
+
+    def snapshot(self):
+        with self._lock:
+            retry_after = None
+            if self.state == self.OPEN:
+                retry_after = round(max(0.0, self.opened_at + self.reset_timeout - self._clock()), 3)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "failure_threshold": self.failure_threshold,
+                "retry_after_seconds": retry_after,
+                "rejected": self.rejected,
+            }
+
+
+class CircuitBreakerSet:
+    """One CircuitBreaker per backend route, created on first use"""
+
+    def __init__(self, thresholds=None, default_threshold=5, reset_timeout=30.0, half_open_max_calls=1):
+        self.thresholds = thresholds or {}
+        self.default_threshold = default_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def for_route(self, route):
+        breaker = self._breakers.get(route)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(route, CircuitBreaker(
+                    route,
+                    failure_threshold=self.thresholds.get(route, self.default_threshold),
+                    reset_timeout=self.reset_timeout,
+                    half_open_max_calls=self.half_open_max_calls,
+                ))
+        return breaker
+
+    def any_open(self):
+        """Whether some route's calls are being turned away right now"""
+        return any(breaker.is_open() for breaker in list(self._breakers.values()))
+
+    def snapshot(self):
+        return {route: breaker.snapshot() for route, breaker in sorted(self._breakers.items())}
@@ -0,0 +1,70 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Preferred order when the client accepts several encodings
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+
+def accepted_encodings(accept_encoding):
+    """Content codings an Accept-Encoding header allows (q > 0)"""
+    accepted = set()
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            accepted.add(coding)
+    return accepted
+
+
+def negotiate(accept_encoding, available=ENCODINGS):
+    """Pick the preferred encoding from ``available`` the client accepts, or None for identity"""
+    accepted = accepted_encodings(accept_encoding)
+    for encoding in available:
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return None
+
+
+def compress(body, encoding, level=None):
+    """Compress ``body`` (bytes) with ``encoding`` ('br' or 'gzip')"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=11 if level is None else level)
+    return gzip.compress(body, compresslevel=9 if level is None else level, mtime=0)
+
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'image/svg+xml')
+
+
+def is_compressible(content_type):
+    # text/event-stream is excluded: compressing it would buffer the stream
+    return bool(content_type) and content_type.startswith(COMPRESSIBLE_TYPES) \
+        and not content_type.startswith('text/event-stream')
+
+
+def maybe_compress(body, content_type, accept_encoding, min_size=1024, levels=None):
+    """Compress a complete response body if it is large enough and the client accepts it
+
+    Returns ``(encoding, body)``; ``encoding`` is None when the body is left as is.
+    """
+    if len(body) < min_size or not is_compressible(content_type):
+        return None, body
+    encoding = negotiate(accept_encoding)
+    if encoding is None:
+        return None, body
+    compressed = compress(body, encoding, (levels or {}).get(encoding))
+    if len(compressed) >= len(body):
+        return None, body
+    return encoding, compressed
@@ -0,0 +1,216 @@
+import os
+
+from .settings import Settings
+
+# Every setting below can be overridden by the environment variable of the
+# same name or by a key in the JSON/TOML file named by GATEWAY_CONFIG (the
+# environment wins). Values are validated once, when this module is first
+# imported, and the gateway refuses to start if any of them is invalid.
+settings = Settings(os.environ, os.environ.get("GATEWAY_CONFIG"))
+
+# Backend configuration
+BACKEND_URL = settings.string("BACKEND_URL", "http://127.0.0.1:8000")
+DEFAULT_APP_NAME = settings.string("DEFAULT_APP_NAME", "app")  # Must match your backend app name
+DEFAULT_USER_ID = settings.string("DEFAULT_USER_ID", "user")
+
+# Several ADK replicas instead of the one at BACKEND_URL (comma-separated
+# URLs). Each session's calls go to the replica that owns app:user:session
+# on a consistent hash ring with BACKEND_HASH_VNODES points per replica, so
+# its state stays on one replica. While a replica fails its health probe
+# (HEALTH_PROBE_INTERVAL), has an open circuit, or could not be connected
+# to on BACKEND_EJECT_AFTER_FAILURES calls in a row (until a call or probe
+# succeeds), its sessions move to the next replica on the ring and are
+# recreated there without their history.
+BACKEND_URLS = settings.string_list("BACKEND_URLS", []) or [BACKEND_URL]
+BACKEND_HASH_VNODES = settings.integer("BACKEND_HASH_VNODES", 160, minimum=1)
+BACKEND_EJECT_AFTER_FAILURES = settings.integer("BACKEND_EJECT_AFTER_FAILURES", 3, minimum=1)
+
+# Shared backend connection pool (keep-alive, per-route timeouts, retries)
+BACKEND_POOL_SIZE = settings.integer("BACKEND_POOL_SIZE", 20, minimum=1)
+BACKEND_KEEP_ALIVE = settings.boolean("BACKEND_KEEP_ALIVE", True)
+BACKEND_TIMEOUTS = settings.mapping("BACKEND_TIMEOUTS", {
+    "list_apps": 5.0,
+    "create_session": 10.0,
+    "delete_session": 10.0,
+    "run": 30.0,  # Longer timeout for AI responses
+    "run_sse": 30.0,  # Applies between streamed chunks, not to the whole answer
+}, minimum=0.1)
+BACKEND_RETRIES = settings.integer("BACKEND_RETRIES", 2, minimum=0)
+BACKEND_RETRY_BACKOFF = settings.number("BACKEND_RETRY_BACKOFF", 0.2, minimum=0)
+
+# Async (ASGI) mode keeps one connection per in-flight chat, so it needs a
+# much larger pool than the threaded Flask server
+ASYNC_BACKEND_POOL_SIZE = settings.integer("ASYNC_BACKEND_POOL_SIZE", 1000, minimum=1)
+
+# Registry of sessions already created on the backend. Use a sqlite:/// URL
+# to share it between gunicorn workers on the same host.
+SESSION_REGISTRY_URL = settings.string("SESSION_REGISTRY_URL", "memory://")
+SESSION_REGISTRY_MAX_SIZE = settings.integer("SESSION_REGISTRY_MAX_SIZE", 100_000, minimum=1)
+# Seconds since a session was last used
+SESSION_REGISTRY_TTL = settings.number("SESSION_REGISTRY_TTL", 24 * 3600.0, minimum=1)
+
+# Opt-in pool of sessions pre-created for DEFAULT_APP_NAME and
+# DEFAULT_USER_ID, so a new conversation starts without a session creation
+# round trip: its session ID is bound, in the registry above, to a pooled
+# backend session. Each worker refills its own pool of SESSION_POOL_SIZE in
+# the background; pooled sessions idle for SESSION_POOL_MAX_IDLE seconds
+# are deleted and replaced. SESSION_POOL_REFILL_CONCURRENCY creations run at
+# once, so a pool keeps up with that many new conversations per session
+# creation latency (4 per 50 ms: 80/s). The registry is then the only
+# record of which backend session a conversation uses, so it must be shared
+# (sqlite:///) between workers (serve.py refuses to start otherwise). It
+# never evicts a binding to make room, only after SESSION_REGISTRY_TTL
+# unused: once SESSION_REGISTRY_MAX_SIZE conversations are bound, new ones
+# get a session created for them instead of a pooled one.
+SESSION_POOL_ENABLED = settings.boolean("SESSION_POOL_ENABLED", False)
+SESSION_POOL_SIZE = settings.integer("SESSION_POOL_SIZE", 16, minimum=1)
+SESSION_POOL_MAX_IDLE = settings.number("SESSION_POOL_MAX_IDLE", 600.0, minimum=1)
+SESSION_POOL_REFILL_CONCURRENCY = settings.integer("SESSION_POOL_REFILL_CONCURRENCY", 4, minimum=1)
+SESSION_POOL_REFILL_INTERVAL = settings.number("SESSION_POOL_REFILL_INTERVAL", 1.0, minimum=0.01)
+
+# Opt-in cache of answers to first-turn questions. Set
+# RESPONSE_CACHE_ENABLED=1 to turn it on. Only the first turn of a session
+# the gateway has just created is answered from the cache; its question is
+# sent to the agent, as it was asked, ahead of the conversation's next
+# turn. Both are tracked in a SESSION_REGISTRY_URL registry, which must be
+# shared (sqlite:///) when several workers serve the gateway. serve.py
+# refuses to start otherwise.
+RESPONSE_CACHE_ENABLED = settings.boolean("RESPONSE_CACHE_ENABLED", False)
+RESPONSE_CACHE_MAX_SIZE = settings.integer("RESPONSE_CACHE_MAX_SIZE", 1000, minimum=1)
+RESPONSE_CACHE_TTL = settings.number("RESPONSE_CACHE_TTL", 3600.0, minimum=1)
+
+# Background backend health probing behind /health
+HEALTH_PROBE_INTERVAL = settings.number("HEALTH_PROBE_INTERVAL", 5.0, minimum=0.1)
+HEALTH_PROBE_MAX_BACKOFF = settings.number("HEALTH_PROBE_MAX_BACKOFF", 60.0, minimum=0.1)
+
+# Chat UI delivery: the page is revalidated with its ETag on every load,
+# fingerprinted CSS/JS are cached for a year; set UI_INLINE_ASSETS=1 to
+# inline them into the page instead
+UI_INLINE_ASSETS = settings.boolean("UI_INLINE_ASSETS", False)
+UI_PAGE_CACHE_CONTROL = settings.string("UI_PAGE_CACHE_CONTROL", "no-cache")
+UI_ASSET_CACHE_CONTROL = settings.string("UI_ASSET_CACHE_CONTROL", "public, max-age=31536000, immutable")
+
+# API responses: JSON encoder ("auto" uses orjson when installed, else
+# "stdlib"), and gzip/brotli for bodies of at least COMPRESSION_MIN_SIZE
+# bytes, at levels cheap enough to run per response
+JSON_ENCODER = settings.choice("JSON_ENCODER", "auto", ("auto", "orjson", "stdlib"))
+COMPRESSION_MIN_SIZE = settings.integer("COMPRESSION_MIN_SIZE", 1024, minimum=0)
+COMPRESSION_LEVELS = settings.mapping(
+    "COMPRESSION_LEVELS", {"br": 4, "gzip": 6}, minimum=0, maximum={"br": 11, "gzip": 9}
+)
+
+# /run bodies are read and parsed in chunks of this many bytes
+RUN_BODY_CHUNK_SIZE = settings.integer("RUN_BODY_CHUNK_SIZE", 64 * 1024, minimum=1024)
+
+# Circuit breaker per backend route: consecutive failures (errors, timeouts
+# or 5xx) before the route fails fast, and seconds before a trial call
+CIRCUIT_BREAKER_THRESHOLDS = settings.mapping("CIRCUIT_BREAKER_THRESHOLDS", {
+    "list_apps": 3,
+    "create_session": 5,
+    "delete_session": 5,
+    "run": 5,
+    "run_sse": 5,
+}, minimum=1)
+CIRCUIT_BREAKER_RESET_TIMEOUT = settings.number("CIRCUIT_BREAKER_RESET_TIMEOUT", 30.0, minimum=0.1)
+
+# Opt-in capture of /create_session and /chat traffic (with gateway and
+# backend timings) to a JSONL file for python -m benchmarks.replay. Records
+# are written by a background thread; beyond TRAFFIC_CAPTURE_MAX_BUFFER
+# unwritten records new ones are dropped instead of slowing requests down.
+# As in logs, chat messages are redacted (replaced by filler of the same
+# length) unless TRAFFIC_CAPTURE_CHAT_TEXT is "full".
+TRAFFIC_CAPTURE_ENABLED = settings.boolean("TRAFFIC_CAPTURE_ENABLED", False)
+TRAFFIC_CAPTURE_PATH = settings.string("TRAFFIC_CAPTURE_PATH", "requests.jsonl")
+TRAFFIC_CAPTURE_CHAT_TEXT = settings.choice("TRAFFIC_CAPTURE_CHAT_TEXT", "redact", ("redact", "full"))
+TRAFFIC_CAPTURE_MAX_BUFFER = settings.integer("TRAFFIC_CAPTURE_MAX_BUFFER", 10_000, minimum=1)
+TRAFFIC_CAPTURE_FLUSH_INTERVAL = settings.number("TRAFFIC_CAPTURE_FLUSH_INTERVAL", 1.0, minimum=0.01)
+
+# Opt-in admission control in front of /create_session and /chat: a token
+# bucket per user_id (ADMISSION_RATE requests per second, bursts of up to
+# ADMISSION_BURST) and caps on requests in flight per user and per session;
+# None turns a limit off. Requests over a limit get a 429 with Retry-After.
+# Requests without a user_id all share DEFAULT_USER_ID, hence opt-in. Use a
+# sqlite:/// URL to enforce the limits across gunicorn workers on one host.
+ADMISSION_CONTROL_ENABLED = settings.boolean("ADMISSION_CONTROL_ENABLED", False)
+ADMISSION_STORE_URL = settings.string("ADMISSION_STORE_URL", "memory://")
+ADMISSION_RATE = settings.number("ADMISSION_RATE", 2.0, minimum=0.001, optional=True)
+ADMISSION_BURST = settings.integer("ADMISSION_BURST", 10, minimum=1)
+ADMISSION_MAX_IN_FLIGHT_PER_USER = settings.integer("ADMISSION_MAX_IN_FLIGHT_PER_USER", 4, minimum=1, optional=True)
+# Admitted turns wait their turn in the session queue
+ADMISSION_MAX_IN_FLIGHT_PER_SESSION = settings.integer(
+    "ADMISSION_MAX_IN_FLIGHT_PER_SESSION", 4, minimum=1, optional=True
+)
+# Suggested wait after an in-flight cap rejection
+ADMISSION_RETRY_AFTER = settings.number("ADMISSION_RETRY_AFTER", 1.0, minimum=0)
+# Shared store: in-flight slots of crashed workers expire after this
+ADMISSION_LEASE_TTL = settings.number("ADMISSION_LEASE_TTL", 120.0, minimum=1)
+
+# Chat turns of one session reach the backend one at a time, in arrival
+# order. A request with the Idempotency-Key header of one in flight, or of
+# one that arrived less than SESSION_QUEUE_DEDUP_WINDOW seconds ago (e.g. a
+# client retry or double submit), shares that answer; requests without the
+# header always reach the agent. The bundled chat UIs send a key per
+# message. Turns beyond SESSION_QUEUE_MAX_DEPTH waiting per session, or
+# waiting longer than SESSION_QUEUE_TIMEOUT seconds, get a 429. Queued first
+# turns of a new session no longer share its creation through the client's
+# single-flight: the first turn creates it and the rest find it registered.
+SESSION_QUEUE_DEDUP_WINDOW = settings.number("SESSION_QUEUE_DEDUP_WINDOW", 5.0, minimum=0)
+SESSION_QUEUE_MAX_DEPTH = settings.integer("SESSION_QUEUE_MAX_DEPTH", 8, minimum=0)
+SESSION_QUEUE_TIMEOUT = settings.number("SESSION_QUEUE_TIMEOUT", 60.0, minimum=0.1)
+
+# /chat/batch: questions answered at once per request (?concurrency=N, at
+# most BATCH_MAX_CONCURRENCY; the Flask server is also held to its backend
+# pool size) and the most questions a single request may carry
+BATCH_DEFAULT_CONCURRENCY = settings.integer("BATCH_DEFAULT_CONCURRENCY", 8, minimum=1)
+BATCH_MAX_CONCURRENCY = settings.integer("BATCH_MAX_CONCURRENCY", 64, minimum=1)
+BATCH_MAX_ITEMS = settings.integer("BATCH_MAX_ITEMS", 50_000, minimum=1)
+
+# Tracing of session and chat requests: a span per stage (session queue,
+# backend calls, /run body parsing), a W3C traceparent header on backend
+# calls and the trace ID echoed as X-Trace-Id and "trace_id". The last
+# TRACING_MAX_TRACES sampled traces are kept in process for /debug/traces;
+# set TRACING_EXPORT_PATH to also append them to a JSONL file.
+TRACING_ENABLED = settings.boolean("TRACING_ENABLED", True)
+TRACING_SAMPLE_RATE = settings.number("TRACING_SAMPLE_RATE", 1.0, minimum=0, maximum=1)
+TRACING_MAX_TRACES = settings.integer("TRACING_MAX_TRACES", 1000, minimum=1)
+TRACING_EXPORT_PATH = settings.string("TRACING_EXPORT_PATH", "")
+
+# /debug/profile: on-demand sampling profiler (stack of every thread each
+# PROFILING_SAMPLE_INTERVAL seconds, optionally tracemalloc allocations)
+# for ?seconds=N or ?requests=N, never longer than PROFILING_MAX_SECONDS.
+# Each profile covers the worker process that serves the request. Off
+# unless PROFILING_ENABLED, as it exposes code paths and file names.
+PROFILING_ENABLED = settings.boolean("PROFILING_ENABLED", False)
+PROFILING_SAMPLE_INTERVAL = settings.number("PROFILING_SAMPLE_INTERVAL", 0.01, minimum=0.001, maximum=1)
+PROFILING_MAX_SECONDS = settings.number("PROFILING_MAX_SECONDS", 60.0, minimum=1)
+PROFILING_TOP = settings.integer("PROFILING_TOP", 25, minimum=1)
+
+# Logging: structured records (LOG_FORMAT json or text) are buffered and
+# written in batches by a background thread, so a request never waits on
+# stderr; past LOG_MAX_BUFFER unwritten records new ones are dropped and
+# counted. Chat text logged with a record is redacted to its length unless
+# LOG_CHAT_TEXT is "sample" (kept in LOG_CHAT_TEXT_SAMPLE_RATE of records)
+# or "full". LOG_ASYNC=0 writes on the request thread instead.
+LOG_LEVEL = settings.choice("LOG_LEVEL", "INFO", ("DEBUG", "INFO", "WARNING", "ERROR"))
+LOG_FORMAT = settings.choice("LOG_FORMAT", "json", ("json", "text"))
+LOG_ASYNC = settings.boolean("LOG_ASYNC", True)
+LOG_MAX_BUFFER = settings.integer("LOG_MAX_BUFFER", 10_000, minimum=1)
+LOG_CHAT_TEXT = settings.choice("LOG_CHAT_TEXT", "redact", ("redact", "sample", "full"))
+LOG_CHAT_TEXT_SAMPLE_RATE = settings.number("LOG_CHAT_TEXT_SAMPLE_RATE", 0.01, minimum=0, maximum=1)
+
+# Serving: `python serve.py` runs the Flask app under gunicorn (SERVER_WORKERS
+# processes of SERVER_THREADS threads each) or the ASGI app under uvicorn
+# (SERVER_WORKERS event loops). Per-process state (memory:// registries,
+# caches, limits) is not shared between workers; use sqlite:/// URLs for the
+# stores that support them. SERVER_DEBUG only affects `python main.py`, the
+# Werkzeug development server.
+SERVER_MODE = settings.choice("SERVER_MODE", "asgi", ("flask", "asgi"))
+SERVER_HOST = settings.string("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = settings.integer("SERVER_PORT", 5000, minimum=1, maximum=65535)
+SERVER_WORKERS = settings.integer("SERVER_WORKERS", os.cpu_count() or 1, minimum=1)
+SERVER_THREADS = settings.integer("SERVER_THREADS", 16, minimum=1)
+SERVER_BACKLOG = settings.integer("SERVER_BACKLOG", 2048, minimum=1)
+SERVER_GRACEFUL_TIMEOUT = settings.integer("SERVER_GRACEFUL_TIMEOUT", 30, minimum=0)
+SERVER_DEBUG = settings.boolean("SERVER_DEBUG", False)
+
+settings.check()
@@ -0,0 +1,202 @@
+import logging
+
+from .json_stream import JSONArrayParser, NotAJSONArray
+
+logger = logging.getLogger(__name__)
+
+
+UNEXPECTED_FORMAT_MESSAGE = "I'm sorry, I received an unexpected response format."
+NO_RESPONSE_MESSAGE = (
+    "I'm sorry, I'm having trouble processing your request right now. "
+    "Please try rephrasing your question."
+)
+
+
+class EventSummary:
+    """Everything the gateway needs from one agent run, collected in a single pass
+
+    ``texts`` holds the model text of each final model event, in event order.
+    """
+
+    __slots__ = ('events_count', 'texts', 'fallback', 'valid')
+
+    def __init__(self, events_count=0, texts=None, fallback=None, valid=True):
+        self.events_count = events_count
+        self.texts = texts or []
+        # Last tool part worth reporting when the model produced no text
+        self.fallback = fallback
+        self.valid = valid
+
+    @property
+    def text(self):
+        """All model text, one paragraph per model turn"""
+        return '\n\n'.join(self.texts)
+
+    def response(self):
+        """Text to show the user, falling back to tool activity when the model said nothing
+
+        This is the text of every model turn, as /chat/stream shows it, so a
+        run that talks between tool calls answers with all of it (until the
+        single-pass summary, /chat answered with the last turn's text only).
+        """
+        if not self.valid:
+            return UNEXPECTED_FORMAT_MESSAGE
+        if self.texts:
+            return self.text
+        if self.fallback is not None:
+            if 'functionCall' in self.fallback:
+                name = self.fallback['functionCall'].get('name', 'unknown function')
+                return f"I'm processing your request using {name}. Please wait a moment for the response."
+            return self.fallback['functionResponse']['response']['output']
+        logger.warning("Could not extract meaningful response from events")
+        return NO_RESPONSE_MESSAGE
+
+
+class EventSummarizer:
+    """Build an EventSummary from batches of events as they are parsed
+
+    Of the tool calls and outputs only the fallback part is kept, so memory
+    stays bounded by the model text even for long agent traces.
+    """
+
+    def __init__(self):
+        self.events_count = 0
+        self.texts = []
+        self.fallback = None
+
+    def feed(self, events):
+        """Add a batch (list) of events in order"""
+        texts = self.texts
+        fallback = self.fallback
+        for event in events:
+            if type(event) is not dict:
+                continue
+            content = event.get('content')
+            if type(content) is not dict:
+                continue
+            parts = content.get('parts')
+            if not parts:
+                continue
+            is_model_text = content.get('role') == 'model' and not event.get('partial')
+            text = ''
+            event_fallback = None
+            for part in parts:
+                if type(part) is not dict:
+                    continue
+                # ADK parts carry one of text, functionCall, functionResponse, ...
+                if 'text' in part:
+                    if is_model_text and type(part['text']) is str:
+                        text += part['text']
+                elif 'functionCall' in part:
+                    if event_fallback is None and type(part['functionCall']) is dict:
+                        event_fallback = part
+                elif 'functionResponse' in part:
+                    result = part['functionResponse']
+                    if event_fallback is None and type(result) is dict:
+                        output = result.get('response')
+                        if type(output) is dict and 'output' in output:
+                            event_fallback = part
+            if text:
+                text = text.strip()
+                if text:
+                    texts.append(text)
+            if event_fallback is not None:
+                fallback = event_fallback
+        self.fallback = fallback
+        self.events_count += len(events)
+        return self
+
+    def summary(self):
+        return EventSummary(self.events_count, self.texts, self.fallback)
+
+
+def summarize_events(events):
+    """Summarize the events list returned by /run (or the final /run_sse events) in one pass"""
+    if not isinstance(events, list):
+        logger.warning("Response is not a list of events")
+        return EventSummary(valid=False)
+    return EventSummarizer().feed(events).summary()
+
+
+def summarize_run_body(chunks):
+    """Summarize a /run body from its raw byte chunks, parsing one event at a time
+
+    Only the model text and the fallback tool part are kept, so peak memory
+    does not grow with the size of the agent trace.
+    """
+    parser = JSONArrayParser()
+    summarizer = EventSummarizer()
+    try:
+        for chunk in chunks:
+            summarizer.feed(parser.feed(chunk))
+        summarizer.feed(parser.close())
+    except NotAJSONArray:
+        logger.warning("Response is not a list of events")
+        return EventSummary(valid=False)
+    return summarizer.summary()
+
+
+async def summarize_run_body_async(chunks):
+    """summarize_run_body for an async iterator of chunks"""
+    parser = JSONArrayParser()
+    summarizer = EventSummarizer()
+    try:
+        async for chunk in chunks:
+            summarizer.feed(parser.feed(chunk))
+        summarizer.feed(parser.close())
+    except NotAJSONArray:
+        logger.warning("Response is not a list of events")
+        return EventSummary(valid=False)
+    return summarizer.summary()
+
+
+class StreamingTextExtractor:
+    """Incrementally extract the AI response from /run_sse events
+
+    ``feed`` returns the new text to show for each event: partial events carry
+    text deltas, and the final (non-partial) event of a model turn repeats the
+    whole turn, so only the part that has not been streamed yet is returned.
+    """
+
+    def __init__(self):
+        self.events_count = 0
+        self.final_events = []
+        self._turn_text = ''
+        self._emitted = False
+
+    def feed(self, event):
+        self.events_count += 1
+        if not isinstance(event, dict):
+            return ''
+
+        text = _model_text(event)
+        starts_turn = not self._turn_text
+        if event.get('partial'):
+            delta = text
+            self._turn_text += text
+        else:
+            self.final_events.append(event)
+            streamed, self._turn_text = self._turn_text, ''
+            delta = text[len(streamed):] if text.startswith(streamed) else ''
+
+        if not delta:
+            return ''
+        # Separate the text of consecutive model turns (e.g. around tool calls)
+        if starts_turn and self._emitted:
+            delta = '\n\n' + delta
+        self._emitted = True
+        return delta
+
+    def summary(self):
+        """Summary of the final events, using the same rules as the /chat endpoint"""
+        return summarize_events(self.final_events)
+
+
+def _model_text(event):
+    content = event.get('content') or {}
+    if content.get('role') != 'model':
+        return ''
+    return ''.join(
+        part['text'] for part in content.get('parts') or []
+        if isinstance(part, dict) and isinstance(part.get('text'), str)
+    )
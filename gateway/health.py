@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class BackendHealthProber:
+    """Keeps a cached view of backend health, refreshed in the background
+
+    ``probe`` raises (or, when run with run_async, is a coroutine function that
+    raises) if the backend is unhealthy. Probes repeat every ``interval``
+    seconds; after failures the delay backs off exponentially up to
+    ``max_backoff``. Every delay is jittered so many gateway workers do not
+    probe in lockstep.
+    """
+
+    def __init__(self, probe, interval=5.0, max_backoff=60.0, jitter=0.2, clock=time.monotonic):
+        self.probe = probe
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+        self.connected = False
+        self.last_checked = None  # clock() time of the last completed probe
+        self.last_checked_at = None  # wall-clock time of the same probe
+        self.last_error = None
+        self.consecutive_failures = 0
+
+    def next_delay(self):
+        """Seconds to wait before the next probe"""
+        delay = min(self.max_backoff, self.interval * (2 ** self.consecutive_failures))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def record(self, error=None):
+        with self._lock:
+            self.connected = error is None
+            self.last_checked = self._clock()
+            self.last_checked_at = datetime.now()
+            if error is None:
+                self.consecutive_failures = 0
+            else:
+                self.consecutive_failures += 1
+                self.last_error = f"{type(error).__name__}: {error}"
+
+    def probe_once(self):
+        try:
+            self.probe()
+        except Exception as e:
+            self.record(e)
+        else:
+            self.record()
+
+    def start(self):
+        """Start probing on a daemon thread (no-op if already running)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='backend-health-prober', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.probe_once()
+            self._stopped.wait(self.next_delay())
+
+    async def run_async(self):
+        """Probe loop for an asyncio server; ``probe`` must be a coroutine function"""
+        while not self._stopped.is_set():
+            try:
+                await self.probe()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.record(e)
+            else:
+                self.record()
+            await asyncio.sleep(self.next_delay())
+
+    def stop(self):
+        self._stopped.set()
+
+    def join(self, timeout=None):
+        """Wait for the probing thread to exit after ``stop``, letting a probe in progress finish"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def snapshot(self):
+        """Cached status with its age; never touches the backend"""
+        with self._lock:
+            checked = self.last_checked
+            return {
+                "backend_connected": self.connected,
+                "checked_at": self.last_checked_at.isoformat() if self.last_checked_at else None,
+                "staleness_seconds": round(self._clock() - checked, 3) if checked is not None else None,
+                "last_error": self.last_error,
+                "consecutive_failures": self.consecutive_failures,
+            }
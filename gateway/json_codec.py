@@ -0,0 +1,65 @@
+import datetime
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder is the fallback
+    orjson = None
+
+
+class JSONCodec:
+    """A named pair of ``dumps`` (object -> UTF-8 bytes) and ``loads`` functions"""
+
+    def __init__(self, name, dumps, loads):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+
+def _default(obj):
+    # Match orjson, which serializes datetimes natively
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+CODECS = {'stdlib': JSONCodec('stdlib', _stdlib_dumps, json.loads)}
+if orjson is not None:
+    CODECS['orjson'] = JSONCodec(
+        'orjson',
+        lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS),
+        orjson.loads,
+    )
+
+
+def get_codec(name='auto'):
+    """Codec by name; 'auto' picks orjson when it is installed"""
+    if name == 'auto':
+        name = 'orjson' if 'orjson' in CODECS else 'stdlib'
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"JSON encoder '{name}' is not available (choose from: auto, {', '.join(CODECS)})")
+
+
+# Process-wide codec used by the API responses and SSE frames; see use()
+codec = get_codec()
+
+
+def use(name):
+    """Switch the process-wide codec"""
+    global codec
+    codec = get_codec(name)
+    return codec
+
+
+def dumps(obj):
+    return codec.dumps(obj)
+
+
+def loads(data):
+    return codec.loads(data)
@@ -0,0 +1,98 @@
+import codecs
+import json
+import re
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_NUMBER_CONTINUATION = frozenset('.eE+-')
+
+
+class NotAJSONArray(ValueError):
+    """The body does not start with '[' (e.g. an error object)"""
+
+
+class JSONArrayParser:
+    """Incremental parser for a body that is one top-level JSON array
+
+    Feed raw byte chunks as they arrive; each array item is returned as soon
+    as it is complete, so only one item (plus the unparsed tail) is held in
+    memory at a time instead of the whole document. An item that is still
+    incomplete is re-parsed only once the buffered text has doubled, which
+    keeps the work linear for items larger than a chunk.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._pending = []
+        self._size = 0
+        self._retry_at = 0
+        self._state = 'start'
+
+    def feed(self, chunk):
+        """Consume a chunk of the body and return the items completed by it"""
+        text = self._decoder.decode(chunk)
+        if text:
+            self._pending.append(text)
+            self._size += len(text)
+        if self._size < self._retry_at:
+            return []
+        return self._parse(final=False)
+
+    def close(self):
+        """Finish the body, returning any last items; raises if the array is incomplete"""
+        text = self._decoder.decode(b'', final=True)
+        if text:
+            self._pending.append(text)
+        items = self._parse(final=True)
+        if self._state != 'done':
+            raise json.JSONDecodeError("Unterminated JSON array", self._buffer, len(self._buffer))
+        return items
+
+    def _parse(self, final):
+        if self._pending:
+            self._buffer += ''.join(self._pending)
+            self._pending = []
+        buffer, state = self._buffer, self._state
+        end = len(buffer)
+        pos = 0
+        items = []
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos == end or state == 'done':
+                break
+            char = buffer[pos]
+            if state == 'start':
+                if char != '[':
+                    raise NotAJSONArray(f"Expected a JSON array, got {char!r}")
+                state = 'first'
+                pos += 1
+            elif state == 'after_item':
+                if char == ',':
+                    state = 'item'
+                elif char == ']':
+                    state = 'done'
+                else:
+                    raise json.JSONDecodeError("Expected ',' or ']'", buffer, pos)
+                pos += 1
+            elif state == 'first' and char == ']':
+                state = 'done'
+                pos += 1
+            else:
+                try:
+                    item, item_end = self._json.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    break
+                # A number cut by the chunk boundary (e.g. "2" of "2.5") may continue
+                if not final and (item_end == end or buffer[item_end] in _NUMBER_CONTINUATION):
+                    break
+                items.append(item)
+                state = 'after_item'
+                pos = item_end
+
+        self._buffer, self._state = buffer[pos:], state
+        self._size = len(self._buffer)
+        self._retry_at = 2 * self._size if self._size else 0
+        return items
@@ -0,0 +1,204 @@
+import logging
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+
+from . import json_codec
+from .metrics import LOG_RECORDS_DROPPED
+
+# ``extra`` fields holding chat text, which is redacted unless configured otherwise
+CHAT_TEXT_FIELDS = frozenset({'chat_message', 'chat_response'})
+
+# Attributes every LogRecord has; anything else on a record came from ``extra``
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class ChatTextPolicy:
+    """What a log record may show of chat text: 'redact', 'sample' or 'full'
+
+    Redacted text is replaced by its length. With 'sample', ``sample_rate``
+    of the records keep their chat text and the rest are redacted.
+    """
+
+    def __init__(self, mode='redact', sample_rate=0.01, random=random.random):
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self._random = random
+
+    def fields(self, record):
+        """The record's ``extra`` fields, with chat text handled per the policy"""
+        fields = {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+        if self.mode == 'full' or not CHAT_TEXT_FIELDS & fields.keys():
+            return fields
+        if self.mode == 'sample' and self._random() < self.sample_rate:
+            return fields
+        for key in CHAT_TEXT_FIELDS & fields.keys():
+            text = fields[key]
+            fields[key] = f"[redacted {len(text)} chars]" if isinstance(text, str) else "[redacted]"
+        return fields
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and the ``extra`` fields"""
+
+    def __init__(self, policy=None):
+        super().__init__()
+        self.policy = policy or ChatTextPolicy()
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **self.policy.fields(record),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json_codec.dumps(entry).decode()
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines, with the ``extra`` fields appended as key=value"""
+
+    def __init__(self, policy=None):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+        self.policy = policy or ChatTextPolicy()
+
+    def formatMessage(self, record):
+        line = super().formatMessage(record)
+        fields = self.policy.fields(record)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value!r}" for key, value in fields.items())
+        return line
+
+
+class BufferedLogHandler(logging.Handler):
+    """Buffers records for a background thread that formats and writes them with ``output``
+
+    Handling a record on the caller's thread is a lock and a list append:
+    the message is not formatted there (so log arguments must not be
+    mutated after the call), and the writer thread is only woken once
+    ``batch_size`` records are waiting, otherwise every ``flush_interval``
+    seconds, writing each batch with a single write. When ``max_buffer``
+    records are already waiting new ones are dropped and counted.
+    """
+
+    def __init__(self, output, max_buffer=10_000, batch_size=256, flush_interval=0.1):
+        super().__init__()
+        self.output = output
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def handle(self, record):
+        # Handler.handle would also take the handler lock around emit
+        if self.filter(record):
+            self.emit(record)
+        return record
+
+    def emit(self, record):
+        with self._cond:
+            if self._closed or len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                LOG_RECORDS_DROPPED.inc()
+                return
+            self._buffer.append(record)
+            if len(self._buffer) == self.batch_size:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if len(self._buffer) < self.batch_size and not self._closed:
+                    self._cond.wait(self.flush_interval)
+                batch, self._buffer = self._buffer, []
+                closed = self._closed
+            if batch:
+                self._write(batch)
+            if closed and not batch:
+                return
+
+    def _write(self, records):
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.output.format(record))
+            except Exception:
+                self.output.handleError(record)
+        if not lines:
+            return
+        try:
+            self.output.stream.write('\n'.join(lines) + '\n')
+            self.output.flush()
+        except Exception:
+            self.output.handleError(records[-1])
+
+    def close(self, timeout=5.0):
+        """Write out what is still buffered and stop the writer thread"""
+        with self._cond:
+            if not self._closed:
+                self._closed = True
+                self._cond.notify()
+        self._thread.join(timeout)
+        super().close()
+
+    def stats(self):
+        return {
+            "async": True,
+            "buffered": len(self._buffer),
+            "max_buffer": self.max_buffer,
+            "dropped": self.dropped,
+        }
+
+
+class LogPipeline:
+    """Root logging set up by ``configure_logging``; ``stop`` writes out buffered records"""
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    def stop(self):
+        if isinstance(self.handler, BufferedLogHandler):
+            self.handler.close()
+
+    def stats(self):
+        if isinstance(self.handler, BufferedLogHandler):
+            return self.handler.stats()
+        return {"async": False}
+
+
+def configure_logging(level='INFO', fmt='json', async_=True, max_buffer=10_000, chat_text='redact',
+                      sample_rate=0.01, stream=None):
+    """Replace the root logger's handlers with the gateway's structured pipeline
+
+    With ``async_`` the request path only buffers records; a background
+    thread formats them (``fmt`` 'json' or 'text') and writes them to
+    ``stream`` (stderr by default). Records no longer carry the caller's
+    file, line, process or thread, which none of the formats show and which
+    cost a stack walk and several calls per record.
+    """
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    policy = ChatTextPolicy(chat_text, sample_rate)
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JSONFormatter(policy) if fmt == 'json' else TextFormatter(policy))
+
+    handler = BufferedLogHandler(output, max_buffer=max_buffer) if async_ else output
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    return LogPipeline(handler)
@@ -0,0 +1,271 @@
+import bisect
+import re
+import threading
+from contextvars import ContextVar
+
+# Latency buckets (seconds) covering fast gateway hops up to slow agent turns
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+EVENTS_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_FLASK_PARAMETER = re.compile(r'<(?:[^<>:]+:)?([^<>:]+)>')
+_STARLETTE_PARAMETER = re.compile(r'\{([^{}:]+)(?::[^{}]+)?\}')
+
+
+def route_label(template):
+    """A route template as a label, the same in both serving modes: every parameter becomes {name}"""
+    return _STARLETTE_PARAMETER.sub(r'{\1}', _FLASK_PARAMETER.sub(r'{\1}', template))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items):
+        for labels, value in items:
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+
+class Counter(_Metric):
+    """Monotonic count per label combination"""
+
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+
+class Gauge(_Metric):
+    """Value that goes up and down per label combination (e.g. requests in flight)"""
+
+    kind = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def set_function(self, function, *labels):
+        """Report ``function()`` as the value, computed when read (for state kept elsewhere)"""
+        self.set(function, *labels)
+
+    def value(self, *labels):
+        value = self._values.get(labels, 0)
+        return value() if callable(value) else value
+
+    def _render_samples(self, items):
+        return super()._render_samples((labels, value() if callable(value) else value) for labels, value in items)
+
+
+class Histogram(_Metric):
+    """Bucketed distribution per label combination
+
+    Only the matching bucket is incremented on observe; cumulative counts are
+    computed when the metrics are rendered, keeping the hot path to one
+    bisect and a few additions under the lock.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), then sum
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, *labels):
+        state = self._values.get(labels)
+        return sum(state[0]) if state else 0
+
+    def _render_samples(self, items):
+        bounds = self.buckets + (float('inf'),)
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}'
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry shared by the clients and both serving modes. Values
+# are not shared between processes: with several workers (serve.py), each
+# /metrics scrape is answered by one worker and shows only its own requests,
+# so scrape each worker (or run one worker per container) to see them all.
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    'gateway_http_requests_total', 'Gateway HTTP requests by route, method and status',
+    ('route', 'method', 'status'),
+)
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    'gateway_http_request_duration_seconds', 'Gateway HTTP request latency until the last byte is sent',
+    ('route', 'method'),
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    'gateway_http_requests_in_flight', 'Gateway HTTP requests currently being handled',
+    ('route',),
+)
+BACKEND_REQUESTS = REGISTRY.counter(
+    'gateway_backend_requests_total', 'ADK backend calls by route and status (or error type)',
+    ('route', 'status'),
+)
+BACKEND_REQUEST_DURATION = REGISTRY.histogram(
+    'gateway_backend_request_duration_seconds', 'ADK backend call latency until response headers',
+    ('route',),
+)
+BACKEND_IN_FLIGHT = REGISTRY.gauge(
+    'gateway_backend_requests_in_flight', 'ADK backend calls currently waiting for a response',
+    ('route',),
+)
+ADMISSION_REJECTIONS = REGISTRY.counter(
+    'gateway_admission_rejections_total', 'Requests answered 429 by admission control, by route and reason',
+    ('route', 'reason'),
+)
+SESSION_QUEUE_DEPTH = REGISTRY.gauge(
+    'gateway_session_queue_depth', 'Chat turns waiting for an earlier turn of the same session to finish',
+)
+SESSION_QUEUE_SESSIONS = REGISTRY.gauge(
+    'gateway_session_queue_sessions', 'Sessions with a chat turn in progress',
+)
+SESSION_QUEUE_WAIT = REGISTRY.histogram(
+    'gateway_session_queue_wait_seconds', 'Time chat turns waited for their session',
+)
+SESSION_QUEUE_TURNS = REGISTRY.counter(
+    'gateway_session_queue_turns_total',
+    'Chat turns by outcome (executed, deduplicated, full, timeout, cancelled)',
+    ('outcome',),
+)
+CHAT_EVENTS = REGISTRY.histogram(
+    'gateway_chat_events_per_response', 'ADK events returned per chat answer',
+    ('endpoint',), buckets=EVENTS_BUCKETS,
+)
+LOG_RECORDS_DROPPED = REGISTRY.counter(
+    'gateway_log_records_dropped_total', 'Log records dropped because the logging queue was full',
+)
+SESSION_POOL_REQUESTS = REGISTRY.counter(
+    'gateway_session_pool_requests_total',
+    'New conversations by whether a pre-created session was ready (hit) or not (miss)',
+    ('outcome',),
+)
+SESSION_POOL_IDLE = REGISTRY.gauge(
+    'gateway_session_pool_idle_sessions', 'Pre-created sessions waiting to be handed out',
+)
+SESSION_POOL_SESSIONS = REGISTRY.counter(
+    'gateway_session_pool_sessions_total', 'Pre-created sessions by event (created, expired, failed)',
+    ('event',),
+)
+BACKEND_REPLICA_REQUESTS = REGISTRY.counter(
+    'gateway_backend_replica_requests_total', 'ADK backend calls by replica, route and status (or error type)',
+    ('replica', 'route', 'status'),
+)
+BACKEND_REPLICA_REQUEST_DURATION = REGISTRY.histogram(
+    'gateway_backend_replica_request_duration_seconds', 'ADK backend call latency until response headers, by replica',
+    ('replica',),
+)
+BACKEND_REPLICA_HEALTHY = REGISTRY.gauge(
+    'gateway_backend_replica_healthy', 'Whether the replica is in rotation (1) or ejected (0), as /health reports it',
+    ('replica',),
+)
+BACKEND_REPLICA_FAILOVERS = REGISTRY.counter(
+    'gateway_backend_replica_failovers_total', "Calls for a replica's sessions sent to another replica instead",
+    ('replica',),
+)
+BACKEND_REPLICA_SESSIONS_RECREATED = REGISTRY.counter(
+    'gateway_backend_replica_sessions_recreated_total', 'Sessions recreated on a replica that did not have them',
+    ('replica',),
+)
+
+# Backend calls made while handling the current request, collected only when
+# something (such as traffic capture) sets a list here for the request
+backend_calls = ContextVar('backend_calls', default=None)
+
+
+def record_backend_call(route, status, seconds, replica=None):
+    """Record a finished ADK backend call (status is the HTTP status or an error type)"""
+    BACKEND_REQUEST_DURATION.observe(seconds, route)
+    BACKEND_REQUESTS.inc(route, status)
+    if replica is not None:
+        BACKEND_REPLICA_REQUEST_DURATION.observe(seconds, replica)
+        BACKEND_REPLICA_REQUESTS.inc(replica, route, status)
+    calls = backend_calls.get()
+    if calls is not None:
+        calls.append({"route": route, "status": status, "ms": round(seconds * 1000, 3)})
@@ -0,0 +1,214 @@
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# Thread names differing only by a trailing number (pool workers) share a flame graph root
+_THREAD_NUMBER = re.compile(r'[-_\d]+$')
+
+
+class ProfilerBusy(Exception):
+    """Another profile is already running in this process"""
+
+
+def _frame_label(code):
+    # Function and first line, so samples anywhere in a function merge into one frame
+    path = code.co_filename.replace('\\', '/').rsplit('/', 2)
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+class Profile:
+    """One profiling run: stack samples of every thread, and optionally allocations
+
+    A background thread samples the stack of every thread each ``interval``
+    seconds (``sys._current_frames``, so the threads being profiled do no
+    extra work) until ``seconds`` have passed or, if given, ``requests``
+    requests have finished. Samples are wall-clock: a thread waiting on I/O
+    or a lock is counted where it waits. With ``memory``, tracemalloc
+    traces allocations for the run, which slows every allocation down
+    while it lasts. Threads waiting for the result (``wait``) are left out of the samples.
+    """
+
+    def __init__(self, seconds, requests=None, interval=0.01, memory=False, top=25, memory_frames=1):
+        self.seconds = seconds
+        self.requests = requests
+        self.interval = interval
+        self.memory = memory
+        self.top = top
+        self.memory_frames = memory_frames
+        self.samples = 0
+        self.finished_requests = 0
+        self.stopped_by = None
+        self._stacks = Counter()
+        self._stack_numbers = {}
+        self._excluded = set()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+        self._snapshot = None
+        self._result = None
+        self._result_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def start(self):
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.memory_frames)
+                self._started_tracemalloc = True
+            self._snapshot = tracemalloc.take_snapshot()
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def request_finished(self):
+        if self._done.is_set():
+            return
+        with self._lock:
+            self.finished_requests += 1
+            reached = self.requests is not None and self.finished_requests >= self.requests
+        if reached:
+            self._stop('requests')
+
+    def _stop(self, reason):
+        with self._lock:
+            if not self._done.is_set():
+                self.stopped_by = reason
+                self.duration = time.perf_counter() - self.started
+                self._done.set()
+
+    def _run(self):
+        me = threading.get_ident()
+        deadline = self.started + self.seconds
+        # Thread -> (innermost frame, its stack's number) at the last sample. A
+        # frame's callers never change, so a thread still in the same frame
+        # (waiting, mostly) has the same stack, and it is not walked again.
+        # Stacks are counted by number: hashing code objects is not cheap.
+        last = {}
+        stack_numbers = self._stack_numbers
+        while not self._done.is_set():
+            for ident, frame in sys._current_frames().items():
+                if ident == me or ident in self._excluded:
+                    continue
+                previous = last.get(ident)
+                if previous is not None and previous[0] is frame:
+                    number = previous[1]
+                else:
+                    stack = []
+                    caller = frame
+                    while caller is not None:
+                        stack.append(caller.f_code)
+                        caller = caller.f_back
+                    number = stack_numbers.setdefault(tuple(stack), len(stack_numbers))
+                    last[ident] = (frame, number)
+                self._stacks[ident, number] += 1
+            self.samples += 1
+            if time.perf_counter() >= deadline:
+                self._stop('seconds')
+                break
+            self._done.wait(self.interval)
+
+    def wait(self):
+        """Block until the run is over, then return its result"""
+        self._excluded.add(threading.get_ident())
+        self._done.wait()
+        self._thread.join()
+        with self._result_lock:
+            if self._result is None:
+                self._result = self._summarize()
+        return self._result
+
+    def _summarize(self):
+        thread_names = {thread.ident: _THREAD_NUMBER.sub('', thread.name) or thread.name
+                        for thread in threading.enumerate()}
+        labels = {}
+
+        def label(code):
+            if code not in labels:
+                labels[code] = _frame_label(code)
+            return labels[code]
+
+        stacks = {number: stack for stack, number in self._stack_numbers.items()}
+        collapsed = Counter()
+        self_samples = Counter()
+        for (ident, number), count in self._stacks.items():
+            stack = stacks[number]
+            frames = [label(code) for code in reversed(stack)]
+            thread = thread_names.get(ident, 'exited-thread')
+            collapsed[';'.join([thread, *frames])] += count
+            if frames:
+                self_samples[frames[-1]] += count
+        total = sum(self_samples.values()) or 1
+        return {
+            "duration_s": round(self.duration, 3),
+            "stopped_by": self.stopped_by,
+            "interval_s": self.interval,
+            "samples": self.samples,
+            "requests": self.finished_requests,
+            # One "root;...;leaf count" line per distinct stack (flamegraph.pl / speedscope input)
+            "collapsed": ''.join(f"{stack} {count}\n" for stack, count in sorted(collapsed.items())),
+            "top_functions": [
+                {"function": function, "self_samples": count, "self_percent": round(count * 100 / total, 2)}
+                for function, count in self_samples.most_common(self.top)
+            ],
+            "allocations": self._allocations() if self.memory else None,
+        }
+
+    def _allocations(self):
+        """The top allocation sites by growth over the run, from tracemalloc"""
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        snapshot = tracemalloc.take_snapshot().filter_traces(ignore)
+        current, peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        stats = snapshot.compare_to(self._snapshot.filter_traces(ignore), 'lineno')
+        return {
+            "traced_current_kb": round(current / 1024, 1),
+            "traced_peak_kb": round(peak / 1024, 1),
+            "top": [
+                {
+                    "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_kb": round(stat.size / 1024, 1),
+                    "size_diff_kb": round(stat.size_diff / 1024, 1),
+                    "count": stat.count,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in stats[:self.top]
+            ],
+        }
+
+
+class Profiler:
+    """Runs one ``Profile`` at a time for /debug/profile and counts the requests it covers"""
+
+    def __init__(self, interval=0.01, max_seconds=60.0, default_seconds=10.0, top=25):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.default_seconds = default_seconds
+        self.top = top
+        self._lock = threading.Lock()
+        self._active = None
+
+    def start(self, seconds=None, requests=None, memory=False, top=None):
+        """Start a profile of ``seconds``, or until ``requests`` finish, never past ``max_seconds``
+
+        Raises ProfilerBusy while another profile runs.
+        """
+        if not seconds:
+            seconds = self.max_seconds if requests else self.default_seconds
+        seconds = min(seconds, self.max_seconds)
+        with self._lock:
+            if self._active is not None and not self._active.done:
+                raise ProfilerBusy("A profile is already running")
+            self._active = Profile(seconds, requests, self.interval, memory, top or self.top)
+            return self._active.start()
+
+    def request_finished(self):
+        profile = self._active
+        if profile is not None:
+            profile.request_finished()
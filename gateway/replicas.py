@@ -0,0 +1,374 @@
+import asyncio
+import bisect
+import hashlib
+from contextlib import asynccontextmanager
+
+import aiohttp
+import requests
+from urllib3.exceptions import ConnectTimeoutError
+
+from .circuit_breaker import CircuitOpenError
+from .health import BackendHealthProber
+from .metrics import BACKEND_REPLICA_FAILOVERS, BACKEND_REPLICA_HEALTHY, BACKEND_REPLICA_SESSIONS_RECREATED
+
+
+def _hash(value):
+    # Stable across processes (unlike hash()), so every worker routes alike
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+def _not_sent(error):
+    """Whether a requests error happened before the request reached the backend (it could not connect)"""
+    if isinstance(error, CircuitOpenError):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    # NewConnectionError (refused, unreachable) is a ConnectTimeoutError too
+    return isinstance(reason, ConnectTimeoutError)
+
+
+class HashRing:
+    """Consistent hash ring over replica names, with ``vnodes`` points per replica
+
+    A key belongs to the replica of the first point at or after the key's
+    hash, wrapping around. Adding or removing a replica only moves the keys
+    of the points it gains or loses (about 1/n of them), and the many points
+    per replica spread the keys evenly.
+    """
+
+    def __init__(self, names, vnodes=160):
+        self.names = list(names)
+        self.vnodes = vnodes
+        points = sorted((_hash(f"{name}#{i}"), name) for name in self.names for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [name for _, name in points]
+
+    def owner(self, key):
+        index = bisect.bisect_left(self._hashes, _hash(key))
+        return self._owners[index % len(self._owners)]
+
+    def preference(self, key):
+        """Every replica name, in the order a key falls back to them: its owner first"""
+        start = bisect.bisect_left(self._hashes, _hash(key))
+        seen = []
+        for i in range(len(self._owners)):
+            name = self._owners[(start + i) % len(self._owners)]
+            if name not in seen:
+                seen.append(name)
+                if len(seen) == len(self.names):
+                    break
+        return seen
+
+    def shares(self):
+        """Fraction of the hash space (and so of the keys) each replica owns"""
+        shares = dict.fromkeys(self.names, 0)
+        previous = self._hashes[-1] - 2 ** 64
+        for point, name in zip(self._hashes, self._owners):
+            shares[name] += point - previous
+            previous = point
+        return {name: share / 2 ** 64 for name, share in shares.items()}
+
+
+class Replica(BackendHealthProber):
+    """One backend replica: its client, and its health as probed and as seen by calls
+
+    The replica is ejected from routing while its last probe failed; after
+    ``eject_after`` calls in a row could not connect to it, until a call or
+    probe succeeds again; and while any route's circuit is open. Failed
+    calls do not count as failed probes, so they never stretch the probe
+    backoff. Ejection covers every route alike, so all the calls of a
+    session keep going to the same replica.
+    """
+
+    def __init__(self, name, client, probe, eject_after=3, **kwargs):
+        super().__init__(probe, **kwargs)
+        self.name = name
+        self.client = client
+        self.eject_after = eject_after
+        self.call_failures = 0
+        BACKEND_REPLICA_HEALTHY.set_function(lambda: 1 if self.available else 0, name)
+
+    def record(self, error=None):
+        super().record(error)
+        if error is None:
+            with self._lock:
+                self.call_failures = 0
+
+    def record_call(self, error=None):
+        """Count a call that could not connect (``error``), or reset the count after one that did"""
+        with self._lock:
+            self.call_failures = self.call_failures + 1 if error is not None else 0
+
+    @property
+    def available(self):
+        return (
+            self.consecutive_failures == 0
+            and self.call_failures < self.eject_after
+            and not self.client.breakers.any_open()
+        )
+
+    def snapshot(self):
+        return {"url": self.name, "ejected": not self.available, "call_failures": self.call_failures,
+                **super().snapshot()}
+
+
+class _PerReplica:
+    """One component (``breakers``, ``singleflight``) of every replica's client, reported per replica"""
+
+    def __init__(self, replicas, attribute):
+        self.replicas = replicas
+        self.attribute = attribute
+
+    def snapshot(self):
+        return {replica.name: getattr(replica.client, self.attribute).snapshot() for replica in self.replicas}
+
+    def stats(self):
+        return {replica.name: getattr(replica.client, self.attribute).stats() for replica in self.replicas}
+
+
+class BackendReplicaSet:
+    """Several ADK replicas behind the BackendClient interface, with session affinity
+
+    Each session's calls go to the owner of ``app:user:session`` on a
+    HashRing of the clients (BackendClient, one per replica, keyed by
+    ``base_url``), so the state of a session stays on one replica. Ejected
+    replicas (see Replica) are skipped: their sessions go to the next
+    replica on the ring, and come back once they recover. A call that
+    cannot connect is sent once more, to the next replica, and counts
+    towards ejecting its own after ``eject_after`` such calls in a row; a
+    call its replica's circuit turned away is sent on too. A run that finds
+    its session missing (after a failover, or on a restarted replica)
+    recreates it with ``session_state(app_name, user_id)`` and is sent once
+    more: the conversation carries on, without its earlier turns. With
+    every replica ejected, calls go to the owner.
+    """
+
+    def __init__(self, clients, session_state, vnodes=160, probe_interval=5.0, probe_max_backoff=60.0,
+                 eject_after=3):
+        self.replicas = [
+            Replica(client.base_url, client, self._probe(client), eject_after=eject_after,
+                    interval=probe_interval, max_backoff=probe_max_backoff)
+            for client in clients
+        ]
+        self._by_name = {replica.name: replica for replica in self.replicas}
+        self.ring = HashRing(list(self._by_name), vnodes)
+        self.session_state = session_state
+        self.base_url = ','.join(self._by_name)
+        self.breakers = _PerReplica(self.replicas, 'breakers')
+        self.singleflight = _PerReplica(self.replicas, 'singleflight')
+
+    @staticmethod
+    def _probe(client):
+        def probe():
+            response = client.list_apps()
+            if response.status_code != 200:
+                raise RuntimeError(f"Backend returned status {response.status_code}")
+        return probe
+
+    def _candidates(self, session):
+        """Replicas in the order a session's calls fall back to them (any order if ``session`` is None)"""
+        if session is None:
+            return self.replicas
+        return [self._by_name[name] for name in self.ring.preference(':'.join(session))]
+
+    def replica_for(self, app_name, user_id, session_id):
+        """The replica that serves a session's calls now"""
+        candidates = self._candidates((app_name, user_id, session_id))
+        return next((replica for replica in candidates if replica.available), candidates[0])
+
+    def for_session(self, app_name, user_id, session_id):
+        """The client that serves a session's calls now"""
+        return self.replica_for(app_name, user_id, session_id).client
+
+    def _choose(self, session, exclude=None):
+        """The replica for a call of ``session``, counting failovers; None if only ``exclude`` is left"""
+        candidates = self._candidates(session)
+        owner = candidates[0]
+        for replica in candidates:
+            if replica.available and replica is not exclude:
+                if session is not None and replica is not owner:
+                    BACKEND_REPLICA_FAILOVERS.inc(owner.name)
+                return replica
+        # Every replica is ejected: the owner's circuit or connection error is the answer
+        return owner if owner is not exclude else None
+
+    def _call(self, session, call):
+        """(replica, ``call(client)``) on the session's replica, or on any replica if ``session`` is None"""
+        replica = self._choose(session)
+        try:
+            result = call(replica.client)
+        except (requests.exceptions.ConnectionError, CircuitOpenError) as e:
+            # Only when nothing reached the replica can the next one take the
+            # call. Failing to connect counts towards ejecting the replica.
+            if not _not_sent(e):
+                raise
+            if not isinstance(e, CircuitOpenError):
+                replica.record_call(e)
+            fallback = self._choose(session, exclude=replica)
+            if fallback is None:
+                raise
+            replica, result = fallback, call(fallback.client)
+        if replica.call_failures:
+            replica.record_call()
+        return replica, result
+
+    def _recreate(self, replica, app_name, user_id, session_id):
+        response = replica.client.create_session(app_name, user_id, session_id, self.session_state(app_name, user_id))
+        if response.status_code != 200:
+            return False
+        BACKEND_REPLICA_SESSIONS_RECREATED.inc(replica.name)
+        return True
+
+    def _run(self, method, payload):
+        session = (payload["appName"], payload["userId"], payload["sessionId"])
+        replica, response = self._call(session, lambda client: getattr(client, method)(payload))
+        if response.status_code == 404 and self._recreate(replica, *session):
+            response.close()
+            response = getattr(replica.client, method)(payload)
+        return response
+
+    def list_apps(self):
+        return self._call(None, lambda client: client.list_apps())[1]
+
+    def create_session(self, app_name, user_id, session_id, state):
+        return self._call((app_name, user_id, session_id),
+                          lambda client: client.create_session(app_name, user_id, session_id, state))[1]
+
+    def delete_session(self, app_name, user_id, session_id):
+        return self._call((app_name, user_id, session_id),
+                          lambda client: client.delete_session(app_name, user_id, session_id))[1]
+
+    def run(self, payload):
+        return self._run('run', payload)
+
+    def run_stream(self, payload):
+        return self._run('run_stream', payload)
+
+    def run_sse(self, payload):
+        return self._run('run_sse', payload)
+
+    def start(self):
+        """Probe every replica on its own daemon thread"""
+        for replica in self.replicas:
+            replica.start()
+
+    def stop(self):
+        for replica in self.replicas:
+            replica.stop()
+
+    def join(self, timeout=None):
+        for replica in self.replicas:
+            replica.join(timeout)
+
+    def status(self):
+        """Overall backend health in BackendHealthProber.snapshot's shape: connected while a replica is available
+
+        The replicas' own probes stand in for a separate probe of the set.
+        """
+        replicas = [replica.snapshot() for replica in self.replicas]
+        checked = [replica for replica in replicas if replica["checked_at"] is not None]
+        freshest = min(checked, key=lambda replica: replica["staleness_seconds"], default=None)
+        return {
+            "backend_connected": any(not replica["ejected"] for replica in checked),
+            "checked_at": freshest["checked_at"] if freshest else None,
+            "staleness_seconds": freshest["staleness_seconds"] if freshest else None,
+            "last_error": next((replica["last_error"] for replica in replicas if replica["ejected"]), None),
+            "consecutive_failures": min(replica["consecutive_failures"] for replica in replicas),
+        }
+
+    def snapshot(self):
+        """Each replica's health and share of the sessions, for /health"""
+        shares = self.ring.shares()
+        return [{**replica.snapshot(), "ring_share": round(shares[replica.name], 4)} for replica in self.replicas]
+
+    def close(self):
+        for replica in self.replicas:
+            replica.client.close()
+
+
+class AsyncBackendReplicaSet(BackendReplicaSet):
+    """BackendReplicaSet over AsyncBackendClients, for the ASGI gateway; probe with ``run_async``"""
+
+    @staticmethod
+    def _probe(client):
+        async def probe():
+            response = await client.list_apps()
+            if response.status_code != 200:
+                raise RuntimeError(f"Backend returned status {response.status_code}")
+        return probe
+
+    async def _call(self, session, call):
+        replica = self._choose(session)
+        try:
+            result = await call(replica.client)
+        except (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError, CircuitOpenError) as e:
+            # Connect errors and connect timeouts never reach the replica (a
+            # read timeout might have), so the next one can take the call
+            if not isinstance(e, CircuitOpenError):
+                replica.record_call(e)
+            fallback = self._choose(session, exclude=replica)
+            if fallback is None:
+                raise
+            replica, result = fallback, await call(fallback.client)
+        if replica.call_failures:
+            replica.record_call()
+        return replica, result
+
+    async def _recreate(self, replica, app_name, user_id, session_id):
+        response = await replica.client.create_session(
+            app_name, user_id, session_id, self.session_state(app_name, user_id)
+        )
+        if response.status_code != 200:
+            return False
+        BACKEND_REPLICA_SESSIONS_RECREATED.inc(replica.name)
+        return True
+
+    async def list_apps(self):
+        return (await self._call(None, lambda client: client.list_apps()))[1]
+
+    async def create_session(self, app_name, user_id, session_id, state):
+        return (await self._call((app_name, user_id, session_id),
+                                 lambda client: client.create_session(app_name, user_id, session_id, state)))[1]
+
+    async def delete_session(self, app_name, user_id, session_id):
+        return (await self._call((app_name, user_id, session_id),
+                                 lambda client: client.delete_session(app_name, user_id, session_id)))[1]
+
+    async def run(self, payload):
+        session = (payload["appName"], payload["userId"], payload["sessionId"])
+        replica, response = await self._call(session, lambda client: client.run(payload))
+        if response.status_code == 404 and await self._recreate(replica, *session):
+            response = await replica.client.run(payload)
+        return response
+
+    def run_stream(self, payload):
+        return self._stream('run_stream', payload)
+
+    def run_sse(self, payload):
+        return self._stream('run_sse', payload)
+
+    @asynccontextmanager
+    async def _stream(self, method, payload):
+        session = (payload["appName"], payload["userId"], payload["sessionId"])
+
+        async def open_stream(client):
+            stream = getattr(client, method)(payload)
+            return stream, await stream.__aenter__()
+
+        replica, (stream, response) = await self._call(session, open_stream)
+        try:
+            if response.status == 404 and await self._recreate(replica, *session):
+                previous, stream = stream, None
+                await previous.__aexit__(None, None, None)
+                stream, response = await open_stream(replica.client)
+            yield response
+        finally:
+            if stream is not None:
+                await stream.__aexit__(None, None, None)
+
+    async def run_async(self):
+        """Probe every replica, each in its own loop, until cancelled"""
+        await asyncio.gather(*(replica.run_async() for replica in self.replicas))
+
+    async def close(self):
+        for replica in self.replicas:
+            await replica.client.close()
@@ -0,0 +1,125 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from . import json_codec
+from .session_registry import RegistryFullError
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(text):
+    """Canonical form of a question: case, accents, punctuation and spacing removed"""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = _PUNCTUATION.sub(' ', text.casefold())
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+class ResponseCache:
+    """Bounded LRU/TTL cache of answers to first-turn questions
+
+    Answers are keyed on the agent (ADK app name) and the normalised question,
+    so "What are the symptoms of flu?" and "what are the symptoms of FLU"
+    share an entry. ``conversations`` is a SessionRegistry of the sessions
+    whose backend session has had no turn yet: '' once the gateway has just
+    created it (``record_new_session``), or the question of a first turn
+    answered from the cache, which the agent is sent as it was asked before
+    the conversation's next turn (``pending_turn``). Only sessions recorded
+    as new are answered from the cache, so one the registry has forgotten
+    bypasses it rather than losing its context; pending questions are
+    bindings the registry does not evict to make room. ``conversations``
+    must be shared by every worker that serves the conversation.
+    """
+
+    def __init__(self, conversations, max_size=1000, ttl=3600, clock=time.monotonic):
+        self.conversations = conversations
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expiry time, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted_lru = 0
+        self.evicted_expired = 0
+
+    @staticmethod
+    def key(app_name, message):
+        return f"{app_name}\x00{normalize_question(message)}"
+
+    def record_new_session(self, session_key):
+        """Mark a backend session the gateway has just created, so its first turn may come from the cache"""
+        self.conversations.add(session_key)
+
+    def lookup(self, app_name, session_key, message):
+        """Return (cache_key, cached answer) for a turn; cache_key is None if it must bypass
+
+        A cached answer keeps ``message`` as the session's pending turn, so
+        call this in the session's turn.
+        """
+        if self.conversations.get(session_key) != '':
+            return None, None
+        cache_key = self.key(app_name, message)
+        cached = self.get(cache_key)
+        if cached is not None:
+            try:
+                self.conversations.add(session_key, json_codec.dumps({"question": message}).decode())
+            except RegistryFullError:
+                # The question could not be kept for the agent: ask it instead
+                return cache_key, None
+        return cache_key, cached
+
+    def pending_turn(self, session_key):
+        """Question of a first turn answered from the cache that the agent has not been sent, or None"""
+        value = self.conversations.get(session_key)
+        return json_codec.loads(value)["question"] if value else None
+
+    def record_turn(self, session_key, cache_key=None, answer=None):
+        """Mark the session as having context (the agent has seen every turn) and cache a first-turn answer"""
+        self.conversations.discard(session_key)
+        if cache_key is not None and answer is not None:
+            self.set(cache_key, answer)
+
+    def get(self, key):
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                self.evicted_expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evicted_lru += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evicted_lru": self.evicted_lru,
+            "evicted_expired": self.evicted_expired,
+        }
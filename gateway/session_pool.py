@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+from .metrics import SESSION_POOL_IDLE, SESSION_POOL_REQUESTS, SESSION_POOL_SESSIONS
+
+logger = logging.getLogger(__name__)
+
+
+class PooledSession:
+    """A backend session created ahead of need, with the response that created it"""
+
+    __slots__ = ('session_id', 'response', 'created_at')
+
+    def __init__(self, session_id, response, created_at):
+        self.session_id = session_id
+        self.response = response
+        self.created_at = created_at
+
+
+class SessionPool:
+    """Backend sessions of one app and user, created before conversations need them
+
+    Background workers keep up to ``size`` idle sessions, creating up to
+    ``concurrency`` at once with ``create(session_id)`` (a backend response;
+    with run_async, a coroutine function), so the pool refills at about
+    ``concurrency`` / creation latency sessions per second; past that
+    arrival rate it runs dry. ``take`` hands the oldest one out
+    without touching the backend, or counts a miss when none is ready; the
+    gateway then binds the conversation's own session ID to it. Sessions
+    idle for ``max_idle`` seconds are dropped instead of handed out, and
+    passed to ``delete`` (if given) to remove them from the backend too.
+    """
+
+    def __init__(self, app_name, user_id, create, delete=None, size=16, max_idle=600.0, concurrency=4,
+                 refill_interval=1.0, id_prefix='pool-', clock=time.monotonic):
+        self.app_name = app_name
+        self.user_id = user_id
+        self.create = create
+        self.delete = delete
+        self.size = size
+        self.max_idle = max_idle
+        self.concurrency = concurrency
+        self.refill_interval = refill_interval
+        self.id_prefix = id_prefix
+        self._clock = clock
+        self._idle = deque()  # oldest first
+        self._creating = 0
+        self._expired = []  # waiting for ``delete``
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._async_wake = None  # set by run_async
+        self._stopped = threading.Event()
+        self._threads = []
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.expired = 0
+        self.failed = 0
+
+    def serves(self, app_name, user_id):
+        return app_name == self.app_name and user_id == self.user_id
+
+    def take(self):
+        """An idle session (a PooledSession), or None if none is ready"""
+        with self._lock:
+            self._expire(self._clock())
+            session = self._idle.popleft() if self._idle else None
+            if session is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if session is None:
+            SESSION_POOL_REQUESTS.inc('miss')
+        else:
+            SESSION_POOL_REQUESTS.inc('hit')
+            SESSION_POOL_IDLE.dec()
+        # Refill now rather than at the next interval
+        self._wake.set()
+        if self._async_wake is not None:
+            self._async_wake.set()
+        return session
+
+    def give_back(self, session):
+        """Return a session from ``take`` that could not be bound; it is handed out next"""
+        with self._lock:
+            self._idle.appendleft(session)
+        SESSION_POOL_IDLE.inc()
+
+    def _expire(self, now):
+        # Called with the lock held; the oldest sessions are at the front
+        while self._idle and now - self._idle[0].created_at >= self.max_idle:
+            self._expired.append(self._idle.popleft().session_id)
+            self.expired += 1
+            SESSION_POOL_IDLE.dec()
+            SESSION_POOL_SESSIONS.inc('expired')
+
+    def _reserve(self):
+        """Whether the pool is short of a session; if so its creation is counted as under way"""
+        with self._lock:
+            self._expire(self._clock())
+            if len(self._idle) + self._creating >= self.size:
+                return False
+            self._creating += 1
+            return True
+
+    def _expired_ids(self):
+        with self._lock:
+            expired, self._expired = self._expired, []
+        return expired
+
+    def _new_id(self):
+        return f"{self.id_prefix}{uuid.uuid4().hex}"
+
+    def _record(self, session_id, response=None, error=None):
+        """Keep a new session; False (stop refilling for now) if its creation failed"""
+        if error is None and response.status_code == 200:
+            with self._lock:
+                self._creating -= 1
+                self._idle.append(PooledSession(session_id, response, self._clock()))
+                self.created += 1
+            SESSION_POOL_IDLE.inc()
+            SESSION_POOL_SESSIONS.inc('created')
+            return True
+        with self._lock:
+            self._creating -= 1
+            self.failed += 1
+        SESSION_POOL_SESSIONS.inc('failed')
+        logger.warning("Failed to pre-create a session: %s",
+                       f"{type(error).__name__}: {error}" if error else f"backend returned {response.status_code}")
+        return False
+
+    def fill_once(self):
+        """Delete expired sessions, then create sessions until the pool is full
+
+        Returns False if a creation failed, leaving the pool short until the
+        next attempt.
+        """
+        for session_id in self._expired_ids():
+            if self.delete is not None:
+                try:
+                    self.delete(session_id)
+                except Exception as e:
+                    logger.info("Failed to delete expired pooled session: %s", e, extra={"session_id": session_id})
+        while not self._stopped.is_set() and self._reserve():
+            session_id = self._new_id()
+            try:
+                response = self.create(session_id)
+            except Exception as e:
+                return self._record(session_id, error=e)
+            if not self._record(session_id, response):
+                return False
+        return True
+
+    def start(self):
+        """Fill and refill the pool on ``concurrency`` daemon threads (no-op if already running)"""
+        with self._lock:
+            if self._threads:
+                return
+            self._threads = [threading.Thread(target=self._run, name='session-pool', daemon=True)
+                             for _ in range(self.concurrency)]
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.clear()
+            if self.fill_once():
+                self._wake.wait(self.refill_interval)
+            else:
+                # Do not let every miss retry against a failing backend
+                self._stopped.wait(self.refill_interval)
+
+    async def run_async(self):
+        """Refill loop for an asyncio server; ``create`` and ``delete`` must be coroutine functions"""
+        self._async_wake = asyncio.Event()
+        while not self._stopped.is_set():
+            self._async_wake.clear()
+            for session_id in self._expired_ids():
+                if self.delete is not None:
+                    try:
+                        await self.delete(session_id)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        logger.info("Failed to delete expired pooled session: %s", e,
+                                    extra={"session_id": session_id})
+            failed = False
+            while not failed and not self._stopped.is_set():
+                batch = []
+                while len(batch) < self.concurrency and self._reserve():
+                    batch.append(self._create_async())
+                if not batch:
+                    break
+                failed = not all(await asyncio.gather(*batch))
+            if failed:
+                await asyncio.sleep(self.refill_interval)
+                continue
+            try:
+                await asyncio.wait_for(self._async_wake.wait(), self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _create_async(self):
+        session_id = self._new_id()
+        try:
+            response = await self.create(session_id)
+        except asyncio.CancelledError:
+            with self._lock:
+                self._creating -= 1
+            raise
+        except Exception as e:
+            return self._record(session_id, error=e)
+        return self._record(session_id, response)
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def join(self, timeout=None):
+        """Wait for the refill threads to exit after ``stop``, letting creations in progress finish"""
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            idle = len(self._idle)
+            oldest = self._clock() - self._idle[0].created_at if self._idle else None
+        requests = self.hits + self.misses
+        return {
+            "app_name": self.app_name,
+            "user_id": self.user_id,
+            "size": self.size,
+            "idle": idle,
+            "creating": self._creating,
+            "oldest_idle_seconds": round(oldest, 3) if oldest is not None else None,
+            "max_idle_seconds": self.max_idle,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 4) if requests else None,
+            "created": self.created,
+            "expired": self.expired,
+            "failed": self.failed,
+        }
@@ -0,0 +1,267 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+from .metrics import SESSION_QUEUE_DEPTH, SESSION_QUEUE_SESSIONS, SESSION_QUEUE_TURNS, SESSION_QUEUE_WAIT
+
+
+class SessionBusyError(Exception):
+    """Raised when a turn cannot be queued ('full') or waited too long for its turn ('timeout')"""
+
+    def __init__(self, key, reason, retry_after):
+        super().__init__(f"Session {key!r} is busy ({reason}); retry in {retry_after:.1f}s")
+        self.key = key
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self):
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class Turn:
+    """One chat turn's place in its session's queue
+
+    ``result`` is set to the successful answer before ``release``, so a
+    retry of the same request (same idempotency key) can share it. A turn
+    handed out for such a retry has ``deduplicated`` set and its ``result``
+    filled in already; releasing it does nothing.
+    """
+
+    __slots__ = ('key', 'idempotency_key', 'result', 'deduplicated', 'arrived_at', '_queue', '_ready', '_done',
+                 '_released')
+
+    def __init__(self, queue, key, idempotency_key, ready, done, result=None, deduplicated=False, arrived_at=None):
+        self.key = key
+        self.idempotency_key = idempotency_key
+        self.result = result
+        self.deduplicated = deduplicated
+        self.arrived_at = arrived_at
+        self._queue = queue
+        self._ready = ready
+        self._done = done
+        self._released = deduplicated
+
+    def release(self):
+        """Let the session's next turn run; safe to call more than once"""
+        self._queue._release(self)
+
+
+class _SessionQueueBase:
+    """Bookkeeping shared by the thread and asyncio session queues
+
+    ``_lanes`` maps a session to its turns, the running one first, and is
+    dropped as soon as it is empty. ``_pending`` holds the turns not yet
+    finished and ``_recent`` the answers to turns that arrived less than the
+    dedup window ago, so memory follows the sessions active right now rather
+    than every session ever seen.
+    """
+
+    def __init__(self, dedup_window=5.0, max_depth=8, clock=time.monotonic):
+        self.dedup_window = dedup_window
+        self.max_depth = max_depth
+        self._clock = clock
+        self._lanes = {}
+        self._pending = {}  # (key, idempotency key) -> latest unfinished turn
+        self._recent = OrderedDict()  # (key, idempotency key) -> answered turn, in order of answer
+        self.executed = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.abandoned = 0
+
+    def _duplicate_of(self, key, idempotency_key):
+        now = self._clock()
+        # The window runs from the original turn's arrival. Answers are kept in
+        # the order they were given, which is about the order their turns
+        # arrived; one that outlives the front of the queue is checked below.
+        while self._recent:
+            if now - next(iter(self._recent.values())).arrived_at < self.dedup_window:
+                break
+            self._recent.popitem(last=False)
+        if idempotency_key is None or not self.dedup_window:
+            return None
+        pending = self._pending.get((key, idempotency_key))
+        if pending is not None:
+            return pending
+        answered = self._recent.get((key, idempotency_key))
+        if answered is not None and now - answered.arrived_at < self.dedup_window:
+            return answered
+        return None
+
+    def _share(self, original):
+        self.deduplicated += 1
+        SESSION_QUEUE_TURNS.inc('deduplicated')
+        return Turn(self, original.key, original.idempotency_key, None, None, original.result, deduplicated=True)
+
+    def _join(self, key, idempotency_key, ready, done):
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = deque()
+            SESSION_QUEUE_SESSIONS.inc()
+        elif len(lane) > self.max_depth:
+            self.rejected += 1
+            SESSION_QUEUE_TURNS.inc('full')
+            raise SessionBusyError(key, 'full', 1.0)
+        turn = Turn(self, key, idempotency_key, ready, done, arrived_at=self._clock())
+        lane.append(turn)
+        if idempotency_key is not None and self.dedup_window:
+            self._pending[(key, idempotency_key)] = turn
+        if len(lane) == 1:
+            turn._ready.set()
+        else:
+            SESSION_QUEUE_DEPTH.inc()
+        return turn
+
+    def _abandon(self, turn, outcome):
+        """Take a turn that gave up waiting ('timeout' or 'cancelled') out of its lane"""
+        self._lanes[turn.key].remove(turn)
+        SESSION_QUEUE_DEPTH.dec()
+        self._forget(turn)
+        turn._released = True
+        self._gave_up(outcome)
+
+    def _gave_up(self, outcome='timeout'):
+        self.abandoned += 1
+        SESSION_QUEUE_TURNS.inc(outcome)
+
+    def _started(self, waited_since):
+        SESSION_QUEUE_WAIT.observe(self._clock() - waited_since)
+        self.executed += 1
+        SESSION_QUEUE_TURNS.inc('executed')
+
+    def _finish(self, turn):
+        """Remove a finished turn from its lane and start the next one"""
+        if turn._released:
+            return False
+        turn._released = True
+        lane = self._lanes[turn.key]
+        lane.popleft()
+        if lane:
+            SESSION_QUEUE_DEPTH.dec()
+            lane[0]._ready.set()
+        else:
+            del self._lanes[turn.key]
+            SESSION_QUEUE_SESSIONS.dec()
+        if self._forget(turn) and turn.result is not None:
+            self._recent.pop((turn.key, turn.idempotency_key), None)
+            self._recent[(turn.key, turn.idempotency_key)] = turn
+        return True
+
+    def _forget(self, turn):
+        """Stop offering an unfinished turn to retries; True if it was offered"""
+        if self._pending.get((turn.key, turn.idempotency_key)) is turn:
+            del self._pending[(turn.key, turn.idempotency_key)]
+            return True
+        return False
+
+    def stats(self):
+        return {
+            "sessions": len(self._lanes),
+            "waiting": sum(len(lane) - 1 for lane in list(self._lanes.values())),
+            "pending_idempotency_keys": len(self._pending),
+            "recent_answers": len(self._recent),
+            "executed": self.executed,
+            "deduplicated": self.deduplicated,
+            "rejected": self.rejected,
+            "abandoned": self.abandoned,
+            "dedup_window_seconds": self.dedup_window,
+            "max_depth": self.max_depth,
+        }
+
+
+class SessionQueue(_SessionQueueBase):
+    """Run the chat turns of each session one at a time, in arrival order
+
+    ``enter`` blocks until every earlier turn of the session has been
+    released and returns the Turn; the caller must ``release`` it when done
+    (for a streamed answer, once the stream has ended). A turn with the
+    ``idempotency_key`` of one still in flight, or of one that arrived less
+    than ``dedup_window`` seconds ago and was answered, waits for and shares
+    that answer instead of running again; turns without a key always run,
+    so a user repeating a message ("yes", "ok") still reaches the agent.
+    More than ``max_depth`` waiting turns, or waiting longer than
+    ``timeout``, raises SessionBusyError.
+    """
+
+    def __init__(self, dedup_window=5.0, max_depth=8, clock=time.monotonic):
+        super().__init__(dedup_window, max_depth, clock)
+        self._lock = threading.Lock()
+
+    def enter(self, key, idempotency_key=None, timeout=None):
+        started = self._clock()
+        with self._lock:
+            original = self._duplicate_of(key, idempotency_key)
+        if original is not None:
+            if not original._done.wait(timeout):
+                with self._lock:
+                    self._gave_up()
+                raise SessionBusyError(key, 'timeout', timeout or 1.0)
+            if original.result is not None:
+                with self._lock:
+                    return self._share(original)
+            # The original failed; this one runs on its own
+
+        with self._lock:
+            turn = self._join(key, idempotency_key, threading.Event(), threading.Event())
+        remaining = None if timeout is None else max(0.0, timeout - (self._clock() - started))
+        if not turn._ready.wait(remaining):
+            with self._lock:
+                if not turn._ready.is_set():
+                    self._abandon(turn, 'timeout')
+                    turn._done.set()
+                    raise SessionBusyError(key, 'timeout', timeout or 1.0)
+        with self._lock:
+            self._started(started)
+        return turn
+
+    def _release(self, turn):
+        with self._lock:
+            released = self._finish(turn)
+        if released:
+            turn._done.set()
+
+
+class AsyncSessionQueue(_SessionQueueBase):
+    """asyncio version of SessionQueue for the ASGI gateway
+
+    A waiting turn that is cancelled (for example because its client
+    disconnected) leaves the queue without holding up the turns behind it.
+    """
+
+    async def enter(self, key, idempotency_key=None, timeout=None):
+        started = self._clock()
+        original = self._duplicate_of(key, idempotency_key)
+        if original is not None:
+            try:
+                await asyncio.wait_for(original._done.wait(), timeout)
+            except asyncio.TimeoutError:
+                self._gave_up()
+                raise SessionBusyError(key, 'timeout', timeout or 1.0) from None
+            if original.result is not None:
+                return self._share(original)
+
+        turn = self._join(key, idempotency_key, asyncio.Event(), asyncio.Event())
+        remaining = None if timeout is None else max(0.0, timeout - (self._clock() - started))
+        try:
+            await asyncio.wait_for(turn._ready.wait(), remaining)
+        except asyncio.TimeoutError:
+            if not turn._ready.is_set():
+                self._abandon(turn, 'timeout')
+                turn._done.set()
+                raise SessionBusyError(key, 'timeout', timeout or 1.0) from None
+        except BaseException:
+            # Cancelled: give up the place in the queue, or the turn if it had just started
+            if turn._ready.is_set():
+                self._release(turn)
+            else:
+                self._abandon(turn, 'cancelled')
+                turn._done.set()
+            raise
+        self._started(started)
+        return turn
+
+    def _release(self, turn):
+        if self._finish(turn):
+            turn._done.set()
@@ -0,0 +1,324 @@
+import heapq
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class RegistryFullError(Exception):
+    """Raised when a binding would evict another live one"""
+
+
+class SessionRegistry:
+    """Tracks which backend sessions the gateway has already created
+
+    Implementations are bounded (max_size) and forget sessions that have not
+    been used for ``ttl`` seconds, so the registry cannot grow without limit.
+    A key may be bound to a backend session with another ID (a pre-created
+    one from the session pool); ``get`` returns that ID. Such bindings are
+    the only record of the backend session, so they are never evicted to
+    make room, only once unused for ``ttl``: ``add`` raises RegistryFullError
+    instead when ``max_size`` live bindings leave none to evict. ``blocking``
+    registries may wait on I/O, so an async server calls them from a thread.
+    """
+
+    blocking = False
+
+    def __contains__(self, key):
+        raise NotImplementedError
+
+    def get(self, key):
+        """The backend session ID bound to a known ``key`` ('' if its own), or None if unknown"""
+        raise NotImplementedError
+
+    def add(self, key, backend_session_id=''):
+        raise NotImplementedError
+
+    def discard(self, key):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def page(self, cursor=None, limit=100):
+        """Return (keys, next_cursor) in key order; next_cursor is None on the last page
+
+        The cursor is the last key returned, so pages neither skip nor repeat
+        keys that stay registered while the caller pages through them.
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+
+class InMemorySessionRegistry(SessionRegistry):
+    """Process-local LRU registry with a sliding TTL and O(1) operations"""
+
+    def __init__(self, max_size=100_000, ttl=24 * 3600, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        # key -> (expiry time, backend session ID), least recently used first;
+        # bindings to another ID are kept apart so that eviction skips them in O(1)
+        self._entries = OrderedDict()
+        self._bound = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted_lru = 0
+        self.evicted_expired = 0
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key):
+        now = self._clock()
+        with self._lock:
+            entries = self._bound if key in self._bound else self._entries
+            entry = entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= now:
+                del entries[key]
+                self.evicted_expired += 1
+                self.misses += 1
+                return None
+            entries[key] = (now + self.ttl, entry[1])
+            entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def add(self, key, backend_session_id=''):
+        now = self._clock()
+        with self._lock:
+            if backend_session_id and key not in self._bound:
+                self._expire(self._bound, now)
+                if len(self._bound) >= self.max_size:
+                    raise RegistryFullError(f"{self.max_size} live bindings to other backend sessions")
+            self._entries.pop(key, None)
+            self._bound.pop(key, None)
+            entries = self._bound if backend_session_id else self._entries
+            entries[key] = (now + self.ttl, backend_session_id)
+            self._evict(now)
+
+    def _expire(self, entries, now):
+        # Expired entries are always at the front because the TTL slides on use
+        while entries:
+            key, (expires_at, _) = next(iter(entries.items()))
+            if expires_at > now:
+                break
+            del entries[key]
+            self.evicted_expired += 1
+
+    def _evict(self, now):
+        self._expire(self._entries, now)
+        self._expire(self._bound, now)
+        while self._entries and len(self) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evicted_lru += 1
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._bound.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries) + len(self._bound)
+
+    def page(self, cursor=None, limit=100):
+        # Key order rather than LRU order, which every get reshuffles
+        cursor = cursor or ''
+        with self._lock:
+            self._evict(self._clock())
+            keys = heapq.nsmallest(limit + 1, (key for key in (*self._entries, *self._bound) if key > cursor))
+        return keys[:limit], keys[limit - 1] if len(keys) > limit else None
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "size": len(self),
+            "bound": len(self._bound),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted_lru": self.evicted_lru,
+            "evicted_expired": self.evicted_expired,
+        }
+
+
+class SqliteSessionRegistry(SessionRegistry):
+    """Registry stored in a SQLite file, shared by every worker on the host
+
+    Lookups are primary-key reads. The size bound is enforced every
+    ``trim_interval`` additions to keep writes cheap, except for bindings,
+    which are counted as they are added.
+    """
+
+    # Writes wait for other workers' write locks
+    blocking = True
+
+    def __init__(self, path, max_size=100_000, ttl=24 * 3600, trim_interval=100,
+                 table='sessions', clock=time.time):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid registry table name: {table}")
+        self.path = path
+        self.table = table
+        self.max_size = max_size
+        self.ttl = ttl
+        self.trim_interval = trim_interval
+        self._clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._adds = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted_lru = 0
+        self.evicted_expired = 0
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {table} ('
+                ' key TEXT PRIMARY KEY,'
+                ' expires_at REAL NOT NULL,'
+                " backend_session_id TEXT NOT NULL DEFAULT '')"
+            )
+            columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+            if 'backend_session_id' not in columns:
+                # Registry file from before session IDs could be rebound
+                try:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN backend_session_id TEXT NOT NULL DEFAULT ''")
+                except sqlite3.OperationalError as e:
+                    # Another worker starting at the same time added it first
+                    if 'duplicate column' not in str(e):
+                        raise
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_expires_at ON {table} (expires_at)')
+            conn.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_bound ON {table} (expires_at)'
+                " WHERE backend_session_id != ''"
+            )
+
+    def _connect(self):
+        # sqlite3 connections may not be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def __contains__(self, key):
+        now = self._clock()
+        conn = self._connect()
+        # Refresh the sliding TTL and test for a live entry in one statement
+        updated = conn.execute(
+            f'UPDATE {self.table} SET expires_at = ? WHERE key = ? AND expires_at > ?',
+            (now + self.ttl, key, now),
+        ).rowcount
+        with self._lock:
+            if updated:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return bool(updated)
+
+    def get(self, key):
+        now = self._clock()
+        row = self._connect().execute(
+            f'UPDATE {self.table} SET expires_at = ? WHERE key = ? AND expires_at > ? RETURNING backend_session_id',
+            (now + self.ttl, key, now),
+        ).fetchone()
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return row[0] if row else None
+
+    def add(self, key, backend_session_id=''):
+        now = self._clock()
+        conn = self._connect()
+        upsert = (
+            ' ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at,'
+            ' backend_session_id = excluded.backend_session_id'
+        )
+        if backend_session_id:
+            # Count the live bindings in the same statement, so that workers binding at once cannot overshoot
+            added = conn.execute(
+                f'INSERT INTO {self.table} (key, expires_at, backend_session_id) SELECT ?, ?, ?'
+                f" WHERE (SELECT COUNT(*) FROM {self.table} WHERE backend_session_id != '' AND expires_at > ?) < ?"
+                f" OR EXISTS (SELECT 1 FROM {self.table} WHERE key = ? AND backend_session_id != '')" + upsert,
+                (key, now + self.ttl, backend_session_id, now, self.max_size, key),
+            ).rowcount
+            if not added:
+                raise RegistryFullError(f"{self.max_size} live bindings to other backend sessions")
+        else:
+            conn.execute(
+                f'INSERT INTO {self.table} (key, expires_at, backend_session_id) VALUES (?, ?, ?)' + upsert,
+                (key, now + self.ttl, backend_session_id),
+            )
+        with self._lock:
+            self._adds += 1
+            trim = self._adds % self.trim_interval == 0
+        if trim:
+            self._trim(conn, now)
+
+    def _trim(self, conn, now):
+        expired = conn.execute(f'DELETE FROM {self.table} WHERE expires_at <= ?', (now,)).rowcount
+        overflow = len(self) - self.max_size
+        evicted = 0
+        if overflow > 0:
+            # Entries closest to expiry are the least recently used; bindings are kept
+            evicted = conn.execute(
+                f'DELETE FROM {self.table} WHERE key IN ('
+                f" SELECT key FROM {self.table} WHERE backend_session_id = '' ORDER BY expires_at LIMIT ?)",
+                (overflow,),
+            ).rowcount
+        with self._lock:
+            self.evicted_expired += expired
+            self.evicted_lru += evicted
+
+    def discard(self, key):
+        self._connect().execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def __len__(self):
+        return self._connect().execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+    def page(self, cursor=None, limit=100):
+        rows = self._connect().execute(
+            f'SELECT key FROM {self.table} WHERE key > ? AND expires_at > ? ORDER BY key LIMIT ?',
+            (cursor or '', self._clock(), limit + 1),
+        ).fetchall()
+        keys = [row[0] for row in rows[:limit]]
+        return keys, keys[-1] if len(rows) > limit else None
+
+    def stats(self):
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "table": self.table,
+            "size": len(self),
+            "bound": self._connect().execute(
+                f"SELECT COUNT(*) FROM {self.table} WHERE backend_session_id != '' AND expires_at > ?", (self._clock(),)
+            ).fetchone()[0],
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted_lru": self.evicted_lru,
+            "evicted_expired": self.evicted_expired,
+        }
+
+
+def create_session_registry(url, max_size=100_000, ttl=24 * 3600, name='sessions'):
+    """Build a registry from a URL: ``memory://`` or ``sqlite:///path/to/file.db``
+
+    ``name`` keeps several registries apart when they share one SQLite file.
+    """
+    if url == 'memory://':
+        return InMemorySessionRegistry(max_size=max_size, ttl=ttl)
+    if url.startswith('sqlite:///'):
+        return SqliteSessionRegistry(url[len('sqlite:///'):], max_size=max_size, ttl=ttl, table=name)
+    raise ValueError(f"Unsupported session registry URL: {url}")
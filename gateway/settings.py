@@ -0,0 +1,180 @@
+import json
+import os
+
+
+class SettingsError(ValueError):
+    """Raised at startup with every setting that could not be used"""
+
+    def __init__(self, problems):
+        super().__init__("Invalid gateway settings:\n  " + "\n  ".join(problems))
+        self.problems = problems
+
+
+class Settings:
+    """Typed runtime settings, read and validated once at startup
+
+    Each setting comes from the environment variable of the same name, else
+    from the config file at ``path`` (JSON, or TOML for a ``.toml`` file),
+    else its default. The typed getters (``string``, ``string_list``,
+    ``boolean``, ``integer``, ``number``, ``choice``, ``mapping``) parse and range-check
+    the value; problems are collected instead of raised, so ``check`` can
+    report all of them at once, together with config file keys that no
+    setting reads (usually typos).
+    """
+
+    def __init__(self, environ=None, path=None):
+        self.environ = os.environ if environ is None else environ
+        self.path = path or None
+        self.problems = []
+        self._values = {}  # name -> (value, source)
+        self._file = {}
+        if self.path:
+            try:
+                self._file = _read_config_file(self.path)
+            except (OSError, ValueError) as e:
+                self.problems.append(f"config file {self.path}: {e}")
+
+    def _get(self, name, default, parse):
+        if name in self.environ:
+            raw, source = self.environ[name], 'env'
+        elif name in self._file:
+            raw, source = self._file[name], 'file'
+        else:
+            self._values[name] = (default, 'default')
+            return default
+        try:
+            value = parse(raw, source == 'env')
+        except (TypeError, ValueError) as e:
+            self.problems.append(f"{name}={raw!r} (from {source}): {e}")
+            value, source = default, 'default'
+        self._values[name] = (value, source)
+        return value
+
+    def string(self, name, default):
+        def parse(raw, from_env):
+            if not isinstance(raw, str):
+                raise TypeError("expected a string")
+            return raw
+        return self._get(name, default, parse)
+
+    def string_list(self, name, default):
+        """Strings separated by commas in the environment; in the config file, an array"""
+        def parse(raw, from_env):
+            if from_env:
+                return [item.strip() for item in raw.split(',') if item.strip()]
+            if not isinstance(raw, list) or not all(isinstance(item, str) for item in raw):
+                raise TypeError("expected an array of strings")
+            return raw
+        return self._get(name, default, parse)
+
+    def boolean(self, name, default):
+        def parse(raw, from_env):
+            if not from_env:
+                if not isinstance(raw, bool):
+                    raise TypeError("expected true or false")
+                return raw
+            value = raw.strip().lower()
+            if value in ('1', 'true', 'yes', 'on'):
+                return True
+            if value in ('', '0', 'false', 'no', 'off'):
+                return False
+            raise ValueError("expected one of 1/true/yes/on or 0/false/no/off")
+        return self._get(name, default, parse)
+
+    def integer(self, name, default, minimum=None, maximum=None, optional=False):
+        """An int in [minimum, maximum]; with ``optional``, "none" (or null) gives None"""
+        return self._get(name, default, _number_parser(int, minimum, maximum, optional))
+
+    def number(self, name, default, minimum=None, maximum=None, optional=False):
+        """A float in [minimum, maximum]; with ``optional``, "none" (or null) gives None"""
+        return self._get(name, default, _number_parser(float, minimum, maximum, optional))
+
+    def choice(self, name, default, choices):
+        def parse(raw, from_env):
+            if raw not in choices:
+                raise ValueError(f"expected one of {', '.join(choices)}")
+            return raw
+        return self._get(name, default, parse)
+
+    def mapping(self, name, default, minimum=None, maximum=None):
+        """Numbers per key of ``default``, overriding some of its entries
+
+        From the environment: ``key=value`` pairs separated by commas, e.g.
+        ``BACKEND_TIMEOUTS=run=60,run_sse=45``; in the config file, a table.
+        ``minimum`` and ``maximum`` bound every value, or, given as a dict,
+        the value of each of its keys.
+        """
+        kind = float if any(isinstance(value, float) for value in default.values()) else int
+
+        def limit(bound, key):
+            return bound.get(key) if isinstance(bound, dict) else bound
+
+        parsers = {key: _number_parser(kind, limit(minimum, key), limit(maximum, key), False) for key in default}
+
+        def parse_value(key, value, from_env):
+            try:
+                return parsers[key](value, from_env)
+            except (TypeError, ValueError) as e:
+                raise type(e)(f"{key}: {e}") from None
+
+        def parse(raw, from_env):
+            if from_env:
+                pairs = [pair.split('=', 1) for pair in raw.split(',') if pair.strip()]
+                if any(len(pair) != 2 for pair in pairs):
+                    raise ValueError("expected key=value pairs separated by commas")
+                overrides = {key.strip(): value for key, value in pairs}
+            elif isinstance(raw, dict):
+                overrides = raw
+            else:
+                raise TypeError("expected a table")
+            unknown = sorted(set(overrides) - set(default))
+            if unknown:
+                raise ValueError(f"unknown keys {', '.join(unknown)}; expected {', '.join(default)}")
+            return {**default, **{key: parse_value(key, value, from_env) for key, value in overrides.items()}}
+        return self._get(name, default, parse)
+
+    def check(self):
+        """Raise SettingsError if any setting was invalid or the config file has unknown keys"""
+        problems = list(self.problems)
+        problems += [f"{name} (from file): unknown setting" for name in self._file if name not in self._values]
+        if problems:
+            raise SettingsError(problems)
+
+    def snapshot(self):
+        """Every setting read so far, with its value and where it came from"""
+        return {
+            "config_file": self.path,
+            "settings": {name: {"value": value, "source": source} for name, (value, source) in self._values.items()},
+        }
+
+
+def _number_parser(kind, minimum, maximum, optional):
+    def parse(raw, from_env):
+        if optional and (raw is None or (from_env and raw.strip().lower() in ('', 'none'))):
+            return None
+        if from_env:
+            value = kind(raw)
+        elif isinstance(raw, bool) or not isinstance(raw, (int, float)) or (kind is int and isinstance(raw, float)):
+            raise TypeError(f"expected {'an integer' if kind is int else 'a number'}")
+        else:
+            value = kind(raw)
+        if minimum is not None and value < minimum:
+            raise ValueError(f"must be at least {minimum}")
+        if maximum is not None and value > maximum:
+            raise ValueError(f"must be at most {maximum}")
+        return value
+    return parse
+
+
+def _read_config_file(path):
+    if str(path).endswith('.toml'):
+        import tomllib  # Python 3.11+
+
+        with open(path, 'rb') as f:
+            data = tomllib.load(f)
+    else:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError("expected a table of settings")
+    return data
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution
+
+    The first caller for a key (the leader) runs ``fn``; callers arriving while
+    it is in flight wait and receive the same result, or the same exception.
+    A waiter that gives up after ``timeout`` seconds gets a TimeoutError; the
+    leader's call is not affected. Nothing is cached: once the call finishes
+    the next caller starts a fresh one.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError(f"Timed out waiting for in-flight call {key!r}")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        return {
+            "in_flight": len(self._calls),
+            "executed": self.executed,
+            "shared": self.shared,
+        }
+
+
+class AsyncSingleFlight:
+    """asyncio version of SingleFlight for the ASGI gateway
+
+    The shared call runs as its own task, so a caller that is cancelled or
+    times out (for example because its client disconnected) does not cancel
+    it for the others. Timed-out waiters get asyncio.TimeoutError.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    async def do(self, key, fn, timeout=None):
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.executed += 1
+        else:
+            self.shared += 1
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+
+    def _forget(self, key, task):
+        self._calls.pop(key, None)
+        # Mark the outcome as retrieved even if every waiter gave up on it
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {
+            "in_flight": len(self._calls),
+            "executed": self.executed,
+            "shared": self.shared,
+        }
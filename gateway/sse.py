@@ -0,0 +1,38 @@
+from . import json_codec
+
+
+class SSEParser:
+    """Incremental parser for a text/event-stream body
+
+    Feed raw byte chunks as they arrive; complete ``data:`` payloads are
+    returned as soon as their terminating blank line has been seen.
+    """
+
+    def __init__(self):
+        self._buffer = b''
+        self._data = []
+
+    def feed(self, chunk):
+        """Consume a chunk of the stream and return the completed data payloads"""
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split(b'\n')
+        payloads = []
+        for line in lines:
+            line = line.rstrip(b'\r').decode('utf-8')
+            if not line:
+                # A blank line dispatches the event collected so far
+                if self._data:
+                    payloads.append('\n'.join(self._data))
+                    self._data = []
+                continue
+            if line.startswith(':'):
+                continue
+            field, _, value = line.partition(':')
+            if field == 'data':
+                self._data.append(value[1:] if value.startswith(' ') else value)
+        return payloads
+
+
+def format_sse(payload):
+    """Encode a JSON-serialisable payload as a single SSE message"""
+    return f"data: {json_codec.dumps(payload).decode('utf-8')}\n\n"
@@ -0,0 +1,111 @@
+import hashlib
+import re
+from pathlib import Path
+
+from .compression import ENCODINGS, compress, negotiate
+
+CONTENT_TYPES = {
+    '.css': 'text/css; charset=utf-8',
+    '.html': 'text/html; charset=utf-8',
+    '.js': 'text/javascript; charset=utf-8',
+    '.json': 'application/json',
+    '.png': 'image/png',
+    '.svg': 'image/svg+xml',
+}
+
+_ASSET_REF = re.compile(r'(?P<attr>href|src)="/static/(?P<name>[^"?]+)"')
+_STYLESHEET = re.compile(r'<link rel="stylesheet" href="/static/(?P<name>[^"]+)">')
+_SCRIPT = re.compile(r'<script src="/static/(?P<name>[^"]+)"></script>')
+
+
+class StaticAsset:
+    """A file held in memory with precompressed variants and a content-hash ETag
+
+    ``respond`` does the per-request work: pick the encoding the client
+    accepts and answer 304 when its If-None-Match already has this version.
+    """
+
+    def __init__(self, body, content_type, cache_control):
+        self.version = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {None: body}
+        for encoding in ENCODINGS:
+            compressed = compress(body, encoding)
+            if len(compressed) < len(body):
+                self.variants[encoding] = compressed
+        self.encodings = tuple(encoding for encoding in ENCODINGS if encoding in self.variants)
+
+        # Each encoding is a different representation, so it gets its own strong ETag
+        self.etags = {
+            encoding: f'"{self.version}-{encoding}"' if encoding else f'"{self.version}"'
+            for encoding in self.variants
+        }
+        self.headers = {}
+        for encoding in self.variants:
+            headers = {
+                'Content-Type': content_type,
+                'Cache-Control': cache_control,
+                'ETag': self.etags[encoding],
+                'Vary': 'Accept-Encoding',
+            }
+            if encoding:
+                headers['Content-Encoding'] = encoding
+            self.headers[encoding] = headers
+
+    @property
+    def body(self):
+        return self.variants[None]
+
+    def not_modified(self, if_none_match):
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return not tags.isdisjoint(self.etags.values())
+
+    def respond(self, accept_encoding=None, if_none_match=None):
+        """Return (status, headers, body) for a GET of this asset"""
+        encoding = negotiate(accept_encoding, self.encodings)
+        headers = self.headers[encoding]
+        if self.not_modified(if_none_match):
+            return 304, headers, b''
+        return 200, headers, self.variants[encoding]
+
+
+class StaticUI:
+    """The chat UI page and its CSS/JS, built once at startup and served from memory
+
+    Assets referenced as ``/static/<name>`` get a ``?v=<hash>`` suffix so they
+    can be cached for a year and still change on deploy. With
+    ``inline_assets`` the CSS and JS are inlined into the page instead (one
+    request per visit, but nothing separately cacheable).
+    """
+
+    def __init__(self, template_path, static_dir, inline_assets=False,
+                 page_cache_control='no-cache', asset_cache_control='public, max-age=31536000, immutable'):
+        self.assets = {}
+        for path in sorted(Path(static_dir).iterdir()):
+            if path.is_file() and path.suffix in CONTENT_TYPES:
+                self.assets[path.name] = StaticAsset(
+                    path.read_bytes(), CONTENT_TYPES[path.suffix], asset_cache_control
+                )
+
+        html = Path(template_path).read_text(encoding='utf-8')
+        if inline_assets:
+            html = _STYLESHEET.sub(lambda m: f"<style>\n{self._text(m['name'])}</style>", html)
+            html = _SCRIPT.sub(lambda m: f"<script>\n{self._text(m['name'])}</script>", html)
+        html = _ASSET_REF.sub(self._versioned_ref, html)
+        self.page = StaticAsset(html.encode('utf-8'), CONTENT_TYPES['.html'], page_cache_control)
+
+    def _text(self, name):
+        return self.assets[name].body.decode('utf-8')
+
+    def _versioned_ref(self, match):
+        asset = self.assets.get(match['name'])
+        if asset is None:
+            return match[0]
+        return f'{match["attr"]}="/static/{match["name"]}?v={asset.version}"'
+
+    def asset(self, name):
+        """The asset served at /static/<name>, or None"""
+        return self.assets.get(name)
@@ -0,0 +1,262 @@
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+# Gateway routes whose requests are traced
+TRACED_ROUTES = frozenset({'/create_session', '/chat', '/chat/stream', '/chat/batch'})
+
+# Spans kept per trace; later ones are counted but not recorded
+MAX_SPANS_PER_TRACE = 256
+
+# W3C trace context: version-traceid-parentid-flags
+_TRACEPARENT = re.compile(r'^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+_TRACE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+_current_span = ContextVar('current_span', default=None)
+
+
+def _new_id(bits):
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Trace:
+    """The spans of one traced request; only sampled traces record child spans"""
+
+    __slots__ = ('trace_id', 'parent_span_id', 'sampled', 'started_at', 'root', 'spans', 'dropped_spans')
+
+    def __init__(self, trace_id, parent_span_id, sampled):
+        self.trace_id = trace_id
+        self.parent_span_id = parent_span_id
+        self.sampled = sampled
+        self.started_at = time.time()
+        self.root = None
+        self.spans = []
+        self.dropped_spans = 0
+
+    def _add(self, span):
+        if len(self.spans) < MAX_SPANS_PER_TRACE:
+            self.spans.append(span)
+        else:
+            self.dropped_spans += 1
+
+    @property
+    def duration(self):
+        return self.root.duration
+
+    def to_dict(self):
+        """The trace as JSON-ready data, with time per stage (span name) and the root's own time
+
+        Stages that ran concurrently (a batch's items) can add up to more
+        than the request took; the root's own time is then 0.
+        """
+        root = self.root
+        breakdown = {}
+        for span in self.spans:
+            if span.parent_id == root.span_id and span.end is not None:
+                breakdown[span.name] = breakdown.get(span.name, 0.0) + span.duration
+        own = max(0.0, root.duration - sum(breakdown.values()))
+        return {
+            "trace_id": self.trace_id,
+            "parent_span_id": self.parent_span_id,
+            "name": root.name,
+            "started_at": self.started_at,
+            "duration_ms": round(root.duration * 1000, 3),
+            "attributes": root.attributes,
+            "error": root.error,
+            "breakdown_ms": {
+                **{name: round(seconds * 1000, 3) for name, seconds in breakdown.items()},
+                "(gateway)": round(own * 1000, 3),
+            },
+            "spans": [span.to_dict(root.start) for span in self.spans],
+            "dropped_spans": self.dropped_spans,
+        }
+
+
+class Span:
+    """One timed stage of a trace; use as a context manager or call ``close``"""
+
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'attributes', 'start', 'end', 'error', '_token')
+
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.name = name
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.end = None
+        self.error = None
+        self._token = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(exc_type.__name__ if exc_type else None)
+        return False
+
+    def close(self, error=None):
+        if self.end is not None:
+            return
+        self.end = time.perf_counter()
+        self.error = error
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # Closed from another context (e.g. a streamed response's close callback)
+                _current_span.set(None)
+
+    def to_dict(self, origin):
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "offset_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3) if self.end is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span outside a sampled trace, at next to no cost"""
+
+    __slots__ = ()
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def close(self, error=None):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name, **attributes):
+    """A child of the current span, or a no-op outside a sampled trace"""
+    parent = _current_span.get()
+    if parent is None or not parent.trace.sampled:
+        return NOOP_SPAN
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    parent.trace._add(child)
+    return child
+
+
+def current_trace_id():
+    current = _current_span.get()
+    return current.trace.trace_id if current is not None else None
+
+
+def inject(headers=None):
+    """``headers`` plus a W3C traceparent naming the current span, to send to the backend"""
+    current = _current_span.get()
+    if current is None:
+        return headers
+    trace = current.trace
+    return {
+        **(headers or {}),
+        'traceparent': f"00-{trace.trace_id}-{current.span_id}-{'01' if trace.sampled else '00'}",
+    }
+
+
+class Tracer:
+    """Starts a trace per request and hands finished, sampled traces to the exporters
+
+    A request carrying a W3C ``traceparent`` (or an ``X-Trace-Id``) joins
+    that trace, and is sampled if its caller sampled it; otherwise a new
+    trace ID is made and ``sample_rate`` of the requests are sampled.
+    Unsampled requests still get a trace ID to echo and propagate, but
+    record no spans.
+    """
+
+    def __init__(self, exporters=(), sample_rate=1.0, random=random.random):
+        self.exporters = list(exporters)
+        self.sample_rate = sample_rate
+        self._random = random
+
+    def start(self, name, traceparent=None, trace_id=None, **attributes):
+        """Begin the root span of a request in the current context; pass it to ``finish``"""
+        parent_span_id = None
+        match = _TRACEPARENT.match(traceparent or '')
+        if match and match.group(1) != '0' * 32:
+            trace_id, parent_span_id, flags = match.groups()
+            sampled = int(flags, 16) & 1 == 1
+        else:
+            if not (trace_id and _TRACE_ID.match(trace_id)):
+                trace_id = _new_id(128)
+            sampled = self.sample_rate >= 1 or self._random() < self.sample_rate
+        trace = Trace(trace_id, parent_span_id, sampled)
+        trace.root = Span(trace, name, None, attributes)
+        trace.spans.append(trace.root)
+        return trace.root.__enter__()
+
+    def finish(self, root, status=None, error=None):
+        root.set('status', status)
+        root.close(error)
+        if root.trace.sampled:
+            for exporter in self.exporters:
+                exporter.export(root.trace)
+
+
+class InMemoryCollector:
+    """Keeps the last ``max_traces`` finished traces in process for /debug/traces"""
+
+    def __init__(self, max_traces=1000):
+        self.max_traces = max_traces
+        self._traces = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def slowest(self, limit=20, name=None):
+        """The slowest kept traces, optionally only those whose root span is ``name``"""
+        with self._lock:
+            traces = list(self._traces)
+        if name:
+            traces = [trace for trace in traces if trace.root.name == name]
+        traces.sort(key=lambda trace: trace.duration, reverse=True)
+        return traces[:limit]
+
+    def get(self, trace_id):
+        with self._lock:
+            return [trace for trace in self._traces if trace.trace_id == trace_id]
+
+    def stats(self):
+        return {"kept": len(self._traces), "max_traces": self.max_traces}
+
+
+class JSONLTraceExporter:
+    """Appends each finished trace as one JSON line through a BufferedJSONLWriter"""
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def export(self, trace):
+        self.writer.write(trace.to_dict())
+
+    def close(self):
+        self.writer.close()
+
+    def stats(self):
+        return self.writer.stats()
@@ -0,0 +1,153 @@
+import logging
+import threading
+import time
+
+from . import json_codec
+from .metrics import backend_calls
+
+logger = logging.getLogger(__name__)
+
+# Gateway routes whose requests are captured for replay
+CAPTURED_ROUTES = frozenset({'/create_session', '/chat', '/chat/stream'})
+
+
+class BufferedJSONLWriter:
+    """Append records to a JSONL file from a background thread
+
+    ``write`` only appends to an in-memory buffer, so request handlers never
+    wait on disk. The writer thread drains the buffer every
+    ``flush_interval`` seconds (or as soon as ``batch_size`` records are
+    waiting). When ``max_buffer`` records are already waiting new ones are
+    dropped and counted rather than blocking or growing without bound.
+    """
+
+    def __init__(self, path, max_buffer=10_000, batch_size=500, flush_interval=1.0):
+        self.path = path
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._file = open(path, 'ab')
+        self._thread = threading.Thread(target=self._run, name='jsonl-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        with self._cond:
+            if self._closed or len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                return False
+            self._buffer.append(record)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._buffer and not self._closed:
+                    self._cond.wait(self.flush_interval)
+                batch, self._buffer = self._buffer, []
+                closed = self._closed
+            if batch:
+                self._write_batch(batch)
+            if closed and not batch:
+                return
+
+    def _write_batch(self, batch):
+        try:
+            # Serialized here, off the request path
+            self._file.write(b''.join(json_codec.dumps(record) + b'\n' for record in batch))
+            self._file.flush()
+            self.written += len(batch)
+        except (OSError, TypeError, ValueError) as e:
+            self.dropped += len(batch)
+            logger.error("Failed to write %d captured records to %s: %s", len(batch), self.path, e)
+
+    def close(self, timeout=5.0):
+        """Write what is still buffered and close the file"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._file.close()
+
+    def stats(self):
+        return {
+            "path": str(self.path),
+            "written": self.written,
+            "dropped": self.dropped,
+            "pending": len(self._buffer),
+        }
+
+
+def _redact_body(body):
+    """The request body with its chat message replaced by filler of the same length
+
+    Replays then send messages of the original size without the capture
+    file holding what users wrote.
+    """
+    if not isinstance(body, dict) or not isinstance(body.get('message'), str):
+        return body, False
+    return {**body, "message": 'x' * len(body['message'])}, True
+
+
+class TrafficCapture:
+    """Records gateway requests, with their timing and backend calls, for replay
+
+    ``start`` is called when a captured request begins; it makes the backend
+    clients collect their calls for this request (see
+    ``metrics.backend_calls``). ``finish`` turns the request into one JSONL
+    record. Backend call times run until the response headers arrive, as in
+    the backend latency metric. With ``chat_text`` 'redact' (the default, as
+    for logs) chat messages are not written, only their length; 'full'
+    writes them as sent, and says so loudly at startup.
+    """
+
+    def __init__(self, writer, routes=CAPTURED_ROUTES, chat_text='redact', clock=time.time):
+        self.writer = writer
+        self.routes = routes
+        self.chat_text = chat_text
+        self._clock = clock
+        if chat_text == 'full':
+            logger.warning("Traffic capture writes chat messages unredacted to %s", getattr(writer, 'path', writer))
+
+    def captures(self, route):
+        return route in self.routes
+
+    def start(self):
+        """Begin capturing the current request; returns the list its backend calls go to"""
+        calls = []
+        backend_calls.set(calls)
+        return calls
+
+    def finish(self, route, method, body, status, started_at, duration, calls):
+        redacted = False
+        if self.chat_text == 'redact':
+            body, redacted = _redact_body(body)
+        record = {
+            "ts": started_at,
+            "route": route,
+            "method": method,
+            "body": body,
+            "status": status,
+            "duration_ms": round(duration * 1000, 3),
+            "upstream": calls,
+        }
+        if redacted:
+            record["redacted"] = True
+        self.writer.write(record)
+
+    def now(self):
+        return self._clock()
+
+    def close(self):
+        self.writer.close()
+
+    def stats(self):
+        return self.writer.stats()
@@ -5,6 +5,7 @@ const HealthcareChatbot = () => {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [isStreaming, setIsStreaming] = useState(false);
   const [sessionId, setSessionId] = useState(null);
   const [userId] = useState('user_' + Math.random().toString(36).substr(2, 9));
   const [isConnected, setIsConnected] = useState(false);
@@ -27,6 +28,34 @@ const HealthcareChatbot = () => {
     initializeSession();
   }, []);
 
+  const generateIdempotencyKey = () => {
+    // randomUUID needs a secure context (https or localhost)
+    if (crypto.randomUUID) return crypto.randomUUID();
+    return Array.from(crypto.getRandomValues(new Uint8Array(16)), b => b.toString(16).padStart(2, '0')).join('');
+  };
+
+  // Resends after network errors and 429/503 answers. Every attempt carries
+  // the message's Idempotency-Key, so the gateway runs the message once.
+  const postWithRetry = async (url, options, attempts = 3) => {
+    for (let attempt = 1; ; attempt++) {
+      let response;
+      try {
+        response = await fetch(url, options);
+      } catch (error) {
+        if (attempt >= attempts) throw error;
+        await new Promise(resolve => setTimeout(resolve, attempt * 500));
+        continue;
+      }
+      if ((response.status === 429 || response.status === 503) && attempt < attempts) {
+        const retryAfter = Number(response.headers.get('Retry-After')) || attempt;
+        logDebug('Retrying message after status', response.status);
+        await new Promise(resolve => setTimeout(resolve, Math.min(retryAfter, 5) * 1000));
+        continue;
+      }
+      return response;
+    }
+  };
+
   const logDebug = (message, data = null) => {
     if (debugMode) {
       console.log(`[Healthcare Chat Debug] ${message}`, data);
@@ -36,7 +65,7 @@ const HealthcareChatbot = () => {
   const testConnection = async () => {
     try {
       logDebug('Testing connection to backend...');
-      const response = await fetch(`${API_BASE}/list-apps`, {
+      const response = await fetch(`${API_BASE}/health`, {
         method: 'GET',
         headers: {
           'Content-Type': 'application/json',
@@ -44,9 +73,9 @@ const HealthcareChatbot = () => {
       });
       
       if (response.ok) {
-        const apps = await response.json();
-        logDebug('Connection test successful:', apps);
-        return true;
+        const health = await response.json();
+        logDebug('Connection test successful:', health);
+        return health.backend_connected;
       } else {
         logDebug('Connection test failed with status:', response.status);
         return false;
@@ -68,37 +97,20 @@ const HealthcareChatbot = () => {
         throw new Error('Backend is not responding. Please ensure your FastAPI server is running on http://127.0.0.1:8000 and CORS is properly configured.');
       }
 
-      logDebug('Creating session for user:', userId);
-      
-      // Create a new session
-      const response = await fetch(`${API_BASE}/chat/sessions`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          user_id: userId
-        })
-      });
+      // The gateway creates the backend session on the first chat message,
+      // so only a session ID is needed here
+      const newSessionId = 'session_' + Math.random().toString(36).substr(2, 9);
+      logDebug('Using session for user:', { userId, sessionId: newSessionId });
+      setSessionId(newSessionId);
+      setIsConnected(true);
 
-      if (response.ok) {
-        const session = await response.json();
-        logDebug('Session created successfully:', session);
-        setSessionId(session.id);
-        setIsConnected(true);
-        
-        // Add welcome message
-        setMessages([{
-          id: Date.now(),
-          text: "Hello! I'm your healthcare assistant. I can help answer questions about symptoms, medications, health conditions, and general wellness. How can I assist you today?",
-          isBot: true,
-          timestamp: new Date()
-        }]);
-      } else {
-        const errorText = await response.text();
-        logDebug('Session creation failed:', { status: response.status, error: errorText });
-        throw new Error(`Failed to create session: ${response.status} - ${errorText}`);
-      }
+      // Add welcome message
+      setMessages([{
+        id: Date.now(),
+        text: "Hello! I'm your healthcare assistant. I can help answer questions about symptoms, medications, health conditions, and general wellness. How can I assist you today?",
+        isBot: true,
+        timestamp: new Date()
+      }]);
     } catch (error) {
       console.error('Failed to initialize session:', error);
       setConnectionError(error.message);
@@ -129,19 +141,33 @@ const HealthcareChatbot = () => {
 
     setMessages(prev => [...prev, userMessage]);
     const messageText = input.trim();
+    const idempotencyKey = generateIdempotencyKey();
     setInput('');
     setIsLoading(true);
 
+    const botMessageId = Date.now() + 1;
+    const updateBotMessage = (text) => {
+      setMessages(prev => {
+        if (prev.some(message => message.id === botMessageId)) {
+          return prev.map(message => message.id === botMessageId ? { ...message, text } : message);
+        }
+        return [...prev, { id: botMessageId, text, isBot: true, timestamp: new Date() }];
+      });
+    };
+
     try {
       logDebug('Sending message:', messageText);
 
-      // Try non-streaming first for reliability
-      const response = await fetch(`${API_BASE}/chat/send`, {
+      // Stream the answer so partial output renders as soon as it arrives
+      const response = await postWithRetry(`${API_BASE}/chat/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Idempotency-Key': idempotencyKey,
         },
         body: JSON.stringify({
+          app_name: APP_NAME,
+          user_id: userId,
           session_id: sessionId,
           message: messageText
         })
@@ -155,34 +181,53 @@ const HealthcareChatbot = () => {
         throw new Error(`HTTP error! status: ${response.status} - ${errorText}`);
       }
 
-      const data = await response.json();
-      logDebug('Response data:', data);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let botText = '';
 
-      // Assuming the response is either { response: "message" } or the message directly
-      const botText = typeof data === 'string' ? data : data.response || data.message || (
-        Array.isArray(data) && data.length > 0 ? data[0].content?.text || data[0].text : ''
-      );
-          
-        if (botText) {
-          setMessages(prev => [...prev, {
-            id: Date.now() + 1,
-            text: botText,
-            isBot: true,
-            timestamp: new Date()
-          }]);
-        } else {
-          throw new Error('Empty response from server');
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true }).replace(/\r\n/g, '\n');
+        const frames = buffer.split('\n\n');
+        buffer = frames.pop();
+
+        for (const frame of frames) {
+          const data = frame
+            .split('\n')
+            .filter(line => line.startsWith('data:'))
+            .map(line => line.slice(5).trimStart())
+            .join('\n');
+          if (!data) continue;
+
+          const event = JSON.parse(data);
+          logDebug('Stream event:', event);
+
+          if (event.type === 'delta') {
+            botText += event.text;
+            setIsStreaming(true);
+            updateBotMessage(botText);
+          } else if (event.type === 'done') {
+            // Keep the streamed text; fall back to the final answer if nothing streamed
+            botText = botText || event.response || '';
+          } else if (event.type === 'error') {
+            throw new Error(event.error);
+          }
         }
+      }
+
+      if (botText) {
+        updateBotMessage(botText);
       } else {
-        // Log the actual response format for debugging
-      logDebug('Response format:', data);
-      throw new Error('Unexpected response format from server');
+        throw new Error('Empty response from server');
       }
 
     } catch (error) {
       console.error('Error sending message:', error);
       setMessages(prev => [...prev, {
-        id: Date.now() + 1,
+        id: Date.now() + 2,
         text: `Error: ${error.message}. Please try again or check your connection.`,
         isBot: true,
         isError: true,
@@ -190,6 +235,7 @@ const HealthcareChatbot = () => {
       }]);
     } finally {
       setIsLoading(false);
+      setIsStreaming(false);
     }
   };
 
@@ -319,7 +365,7 @@ const HealthcareChatbot = () => {
           </div>
         ))}
         
-        {isLoading && (
+        {isLoading && !isStreaming && (
           <div className="flex justify-start">
             <div className="flex items-start gap-2">
               <div className="p-2 rounded-full bg-blue-100">
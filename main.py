@@ -1,617 +1,554 @@
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, Response, abort, after_this_request, g, request, jsonify, stream_with_context
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 import requests
+import atexit
 import json
 import logging
+import threading
+import time
+import uuid
 from datetime import datetime
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+from pathlib import Path
+
+from gateway.adk import (
+    build_run_payload,
+    build_session_state,
+    session_already_exists,
+    session_creation_failed,
+    session_key,
+)
+from gateway import json_codec, tracing
+from gateway.admission import ADMITTED_ROUTES, AdmissionController, AdmissionRejected, create_admission_store
+from gateway.backend_client import BackendClient, session_path
+from gateway.batch import encode_ndjson, parse_batch, run_batch
+from gateway.circuit_breaker import CircuitBreakerSet, CircuitOpenError
+from gateway.compression import maybe_compress
+from gateway.config import (
+    ADMISSION_BURST,
+    ADMISSION_CONTROL_ENABLED,
+    ADMISSION_LEASE_TTL,
+    ADMISSION_MAX_IN_FLIGHT_PER_SESSION,
+    ADMISSION_MAX_IN_FLIGHT_PER_USER,
+    ADMISSION_RATE,
+    ADMISSION_RETRY_AFTER,
+    ADMISSION_STORE_URL,
+    BACKEND_EJECT_AFTER_FAILURES,
+    BACKEND_HASH_VNODES,
+    BACKEND_KEEP_ALIVE,
+    BACKEND_POOL_SIZE,
+    BACKEND_RETRIES,
+    BACKEND_RETRY_BACKOFF,
+    BACKEND_TIMEOUTS,
+    BACKEND_URL,
+    BACKEND_URLS,
+    BATCH_DEFAULT_CONCURRENCY,
+    BATCH_MAX_CONCURRENCY,
+    BATCH_MAX_ITEMS,
+    CIRCUIT_BREAKER_RESET_TIMEOUT,
+    CIRCUIT_BREAKER_THRESHOLDS,
+    COMPRESSION_LEVELS,
+    COMPRESSION_MIN_SIZE,
+    DEFAULT_APP_NAME,
+    DEFAULT_USER_ID,
+    HEALTH_PROBE_INTERVAL,
+    HEALTH_PROBE_MAX_BACKOFF,
+    JSON_ENCODER,
+    LOG_ASYNC,
+    LOG_CHAT_TEXT,
+    LOG_CHAT_TEXT_SAMPLE_RATE,
+    LOG_FORMAT,
+    LOG_LEVEL,
+    LOG_MAX_BUFFER,
+    PROFILING_ENABLED,
+    PROFILING_MAX_SECONDS,
+    PROFILING_SAMPLE_INTERVAL,
+    PROFILING_TOP,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_MAX_SIZE,
+    RESPONSE_CACHE_TTL,
+    RUN_BODY_CHUNK_SIZE,
+    SESSION_POOL_ENABLED,
+    SESSION_POOL_MAX_IDLE,
+    SESSION_POOL_REFILL_CONCURRENCY,
+    SESSION_POOL_REFILL_INTERVAL,
+    SESSION_POOL_SIZE,
+    SESSION_QUEUE_DEDUP_WINDOW,
+    SESSION_QUEUE_MAX_DEPTH,
+    SESSION_QUEUE_TIMEOUT,
+    SESSION_REGISTRY_MAX_SIZE,
+    SESSION_REGISTRY_TTL,
+    SESSION_REGISTRY_URL,
+    SERVER_DEBUG,
+    SERVER_GRACEFUL_TIMEOUT,
+    SERVER_HOST,
+    SERVER_PORT,
+    TRACING_ENABLED,
+    TRACING_EXPORT_PATH,
+    TRACING_MAX_TRACES,
+    TRACING_SAMPLE_RATE,
+    TRAFFIC_CAPTURE_CHAT_TEXT,
+    TRAFFIC_CAPTURE_ENABLED,
+    TRAFFIC_CAPTURE_FLUSH_INTERVAL,
+    TRAFFIC_CAPTURE_MAX_BUFFER,
+    TRAFFIC_CAPTURE_PATH,
+    UI_ASSET_CACHE_CONTROL,
+    UI_INLINE_ASSETS,
+    UI_PAGE_CACHE_CONTROL,
+    settings,
+)
+from gateway.events import StreamingTextExtractor, summarize_run_body
+from gateway.health import BackendHealthProber
+from gateway.log_pipeline import configure_logging
+from gateway.metrics import (
+    ADMISSION_REJECTIONS,
+    CHAT_EVENTS,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    HTTP_IN_FLIGHT,
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS,
+    REGISTRY as METRICS,
+    route_label,
+)
+from gateway.profiler import Profiler, ProfilerBusy
+from gateway.replicas import BackendReplicaSet
+from gateway.response_cache import ResponseCache
+from gateway.session_pool import SessionPool
+from gateway.session_queue import SessionBusyError, SessionQueue
+from gateway.session_registry import RegistryFullError, create_session_registry
+from gateway.sse import SSEParser, format_sse
+from gateway.static_assets import StaticUI
+from gateway.tracing import TRACED_ROUTES, InMemoryCollector, JSONLTraceExporter, Tracer
+from gateway.traffic_capture import BufferedJSONLWriter, TrafficCapture
+
+# Structured logging, written out by a background thread
+log_pipeline = configure_logging(
+    LOG_LEVEL,
+    LOG_FORMAT,
+    async_=LOG_ASYNC,
+    max_buffer=LOG_MAX_BUFFER,
+    chat_text=LOG_CHAT_TEXT,
+    sample_rate=LOG_CHAT_TEXT_SAMPLE_RATE,
+)
+atexit.register(log_pipeline.stop)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+class FastJSONProvider(JSONProvider):
+    """jsonify() through the gateway's JSON codec (orjson when installed)"""
+    
+    def dumps(self, obj, **kwargs):
+        return json_codec.dumps(obj).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return json_codec.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        trace_id = tracing.current_trace_id()
+        if trace_id and isinstance(obj, dict):
+            # Echo the request's trace ID in every JSON answer of a traced route
+            obj = {**obj, "trace_id": trace_id}
+        return self._app.response_class(json_codec.dumps(obj), mimetype='application/json')
+
+json_codec.use(JSON_ENCODER)
+
+app = Flask(__name__, static_folder=None)  # /static is served from the prebuilt UI below
+app.json = FastJSONProvider(app)
 CORS(app)  # Enable CORS for all routes
 
-# Backend configuration
-BACKEND_URL = "http://127.0.0.1:8000"
-DEFAULT_APP_NAME = "app"  # Change this to match your backend app name
-DEFAULT_USER_ID = "user"
-
-# Track created sessions to avoid duplicate creation
-created_sessions = set()
-
-# HTML template - you can also save this as a separate file
-HTML_TEMPLATE = """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Healthcare Assistant Chatbot</title>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-
-        body {
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            height: 100vh;
-            display: flex;
-            justify-content: center;
-            align-items: center;
-        }
-
-        .chat-container {
-            width: 90%;
-            max-width: 800px;
-            height: 80vh;
-            background: white;
-            border-radius: 20px;
-            box-shadow: 0 15px 35px rgba(0, 0, 0, 0.1);
-            display: flex;
-            flex-direction: column;
-            overflow: hidden;
-        }
-
-        .chat-header {
-            background: linear-gradient(135deg, #4CAF50, #45a049);
-            color: white;
-            padding: 20px;
-            text-align: center;
-            position: relative;
-        }
-
-        .chat-header h1 {
-            font-size: 24px;
-            margin-bottom: 5px;
-        }
-
-        .chat-header p {
-            opacity: 0.9;
-            font-size: 14px;
-        }
-
-        .status-indicator {
-            position: absolute;
-            top: 20px;
-            right: 20px;
-            width: 12px;
-            height: 12px;
-            border-radius: 50%;
-            background: #ff4444;
-            animation: pulse 2s infinite;
-        }
-
-        .status-indicator.connected {
-            background: #44ff44;
-        }
-
-        @keyframes pulse {
-            0% { opacity: 1; }
-            50% { opacity: 0.5; }
-            100% { opacity: 1; }
-        }
-
-        .chat-messages {
-            flex: 1;
-            overflow-y: auto;
-            padding: 20px;
-            background: #f8f9fa;
-        }
-
-        .message {
-            margin-bottom: 15px;
-            display: flex;
-            align-items: flex-start;
-            opacity: 0;
-            animation: messageSlide 0.3s ease-out forwards;
-        }
-
-        @keyframes messageSlide {
-            from {
-                opacity: 0;
-                transform: translateY(10px);
-            }
-            to {
-                opacity: 1;
-                transform: translateY(0);
-            }
-        }
-
-        .message.user {
-            justify-content: flex-end;
-        }
-
-        .message-content {
-            max-width: 70%;
-            padding: 12px 18px;
-            border-radius: 18px;
-            word-wrap: break-word;
-            position: relative;
-            white-space: pre-wrap;
-        }
-
-        .message.user .message-content {
-            background: linear-gradient(135deg, #667eea, #764ba2);
-            color: white;
-            border-bottom-right-radius: 4px;
-        }
-
-        .message.assistant .message-content {
-            background: white;
-            color: #333;
-            border: 1px solid #e0e0e0;
-            border-bottom-left-radius: 4px;
-            box-shadow: 0 2px 5px rgba(0, 0, 0, 0.1);
-        }
-
-        .message-avatar {
-            width: 32px;
-            height: 32px;
-            border-radius: 50%;
-            margin: 0 10px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            font-size: 16px;
-            font-weight: bold;
-        }
-
-        .message.user .message-avatar {
-            background: #667eea;
-            color: white;
-            order: 2;
-        }
-
-        .message.assistant .message-avatar {
-            background: #4CAF50;
-            color: white;
-        }
-
-        .chat-input-container {
-            padding: 20px;
-            background: white;
-            border-top: 1px solid #e0e0e0;
-        }
-
-        .chat-input-form {
-            display: flex;
-            gap: 10px;
-            align-items: center;
-        }
-
-        .chat-input {
-            flex: 1;
-            padding: 12px 18px;
-            border: 2px solid #e0e0e0;
-            border-radius: 25px;
-            font-size: 16px;
-            outline: none;
-            transition: border-color 0.3s ease;
-        }
-
-        .chat-input:focus {
-            border-color: #667eea;
-        }
-
-        .send-button {
-            background: linear-gradient(135deg, #667eea, #764ba2);
-            color: white;
-            border: none;
-            padding: 12px 24px;
-            border-radius: 25px;
-            cursor: pointer;
-            font-size: 16px;
-            font-weight: bold;
-            transition: transform 0.2s ease, opacity 0.3s ease;
-            min-width: 80px;
-        }
-
-        .send-button:hover {
-            transform: translateY(-2px);
-        }
-
-        .send-button:disabled {
-            opacity: 0.6;
-            cursor: not-allowed;
-            transform: none;
-        }
-
-        .typing-indicator {
-            display: none;
-            align-items: center;
-            margin-bottom: 15px;
-        }
-
-        .typing-dots {
-            display: flex;
-            gap: 4px;
-            margin-left: 52px;
-        }
-
-        .typing-dot {
-            width: 8px;
-            height: 8px;
-            border-radius: 50%;
-            background: #bbb;
-            animation: typing 1.4s infinite ease-in-out;
-        }
-
-        .typing-dot:nth-child(1) { animation-delay: -0.32s; }
-        .typing-dot:nth-child(2) { animation-delay: -0.16s; }
-
-        @keyframes typing {
-            0%, 80%, 100% {
-                transform: scale(0);
-                opacity: 0.5;
-            }
-            40% {
-                transform: scale(1);
-                opacity: 1;
-            }
-        }
-
-        .error-message {
-            background: #ffebee;
-            color: #c62828;
-            padding: 10px;
-            border-radius: 8px;
-            margin: 10px 20px;
-            border-left: 4px solid #c62828;
-            display: none;
-        }
-
-        .welcome-message {
-            text-align: center;
-            color: #666;
-            padding: 40px 20px;
-            font-style: italic;
-        }
-
-        .session-info {
-            background: #e3f2fd;
-            color: #1976d2;
-            padding: 8px 16px;
-            font-size: 12px;
-            text-align: center;
-            border-bottom: 1px solid #bbdefb;
-        }
-
-        .session-status {
-            background: #f3e5f5;
-            color: #7b1fa2;
-            padding: 6px 12px;
-            font-size: 11px;
-            text-align: center;
-            border-bottom: 1px solid #ce93d8;
-        }
-
-        /* Responsive Design */
-        @media (max-width: 768px) {
-            .chat-container {
-                width: 95%;
-                height: 90vh;
-                border-radius: 15px;
-            }
-
-            .message-content {
-                max-width: 85%;
-            }
-
-            .chat-header h1 {
-                font-size: 20px;
-            }
-
-            .chat-input {
-                font-size: 14px;
-            }
-
-            .send-button {
-                font-size: 14px;
-                padding: 10px 20px;
-            }
-        }
-    </style>
-</head>
-<body>
-    <div class="chat-container">
-        <div class="chat-header">
-            <div class="status-indicator" id="statusIndicator"></div>
-            <h1>🏥 Healthcare Assistant</h1>
-            <p>Your AI-powered health companion</p>
-        </div>
-
-        <div class="session-info" id="sessionInfo">
-            Session ID: <span id="sessionIdDisplay">Generating...</span>
-        </div>
-
-        <div class="session-status" id="sessionStatus">
-            Session Status: <span id="sessionStatusText">Not Created</span>
-        </div>
-
-        <div class="error-message" id="errorMessage"></div>
-
-        <div class="chat-messages" id="chatMessages">
-            <div class="welcome-message">
-                👋 Welcome! I'm your healthcare assistant. Ask me about symptoms, medications, health tips, or general medical information.
-                <br><br>
-                <small>⚠️ This is for informational purposes only and should not replace professional medical advice.</small>
-            </div>
-        </div>
-
-        <div class="typing-indicator" id="typingIndicator">
-            <div class="message-avatar">🤖</div>
-            <div class="typing-dots">
-                <div class="typing-dot"></div>
-                <div class="typing-dot"></div>
-                <div class="typing-dot"></div>
-            </div>
-        </div>
-
-        <div class="chat-input-container">
-            <form class="chat-input-form" id="chatForm">
-                <input 
-                    type="text" 
-                    class="chat-input" 
-                    id="chatInput" 
-                    placeholder="Ask me about your health concerns..."
-                    autocomplete="off"
-                    maxlength="500"
-                >
-                <button type="submit" class="send-button" id="sendButton">
-                    Send
-                </button>
-            </form>
-        </div>
-    </div>
-
-    <script>
-        class HealthcareChatbot {
-            constructor() {
-                this.sessionId = this.generateSessionId();
-                this.userId = "user";
-                this.appName = "app";
-                this.backendUrl = ""; // Same server
-                this.sessionCreated = false;
-                
-                this.initializeElements();
-                this.attachEventListeners();
-                this.checkServerStatus();
-                this.updateSessionDisplay();
-            }
-
-            generateSessionId() {
-                // Generate a session ID like 123456789
-                return Math.floor(100000000 + Math.random() * 900000000).toString();
-            }
-
-            initializeElements() {
-                this.chatForm = document.getElementById('chatForm');
-                this.chatInput = document.getElementById('chatInput');
-                this.sendButton = document.getElementById('sendButton');
-                this.chatMessages = document.getElementById('chatMessages');
-                this.typingIndicator = document.getElementById('typingIndicator');
-                this.errorMessage = document.getElementById('errorMessage');
-                this.statusIndicator = document.getElementById('statusIndicator');
-                this.sessionIdDisplay = document.getElementById('sessionIdDisplay');
-                this.sessionStatusText = document.getElementById('sessionStatusText');
-            }
-
-            updateSessionDisplay() {
-                this.sessionIdDisplay.textContent = this.sessionId;
-                this.sessionStatusText.textContent = this.sessionCreated ? 'Created' : 'Not Created';
-                this.sessionStatusText.style.color = this.sessionCreated ? '#2e7d32' : '#d32f2f';
-            }
-
-            attachEventListeners() {
-                this.chatForm.addEventListener('submit', (e) => this.handleSubmit(e));
-                this.chatInput.addEventListener('keypress', (e) => {
-                    if (e.key === 'Enter' && !e.shiftKey) {
-                        e.preventDefault();
-                        this.handleSubmit(e);
-                    }
-                });
-            }
-
-            async checkServerStatus() {
-                try {
-                    const response = await fetch(`${this.backendUrl}/health`);
-                    if (response.ok) {
-                        this.updateStatus(true);
-                    } else {
-                        this.updateStatus(false);
-                    }
-                } catch (error) {
-                    this.updateStatus(false);
-                    this.showError("Cannot connect to server. Please ensure the backend is running.");
-                }
-            }
-
-            updateStatus(connected) {
-                if (connected) {
-                    this.statusIndicator.classList.add('connected');
-                } else {
-                    this.statusIndicator.classList.remove('connected');
-                }
-            }
-
-            async handleSubmit(e) {
-                e.preventDefault();
-                
-                const message = this.chatInput.value.trim();
-                if (!message) return;
-
-                this.chatInput.value = '';
-                this.setLoading(true);
-                this.hideError();
-
-                // Add user message to chat
-                this.addMessage(message, 'user');
-
-                try {
-                    // Create session if not created yet
-                    if (!this.sessionCreated) {
-                        await this.createSession();
-                    }
-
-                    // Send message to /run endpoint
-                    const response = await this.sendMessage(message);
-                    this.addMessage(response, 'assistant');
-                    
-                } catch (error) {
-                    console.error('Error:', error);
-                    this.showError(error.message || 'An error occurred. Please try again.');
-                    this.addMessage("I'm sorry, I encountered an error. Please try again.", 'assistant');
-                } finally {
-                    this.setLoading(false);
-                }
-            }
-
-            async createSession() {
-                try {
-                    this.sessionStatusText.textContent = 'Creating...';
-                    this.sessionStatusText.style.color = '#ff9800';
-                    
-                    const response = await fetch(`${this.backendUrl}/create_session`, {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json'
-                        },
-                        body: JSON.stringify({
-                            app_name: this.appName,
-                            user_id: this.userId,
-                            session_id: this.sessionId
-                        })
-                    });
-
-                    if (!response.ok) {
-                        const errorData = await response.json();
-                        throw new Error(errorData.detail || 'Failed to create session');
-                    }
-
-                    this.sessionCreated = true;
-                    this.updateSessionDisplay();
-                    console.log('Session created successfully');
-                } catch (error) {
-                    this.updateSessionDisplay();
-                    throw new Error('Failed to create session: ' + error.message);
-                }
-            }
-
-            async sendMessage(message) {
-                try {
-                    const response = await fetch(`${this.backendUrl}/chat`, {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json'
-                        },
-                        body: JSON.stringify({
-                            app_name: this.appName,
-                            user_id: this.userId,
-                            session_id: this.sessionId,
-                            message: message
-                        })
-                    });
-
-                    if (!response.ok) {
-                        const errorData = await response.json();
-                        throw new Error(errorData.detail || 'Failed to send message');
-                    }
-
-                    const data = await response.json();
-                    return data.response || "I'm sorry, I couldn't process your request.";
-                } catch (error) {
-                    throw new Error('Failed to send message: ' + error.message);
-                }
-            }
-
-            addMessage(content, sender) {
-                // Remove welcome message if it exists
-                const welcomeMessage = this.chatMessages.querySelector('.welcome-message');
-                if (welcomeMessage) {
-                    welcomeMessage.remove();
-                }
-
-                const messageDiv = document.createElement('div');
-                messageDiv.className = `message ${sender}`;
-
-                const avatar = document.createElement('div');
-                avatar.className = 'message-avatar';
-                avatar.textContent = sender === 'user' ? '👤' : '🤖';
-
-                const messageContent = document.createElement('div');
-                messageContent.className = 'message-content';
-                messageContent.textContent = content;
-
-                messageDiv.appendChild(avatar);
-                messageDiv.appendChild(messageContent);
-
-                this.chatMessages.appendChild(messageDiv);
-                this.scrollToBottom();
-            }
-
-            setLoading(loading) {
-                this.sendButton.disabled = loading;
-                this.chatInput.disabled = loading;
-                
-                if (loading) {
-                    this.sendButton.textContent = '...';
-                    this.typingIndicator.style.display = 'flex';
-                } else {
-                    this.sendButton.textContent = 'Send';
-                    this.typingIndicator.style.display = 'none';
-                }
-                
-                this.scrollToBottom();
-            }
-
-            showError(message) {
-                this.errorMessage.textContent = message;
-                this.errorMessage.style.display = 'block';
-                setTimeout(() => this.hideError(), 5000);
-            }
-
-            hideError() {
-                this.errorMessage.style.display = 'none';
-            }
-
-            scrollToBottom() {
-                setTimeout(() => {
-                    this.chatMessages.scrollTop = this.chatMessages.scrollHeight;
-                }, 100);
-            }
-        }
+@app.before_request
+def _start_request_metrics():
+    # Label by URL rule, not raw path, to keep the number of series bounded
+    g.metrics_route = route_label(request.url_rule.rule) if request.url_rule else 'unmatched'
+    g.metrics_start = time.perf_counter()
+    HTTP_IN_FLIGHT.inc(g.metrics_route)
+
+@app.after_request
+def _record_request_metrics(response):
+    route, method, start = g.metrics_route, request.method, g.metrics_start
+    status = str(response.status_code)
+    
+    def record():
+        HTTP_IN_FLIGHT.dec(route)
+        HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, route, method)
+        HTTP_REQUESTS.inc(route, method, status)
+    
+    # Recorded once the server closes the response, so streamed bodies count in full
+    response.call_on_close(record)
+    return response
+
+@app.after_request
+def _compress_response(response):
+    # Only complete bodies; streamed ones (SSE) go out uncompressed as they are produced
+    if response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding, body = maybe_compress(
+        response.get_data(),
+        response.content_type,
+        request.headers.get('Accept-Encoding'),
+        min_size=COMPRESSION_MIN_SIZE,
+        levels=COMPRESSION_LEVELS,
+    )
+    if encoding:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+# Per-stage tracing of session and chat requests, kept for /debug/traces
+trace_collector = InMemoryCollector(TRACING_MAX_TRACES)
+trace_exporter = JSONLTraceExporter(BufferedJSONLWriter(TRACING_EXPORT_PATH)) if TRACING_EXPORT_PATH else None
+tracer = Tracer(
+    [trace_collector, *([trace_exporter] if trace_exporter else [])],
+    sample_rate=TRACING_SAMPLE_RATE,
+) if TRACING_ENABLED else None
+if trace_exporter:
+    atexit.register(trace_exporter.close)
+
+@app.before_request
+def _start_trace():
+    if tracer and request.path in TRACED_ROUTES:
+        g.trace_root = tracer.start(
+            f"{request.method} {request.path}",
+            traceparent=request.headers.get('traceparent'),
+            trace_id=request.headers.get('X-Trace-Id'),
+        )
 
-        // Initialize the chatbot when the page loads
-        document.addEventListener('DOMContentLoaded', () => {
-            new HealthcareChatbot();
-        });
-    </script>
-</body>
-</html>
-"""
+@app.after_request
+def _finish_trace(response):
+    root = g.pop('trace_root', None)
+    if root is None:
+        return response
+    response.headers['X-Trace-Id'] = root.trace.trace_id
+    status = response.status_code
+    # Finished once the response is closed, so streamed answers are timed in full
+    response.call_on_close(lambda: tracer.finish(root, status))
+    return response
+
+@app.teardown_request
+def _abandon_trace(error):
+    # A request that ended before after_request (e.g. a failing before_request hook)
+    root = g.pop('trace_root', None)
+    if root is not None:
+        tracer.finish(root, 500, error=type(error).__name__ if error else None)
+
+# Opt-in sampling profiler behind /debug/profile
+profiler = Profiler(
+    interval=PROFILING_SAMPLE_INTERVAL,
+    max_seconds=PROFILING_MAX_SECONDS,
+    top=PROFILING_TOP,
+) if PROFILING_ENABLED else None
+
+@app.after_request
+def _count_profiled_request(response):
+    # For ?requests=N profiles; counted once the response has been sent
+    if profiler and request.path != '/debug/profile':
+        response.call_on_close(profiler.request_finished)
+    return response
+
+def create_backend_client(url, replica=None):
+    """Backend connection pool for one backend (keep-alive, per-route timeouts, retries, circuit breakers)"""
+    return BackendClient(
+        url,
+        pool_size=BACKEND_POOL_SIZE,
+        keep_alive=BACKEND_KEEP_ALIVE,
+        timeouts=BACKEND_TIMEOUTS,
+        retries=BACKEND_RETRIES,
+        backoff_factor=BACKEND_RETRY_BACKOFF,
+        breakers=CircuitBreakerSet(CIRCUIT_BREAKER_THRESHOLDS, reset_timeout=CIRCUIT_BREAKER_RESET_TIMEOUT),
+        replica=replica,
+    )
+
+# With several replicas, each session sticks to one of them, and each
+# replica is health-probed on its own thread
+backend_replicas = BackendReplicaSet(
+    [create_backend_client(url, replica=url) for url in BACKEND_URLS],
+    session_state=build_session_state,
+    vnodes=BACKEND_HASH_VNODES,
+    probe_interval=HEALTH_PROBE_INTERVAL,
+    probe_max_backoff=HEALTH_PROBE_MAX_BACKOFF,
+    eject_after=BACKEND_EJECT_AFTER_FAILURES,
+) if len(BACKEND_URLS) > 1 else None
+if backend_replicas:
+    backend_replicas.start()
+
+# Shared backend connection pool, or the replicas behind the same interface
+backend = backend_replicas or create_backend_client(BACKEND_URL)
+# Connection errors name the configured backend(s)
+BACKEND_UNREACHABLE = f"Cannot connect to backend - ensure it's running at {', '.join(BACKEND_URLS)}"
+
+def _probe_backend():
+    response = backend.list_apps()
+    if response.status_code != 200:
+        raise RuntimeError(f"Backend returned status {response.status_code}")
+
+# Backend health is refreshed in the background; /health only reads the cache.
+# Replicas are each probed already, and their set reports the overall health.
+health_prober = BackendHealthProber(
+    _probe_backend,
+    interval=HEALTH_PROBE_INTERVAL,
+    max_backoff=HEALTH_PROBE_MAX_BACKOFF,
+) if not backend_replicas else None
+if health_prober:
+    health_prober.start()
+
+# Track created sessions to avoid duplicate creation (bounded, TTL-evicting)
+created_sessions = create_session_registry(
+    SESSION_REGISTRY_URL,
+    max_size=SESSION_REGISTRY_MAX_SIZE,
+    ttl=SESSION_REGISTRY_TTL,
+)
+
+# Opt-in pool of pre-created sessions that new conversations are bound to
+session_pool = SessionPool(
+    DEFAULT_APP_NAME,
+    DEFAULT_USER_ID,
+    create=lambda session_id: backend.create_session(
+        DEFAULT_APP_NAME, DEFAULT_USER_ID, session_id, build_session_state(DEFAULT_APP_NAME, DEFAULT_USER_ID)
+    ),
+    delete=lambda session_id: backend.delete_session(DEFAULT_APP_NAME, DEFAULT_USER_ID, session_id),
+    size=SESSION_POOL_SIZE,
+    max_idle=SESSION_POOL_MAX_IDLE,
+    concurrency=SESSION_POOL_REFILL_CONCURRENCY,
+    refill_interval=SESSION_POOL_REFILL_INTERVAL,
+) if SESSION_POOL_ENABLED else None
+if session_pool:
+    session_pool.start()
+
+def shutdown(timeout=None):
+    """Stop background probing and pool refilling, waiting up to ``timeout`` for work in progress"""
+    workers = [worker for worker in (health_prober, backend_replicas, session_pool) if worker]
+    for worker in workers:
+        worker.stop()
+    for worker in workers:
+        worker.join(timeout)
+
+atexit.register(shutdown, SERVER_GRACEFUL_TIMEOUT)
+# Two first turns of one conversation must not be bound to two pooled sessions
+session_binding_lock = threading.Lock()
+
+# Chat turns run one at a time per session; resends with the same Idempotency-Key share an answer
+session_queue = SessionQueue(dedup_window=SESSION_QUEUE_DEDUP_WINDOW, max_depth=SESSION_QUEUE_MAX_DEPTH)
+
+# Opt-in cache of answers to the first question of a conversation
+response_cache = ResponseCache(
+    create_session_registry(
+        SESSION_REGISTRY_URL,
+        max_size=SESSION_REGISTRY_MAX_SIZE,
+        ttl=SESSION_REGISTRY_TTL,
+        name='conversations',
+    ),
+    max_size=RESPONSE_CACHE_MAX_SIZE,
+    ttl=RESPONSE_CACHE_TTL,
+) if RESPONSE_CACHE_ENABLED else None
+
+# Chat UI page and assets, rendered and compressed once at startup
+ui = StaticUI(
+    Path(__file__).parent / 'templates' / 'index.html',
+    Path(__file__).parent / 'static',
+    inline_assets=UI_INLINE_ASSETS,
+    page_cache_control=UI_PAGE_CACHE_CONTROL,
+    asset_cache_control=UI_ASSET_CACHE_CONTROL,
+)
+
+# Opt-in capture of session and chat requests for benchmarks/replay.py
+traffic_capture = TrafficCapture(
+    BufferedJSONLWriter(
+        TRAFFIC_CAPTURE_PATH,
+        max_buffer=TRAFFIC_CAPTURE_MAX_BUFFER,
+        flush_interval=TRAFFIC_CAPTURE_FLUSH_INTERVAL,
+    ),
+    chat_text=TRAFFIC_CAPTURE_CHAT_TEXT,
+) if TRAFFIC_CAPTURE_ENABLED else None
+if traffic_capture:
+    atexit.register(traffic_capture.close)
+
+@app.before_request
+def _start_traffic_capture():
+    if traffic_capture and traffic_capture.captures(request.path):
+        g.capture_started_at = traffic_capture.now()
+        g.capture_start = time.perf_counter()
+        g.capture_calls = traffic_capture.start()
+
+@app.after_request
+def _record_traffic_capture(response):
+    if 'capture_calls' not in g:
+        return response
+    route, method, body = request.path, request.method, request.get_json(silent=True)
+    status, started_at, start, calls = response.status_code, g.capture_started_at, g.capture_start, g.capture_calls
+    
+    def record():
+        traffic_capture.finish(route, method, body, status, started_at, time.perf_counter() - start, calls)
+    
+    # Written once the response is closed, so streamed chats include their backend time
+    response.call_on_close(record)
+    return response
+
+# Opt-in per-user rate limit and per-user/per-session in-flight caps
+admission = AdmissionController(
+    create_admission_store(ADMISSION_STORE_URL, lease_ttl=ADMISSION_LEASE_TTL),
+    rate=ADMISSION_RATE,
+    burst=ADMISSION_BURST,
+    max_in_flight_per_user=ADMISSION_MAX_IN_FLIGHT_PER_USER,
+    max_in_flight_per_session=ADMISSION_MAX_IN_FLIGHT_PER_SESSION,
+    concurrency_retry_after=ADMISSION_RETRY_AFTER,
+) if ADMISSION_CONTROL_ENABLED else None
+
+def admission_rejected_response(error):
+    """Turn away a request over its user's or session's limits"""
+    return jsonify({
+        "success": False,
+        "error": f"Too many requests ({error.reason.replace('_', ' ')})",
+        "retry_after": error.retry_after_header
+    }), 429, {"Retry-After": error.retry_after_header}
+
+@app.before_request
+def _admit_request():
+    if not admission or request.path not in ADMITTED_ROUTES:
+        return None
+    data = request.get_json(silent=True)
+    data = data if isinstance(data, dict) else {}
+    app_name = data.get('app_name', DEFAULT_APP_NAME)
+    user_id = data.get('user_id', DEFAULT_USER_ID)
+    session_id = data.get('session_id')
+    try:
+        g.admission_release = admission.admit(
+            user_id, session_key(app_name, user_id, session_id) if session_id else None
+        )
+    except AdmissionRejected as e:
+        ADMISSION_REJECTIONS.inc(request.path, e.reason)
+        return admission_rejected_response(e)
+    return None
+
+@app.after_request
+def _release_admission(response):
+    release = g.pop('admission_release', None)
+    if release:
+        # In-flight slots are held until the last streamed byte has been sent
+        response.call_on_close(release)
+    return response
+
+def ensure_backend_session(app_name, user_id, session_id):
+    """Create the backend session on a registry miss
+    
+    Returns (creation, backend_session_id). ``creation`` is the backend
+    response of the creation call (shared by concurrent callers for the same
+    session through the client's single-flight; for a pooled session, the
+    response that pre-created it), or None if the session was already known.
+    ``backend_session_id`` is the ID the backend knows the session by:
+    ``session_id`` itself unless it was bound to a pooled session.
+    """
+    key = session_key(app_name, user_id, session_id)
+    bound = created_sessions.get(key)
+    if bound is not None:
+        return None, bound or session_id
+    
+    if session_pool and session_pool.serves(app_name, user_id):
+        with session_binding_lock:
+            bound = created_sessions.get(key)
+            if bound is not None:
+                return None, bound or session_id
+            pooled = session_pool.take()
+            if pooled is not None:
+                try:
+                    created_sessions.add(key, pooled.session_id)
+                except RegistryFullError as e:
+                    # Evicting a binding would cut a live conversation off its history; a
+                    # session of the conversation's own ID needs no binding
+                    logger.warning("Not binding session to a pre-created one: %s", e, extra={"session_id": session_id})
+                    session_pool.give_back(pooled)
+                    pooled = None
+        if pooled is not None:
+            logger.info("Bound session to a pre-created one",
+                        extra={"session_id": session_id, "backend_session_id": pooled.session_id})
+            if response_cache:
+                response_cache.record_new_session(key)
+            return pooled.response, pooled.session_id
+    
+    logger.info("Creating session", extra={"app_name": app_name, "user_id": user_id, "session_id": session_id})
+    
+    # Create session with the backend using official docs format; the span
+    # includes waiting for a concurrent creation of the same session
+    with tracing.span('ensure_session'):
+        response = backend.create_session(
+            app_name, user_id, session_id, build_session_state(app_name, user_id)
+        )
+    if response.status_code == 200 or session_already_exists(response):
+        # Mark session as created
+        created_sessions.add(key)
+    if response.status_code == 200 and response_cache:
+        response_cache.record_new_session(key)
+    return response, session_id
+
+def send_pending_turn(app_name, user_id, backend_session_id, key):
+    """Send the agent the first turn of a conversation that the response cache answered
+    
+    The question goes to the backend as it was asked, ahead of the
+    conversation's next one, so that the session holds every turn. Returns
+    (status code, detail) if the backend failed, else None.
+    """
+    question = response_cache.pending_turn(key) if response_cache else None
+    if question is None:
+        return None
+    with tracing.span('pending_turn'):
+        with backend.run_stream(build_run_payload(app_name, user_id, backend_session_id, question)) as response:
+            if response.status_code != 200:
+                return response.status_code, response.text
+            summarize_run_body(response.iter_content(chunk_size=RUN_BODY_CHUNK_SIZE))
+    response_cache.record_turn(key)
+    return None
+
+def circuit_open_response(error):
+    """Fail fast while the backend's circuit is open"""
+    logger.warning("%s", error)
+    return jsonify({
+        "success": False,
+        "error": "Backend temporarily unavailable - circuit open",
+        "retry_after": error.retry_after_header
+    }), 503, {"Retry-After": error.retry_after_header}
+
+def session_busy_response(error):
+    """Turn away a chat turn that cannot wait for its session any longer"""
+    logger.warning("%s", error)
+    return jsonify({
+        "success": False,
+        "error": "Session busy - earlier messages are still being answered",
+        "retry_after": error.retry_after_header
+    }), 429, {"Retry-After": error.retry_after_header}
 
 @app.route('/')
 def index():
     """Serve the chatbot HTML interface"""
-    return render_template_string(HTML_TEMPLATE)
+    return static_response(ui.page)
+
+@app.route('/static/<path:filename>')
+def static_asset(filename):
+    """Serve the chatbot CSS/JS"""
+    asset = ui.asset(filename)
+    if asset is None:
+        abort(404)
+    return static_response(asset)
+
+def static_response(asset):
+    status, headers, body = asset.respond(
+        request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match')
+    )
+    return Response(body, status=status, headers=headers)
 
 @app.route('/health')
 def health_check():
-    """Health check endpoint"""
-    try:
-        # Check if backend is running
-        response = requests.get(f"{BACKEND_URL}/list-apps", timeout=5)
-        backend_status = response.status_code == 200
-    except requests.exceptions.RequestException:
-        backend_status = False
+    """Health check endpoint (answers from the background prober's cached status)"""
+    backend_status = health_prober.snapshot() if health_prober else backend_replicas.status()
     
     return jsonify({
-        "status": "healthy" if backend_status else "backend_unavailable",
-        "backend_connected": backend_status,
+        "status": (
+            "starting" if backend_status["checked_at"] is None
+            else "healthy" if backend_status["backend_connected"]
+            else "backend_unavailable"
+        ),
+        **backend_status,
+        "circuit_breakers": backend.breakers.snapshot(),
+        "replicas": backend_replicas.snapshot() if backend_replicas else None,
         "timestamp": datetime.now().isoformat()
     })
 
@@ -630,53 +567,31 @@ def create_session():
                 "error": "Session ID is required"
             }), 400
         
+        response, backend_session_id = ensure_backend_session(app_name, user_id, session_id)
+                
         # Check if session already created to avoid duplicates
-        session_key = f"{app_name}:{user_id}:{session_id}"
-        if session_key in created_sessions:
-            logger.info(f"Session already exists: {session_id}")
+        if response is None or session_already_exists(response):
+            logger.info("Session already exists", extra={"session_id": session_id})
             return jsonify({
                 "success": True,
                 "session_id": session_id,
                 "message": "Session already exists"
             })
         
-        logger.info(f"Creating session: app={app_name}, user={user_id}, session={session_id}")
-        
-        # Create session with the backend using official docs format
-        session_url = f"{BACKEND_URL}/apps/{app_name}/users/{user_id}/sessions/{session_id}"
-        
-        # Initial state for the session (as per official docs)
-        session_data = {
-            "state": {
-                "initialized": True,
-                "created_at": datetime.now().isoformat(),
-                "app_name": app_name,
-                "user_id": user_id
-            }
-        }
-        
-        response = requests.post(
-            session_url,
-            json=session_data,
-            headers={'Content-Type': 'application/json'},
-            timeout=10
-        )
-        
         if response.status_code == 200:
-            # Mark session as created
-            created_sessions.add(session_key)
-            
             response_data = response.json()
-            logger.info(f"Session created successfully: {session_id}")
+            logger.info("Session created successfully", extra={"session_id": session_id})
             
             return jsonify({
                 "success": True,
                 "session_id": session_id,
+                "backend_session_id": backend_session_id,
                 "message": "Session created successfully",
                 "session_data": response_data
             })
         else:
-            logger.error(f"Failed to create session: {response.status_code} - {response.text}")
+            logger.error("Failed to create session: backend returned %s", response.status_code,
+                         extra={"session_id": session_id, "detail": response.text})
             return jsonify({
                 "success": False,
                 "error": f"Backend returned status {response.status_code}",
@@ -694,11 +609,14 @@ def create_session():
         logger.error("Connection error creating session")
         return jsonify({
             "success": False,
-            "error": "Cannot connect to backend - ensure it's running on port 8000"
+            "error": BACKEND_UNREACHABLE
         }), 503
-        
+    
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
+    
     except Exception as e:
-        logger.error(f"Error creating session: {str(e)}")
+        logger.error("Error creating session: %s", e)
         return jsonify({
             "success": False,
             "error": "Internal server error",
@@ -727,53 +645,88 @@ def chat():
                 "error": "Session ID is required"
             }), 400
         
-        logger.info(f"Sending message: {message[:50]}... (session: {session_id})")
-        
-        # Prepare the message for the /run endpoint (official docs format)
-        chat_payload = {
-            "appName": app_name,
-            "userId": user_id,
-            "sessionId": session_id,
-            "newMessage": {
-                "role": "user",
-                "parts": [
-                    {
-                        "text": message
-                    }
-                ]
-            }
-        }
-        
-        # Send to backend /run endpoint
-        run_url = f"{BACKEND_URL}/run"
-        response = requests.post(
-            run_url,
-            json=chat_payload,
-            headers={'Content-Type': 'application/json'},
-            timeout=30  # Longer timeout for AI responses
-        )
-        
-        if response.status_code == 200:
-            response_data = response.json()
+        # Turns of one session reach the backend one at a time, in order
+        key = session_key(app_name, user_id, session_id)
+        with tracing.span('session_queue'):
+            turn = session_queue.enter(key, request.headers.get('Idempotency-Key'), timeout=SESSION_QUEUE_TIMEOUT)
+        try:
+            if turn.deduplicated:
+                logger.info("Answered a retried request with its earlier answer", extra={"session_id": session_id})
+                return jsonify({**turn.result, "deduplicated": True})
             
-            # Extract the AI response from the events list
-            ai_response = extract_ai_response_from_events(response_data)
+            # Create the session on first use so clients can skip /create_session
+            creation, backend_session_id = ensure_backend_session(app_name, user_id, session_id)
+            if session_creation_failed(creation):
+                logger.error("Failed to create session: backend returned %s", creation.status_code,
+                             extra={"session_id": session_id, "detail": creation.text})
+                return jsonify({
+                    "success": False,
+                    "error": f"Failed to create session: backend returned status {creation.status_code}",
+                    "detail": creation.text
+                }), 400
             
-            logger.info(f"AI response: {ai_response[:50]}...")
+            # A repeated first question in a new session can be answered without calling the agent
+            cache_key, cached = response_cache.lookup(app_name, key, message) if response_cache else (None, None)
+            if cached is not None:
+                logger.info("Answered from response cache", extra={"session_id": session_id})
+                turn.result = {
+                    "success": True,
+                    "response": cached["response"],
+                    "session_id": session_id,
+                    "session_created": creation is not None,
+                    "cached": True,
+                    "events_count": cached["events_count"]
+                }
+                return jsonify(turn.result)
             
-            return jsonify({
-                "success": True,
-                "response": ai_response,
-                "session_id": session_id,
-                "events_count": len(response_data) if isinstance(response_data, list) else 0
-            })
-        else:
-            logger.error(f"Backend error: {response.status_code} - {response.text}")
-            return jsonify({
-                "success": False,
-                "error": f"Backend error: {response.status_code}",
-                "detail": response.text
-            }), 400
+            failed = send_pending_turn(app_name, user_id, backend_session_id, key)
+            if failed:
+                logger.error("Backend error: %s", failed[0], extra={"session_id": session_id, "detail": failed[1]})
+                return jsonify({
+                    "success": False,
+                    "error": f"Backend error: {failed[0]}",
+                    "detail": failed[1]
+                }), 400
+            
+            logger.info("Sending message", extra={"session_id": session_id, "chat_message": message})
+            
+            # Send to backend /run endpoint; the with releases the pooled connection whatever the status
+            with backend.run_stream(build_run_payload(app_name, user_id, backend_session_id, message)) as response:
+                if response.status_code == 200:
+                    # Parse the events one at a time as the body arrives, keeping only
+                    # what the answer needs instead of the whole trace
+                    with tracing.span('parse_run_body'):
+                        summary = summarize_run_body(response.iter_content(chunk_size=RUN_BODY_CHUNK_SIZE))
+                    ai_response = summary.response()
+                    
+                    logger.info("AI response", extra={"session_id": session_id, "chat_response": ai_response})
+                    
+                    events_count = summary.events_count
+                    CHAT_EVENTS.observe(events_count, 'chat')
+                    if response_cache:
+                        # Only cache real model answers, not tool-call or error fallbacks
+                        answer = {"response": ai_response, "events_count": events_count}
+                        response_cache.record_turn(key, cache_key, answer if summary.texts else None)
+                    
+                    turn.result = {
+                        "success": True,
+                        "response": ai_response,
+                        "session_id": session_id,
+                        "session_created": creation is not None,
+                        "cached": False,
+                        "events_count": events_count
+                    }
+                    return jsonify(turn.result)
+                else:
+                    logger.error("Backend error: %s", response.status_code,
+                                 extra={"session_id": session_id, "detail": response.text})
+                    return jsonify({
+                        "success": False,
+                        "error": f"Backend error: {response.status_code}",
+                        "detail": response.text
+                    }), 400
+        finally:
+            turn.release()
             
     except requests.exceptions.Timeout:
         logger.error("Timeout sending message")
@@ -786,104 +739,322 @@ def chat():
         logger.error("Connection error sending message")
         return jsonify({
             "success": False,
-            "error": "Cannot connect to backend - ensure it's running on port 8000"
+            "error": BACKEND_UNREACHABLE
         }), 503
-        
+    
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
+    
+    except SessionBusyError as e:
+        return session_busy_response(e)
+    
     except Exception as e:
-        logger.error(f"Error sending message: {str(e)}")
+        logger.error("Error sending message: %s", e)
         return jsonify({
             "success": False,
             "error": "Internal server error",
             "detail": str(e)
         }), 500
 
-def extract_ai_response_from_events(events):
-    """Extract the AI response text from the events list returned by /run endpoint"""
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream the assistant's answer as it is generated using /run_sse endpoint"""
+    data = request.get_json(silent=True) or {}
+    app_name = data.get('app_name', DEFAULT_APP_NAME)
+    user_id = data.get('user_id', DEFAULT_USER_ID)
+    session_id = data.get('session_id')
+    message = data.get('message', '')
+    
+    if not message.strip():
+        return jsonify({
+            "success": False,
+            "error": "Message cannot be empty"
+        }), 400
+    
+    if not session_id:
+        return jsonify({
+            "success": False,
+            "error": "Session ID is required"
+        }), 400
+    
+    # The done frame echoes the request's trace ID, as JSON answers do
+    trace_id = tracing.current_trace_id()
+    trace_echo = {"trace_id": trace_id} if trace_id else {}
+    
+    # Turns of one session reach the backend one at a time, in order
+    key = session_key(app_name, user_id, session_id)
     try:
-        if not isinstance(events, list):
-            logger.warning("Response is not a list of events")
-            return "I'm sorry, I received an unexpected response format."
-        
-        # Look for the last event with text content from the model
-        for event in reversed(events):
-            if not isinstance(event, dict):
-                continue
-            
-            # Check if this event has content with text from the model
-            content = event.get('content', {})
-            if not content:
-                continue
+        with tracing.span('session_queue'):
+            turn = session_queue.enter(key, request.headers.get('Idempotency-Key'), timeout=SESSION_QUEUE_TIMEOUT)
+    except SessionBusyError as e:
+        return session_busy_response(e)
+    
+    @after_this_request
+    def _release_turn(response):
+        # A stream keeps the turn until it has been sent in full
+        if response.is_streamed:
+            response.call_on_close(turn.release)
+        else:
+            turn.release()
+        return response
+    
+    if turn.deduplicated:
+        logger.info("Answered a retried request with its earlier answer", extra={"session_id": session_id})
+        return Response(
+            iter([
+            format_sse({"type": "delta", "text": turn.result["response"]}),
+            format_sse({"type": "done", **turn.result, "deduplicated": True, **trace_echo})
+            ]),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache'}
+        )
+    
+    # Create the session on first use, before the stream starts, so that
+    # failures still get a regular HTTP error status
+    try:
+        creation, backend_session_id = ensure_backend_session(app_name, user_id, session_id)
+        # A repeated first question in a new session can be answered without calling the agent
+        cache_key, cached = response_cache.lookup(app_name, key, message) if response_cache else (None, None)
+        if cached is None:
+            backend.for_session(app_name, user_id, backend_session_id).breakers.for_route('run_sse').check()
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
+    except requests.exceptions.Timeout:
+        logger.error("Timeout creating session")
+        return jsonify({
+            "success": False,
+            "error": "Request timeout - backend may be slow or unavailable"
+        }), 504
+    except requests.exceptions.ConnectionError:
+        logger.error("Connection error creating session")
+        return jsonify({
+            "success": False,
+            "error": BACKEND_UNREACHABLE
+        }), 503
+    except Exception as e:
+        logger.error("Error creating session: %s", e)
+        return jsonify({
+            "success": False,
+            "error": "Internal server error",
+            "detail": str(e)
+        }), 500
+    if session_creation_failed(creation):
+        logger.error("Failed to create session: backend returned %s", creation.status_code,
+                     extra={"session_id": session_id, "detail": creation.text})
+        return jsonify({
+            "success": False,
+            "error": f"Failed to create session: backend returned status {creation.status_code}",
+            "detail": creation.text
+        }), 400
+    
+    if cached is not None:
+        logger.info("Answered from response cache", extra={"session_id": session_id})
+        turn.result = {
+            "success": True,
+            "response": cached["response"],
+            "session_id": session_id,
+            "session_created": creation is not None,
+            "cached": True,
+            "events_count": cached["events_count"]
+        }
+        return Response(
+            iter([
+            format_sse({"type": "delta", "text": cached["response"]}),
+            format_sse({"type": "done", **turn.result, **trace_echo})
+            ]),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache'}
+        )
+    
+    logger.info("Streaming message", extra={"session_id": session_id, "chat_message": message})
+    
+    payload = build_run_payload(app_name, user_id, backend_session_id, message)
+    payload["streaming"] = True
+    
+    def generate():
+        extractor = StreamingTextExtractor()
+        parser = SSEParser()
+        try:
+            failed = send_pending_turn(app_name, user_id, backend_session_id, key)
+            if failed:
+                logger.error("Backend error: %s", failed[0], extra={"session_id": session_id, "detail": failed[1]})
+                yield format_sse({
+                    "type": "error",
+                    "error": f"Backend error: {failed[0]}",
+                    "detail": failed[1]
+                })
+                return
             
-            # Check if this is from the model/assistant
-            role = content.get('role')
-            if role != 'model':
-                continue
+            with backend.run_sse(payload) as response:
+                if response.status_code != 200:
+                    logger.error("Backend error: %s", response.status_code,
+                                 extra={"session_id": session_id, "detail": response.text})
+                    yield format_sse({
+                        "type": "error",
+                        "error": f"Backend error: {response.status_code}",
+                        "detail": response.text
+                    })
+                    return
+                
+                # Forward text as soon as each backend event arrives
+                with tracing.span('relay_stream') as relay:
+                    for chunk in response.iter_content(chunk_size=None):
+                        for event_data in parser.feed(chunk):
+                            event = json.loads(event_data)
+                            if isinstance(event, dict) and 'error' in event:
+                                yield format_sse({"type": "error", "error": event['error']})
+                                return
+                            delta = extractor.feed(event)
+                            if delta:
+                                yield format_sse({"type": "delta", "text": delta})
+                    relay.set('events', extractor.events_count)
             
-            # Get the parts
-            parts = content.get('parts', [])
-            if not parts:
-                continue
+            summary = extractor.summary()
+            ai_response = summary.response()
+            CHAT_EVENTS.observe(extractor.events_count, 'chat_stream')
+            if response_cache:
+                # Only cache real model answers, not tool-call or error fallbacks
+                answer = {"response": ai_response, "events_count": extractor.events_count}
+                response_cache.record_turn(key, cache_key, answer if summary.texts else None)
             
-            # Look for text in the parts
-            for part in parts:
-                if isinstance(part, dict) and 'text' in part:
-                    text = part['text'].strip()
-                    if text:
-                        logger.info(f"Found AI response in event: {event.get('id', 'unknown')}")
-                        return text
+            turn.result = {
+                "success": True,
+                "response": ai_response,
+                "session_id": session_id,
+                "session_created": creation is not None,
+                "cached": False,
+                "events_count": extractor.events_count
+            }
+            turn.release()
+            yield format_sse({"type": "done", **turn.result, **trace_echo})
+                
+        except requests.exceptions.Timeout:
+            logger.error("Timeout streaming message")
+            yield format_sse({
+                "type": "error",
+                "error": "Request timeout - the AI is taking too long to respond"
+            })
         
-        # If no text found, check for function calls or other content
-        logger.warning("No text response found in events, checking for function calls...")
+        except requests.exceptions.ConnectionError:
+            logger.error("Connection error streaming message")
+            yield format_sse({
+                "type": "error",
+                "error": BACKEND_UNREACHABLE
+            })
         
-        # Look for any content that might indicate what happened
-        for event in reversed(events):
-            if not isinstance(event, dict):
-                continue
-            
-            content = event.get('content', {})
-            parts = content.get('parts', [])
-            
-            for part in parts:
-                if isinstance(part, dict):
-                    # Check for function calls
-                    if 'functionCall' in part:
-                        func_call = part['functionCall']
-                        func_name = func_call.get('name', 'unknown function')
-                        return f"I'm processing your request using {func_name}. Please wait a moment for the response."
-                    
-                    # Check for function responses
-                    if 'functionResponse' in part:
-                        func_resp = part['functionResponse']
-                        response_data = func_resp.get('response', {})
-                        if isinstance(response_data, dict) and 'output' in response_data:
-                            return response_data['output']
+        except CircuitOpenError as e:
+            logger.warning("%s", e)
+            yield format_sse({
+                "type": "error",
+                "error": "Backend temporarily unavailable - circuit open",
+                "retry_after": e.retry_after_header
+            })
         
-        # Fallback message
-        logger.warning("Could not extract meaningful response from events")
-        return "I'm sorry, I'm having trouble processing your request right now. Please try rephrasing your question."
+        except Exception as e:
+            logger.error("Error streaming message: %s", e)
+            yield format_sse({
+                "type": "error",
+                "error": "Internal server error",
+                "detail": str(e)
+            })
         
-    except Exception as e:
-        logger.error(f"Error extracting AI response from events: {str(e)}")
-        return "I'm experiencing some technical difficulties. Please try again."
+        finally:
+            turn.release()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Stop reverse proxies from buffering the stream
+        }
+    )
+
+def _create_batch_session(item):
+    creation, item.backend_session_id = ensure_backend_session(item.app_name, item.user_id, item.session_id)
+    if session_creation_failed(creation):
+        return item.result(
+            False,
+            error=f"Failed to create session: backend returned status {creation.status_code}",
+            detail=creation.text
+        )
+    return None
+
+def _answer_batch_item(item):
+    key = session_key(item.app_name, item.user_id, item.session_id)
+    turn = session_queue.enter(key, timeout=SESSION_QUEUE_TIMEOUT)
+    try:
+        failed = send_pending_turn(item.app_name, item.user_id, item.backend_session_id, key)
+        if failed:
+            return item.result(False, error=f"Backend error: {failed[0]}", detail=failed[1])
+        response = backend.run_stream(
+            build_run_payload(item.app_name, item.user_id, item.backend_session_id, item.message)
+        )
+        try:
+            if response.status_code != 200:
+                return item.result(False, error=f"Backend error: {response.status_code}", detail=response.text)
+            summary = summarize_run_body(response.iter_content(chunk_size=RUN_BODY_CHUNK_SIZE))
+        finally:
+            response.close()
+        if response_cache:
+            response_cache.record_turn(key)
+    finally:
+        turn.release()
+    CHAT_EVENTS.observe(summary.events_count, 'chat_batch')
+    return item.result(True, response=summary.response(), events_count=summary.events_count)
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    """Answer a JSONL body of questions, streaming NDJSON results as each completes
+    
+    Query parameters: concurrency (questions answered at once) and batch_id
+    (names the sessions of questions without a session_id).
+    """
+    body = request.get_data()
+    if body.count(b'\n') >= BATCH_MAX_ITEMS:
+        return jsonify({
+            "success": False,
+            "error": f"Too many questions - at most {BATCH_MAX_ITEMS} per batch"
+        }), 413
+    
+    # Threads beyond the backend pool would only wait for a connection
+    concurrency = request.args.get('concurrency', BATCH_DEFAULT_CONCURRENCY, type=int)
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY, BACKEND_POOL_SIZE))
+    batch_id = request.args.get('batch_id') or uuid.uuid4().hex[:12]
+    logger.info("Starting batch", extra={"batch_id": batch_id, "concurrency": concurrency})
+    
+    items = parse_batch(body, batch_id, DEFAULT_APP_NAME, DEFAULT_USER_ID)
+    results = run_batch(items, _create_batch_session, _answer_batch_item, concurrency)
+    return Response(
+        encode_ndjson(results),
+        mimetype='application/x-ndjson',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
 
 @app.route('/debug/backend_status')
 def debug_backend_status():
     """Debug endpoint to check backend connectivity"""
     try:
         # Test basic connectivity
-        response = requests.get(f"{BACKEND_URL}/list-apps", timeout=5)
+        response = backend.list_apps()
         
         return jsonify({
-            "backend_url": BACKEND_URL,
+            "backend_url": backend.base_url,
             "status_code": response.status_code,
             "response": response.json() if response.status_code == 200 else response.text,
-            "connected": response.status_code == 200
+            "connected": response.status_code == 200,
+            "singleflight": backend.singleflight.stats(),
+            "circuit_breakers": backend.breakers.snapshot()
         })
     except Exception as e:
         return jsonify({
-            "backend_url": BACKEND_URL,
+            "backend_url": backend.base_url,
             "error": str(e),
-            "connected": False
+            "connected": False,
+            "circuit_breakers": backend.breakers.snapshot()
         })
 
 @app.route('/debug/test_session_creation')
@@ -891,7 +1062,8 @@ def debug_test_session_creation():
     """Test session creation endpoint directly"""
     try:
         test_session_id = f"debug_session_{int(datetime.now().timestamp())}"
-        session_url = f"{BACKEND_URL}/apps/{DEFAULT_APP_NAME}/users/{DEFAULT_USER_ID}/sessions/{test_session_id}"
+        session_client = backend.for_session(DEFAULT_APP_NAME, DEFAULT_USER_ID, test_session_id)
+        session_url = session_client.url(session_path(DEFAULT_APP_NAME, DEFAULT_USER_ID, test_session_id))
         
         session_data = {
             "state": {
@@ -900,11 +1072,11 @@ def debug_test_session_creation():
             }
         }
         
-        response = requests.post(
-            session_url,
-            json=session_data,
-            headers={'Content-Type': 'application/json'},
-            timeout=10
+        response = backend.create_session(
+            DEFAULT_APP_NAME,
+            DEFAULT_USER_ID,
+            test_session_id,
+            session_data["state"]
         )
         
         return jsonify({
@@ -924,27 +1096,15 @@ def debug_test_session_creation():
 def debug_test_run():
     """Test the /run endpoint directly"""
     try:
-        test_payload = {
-            "appName": DEFAULT_APP_NAME,
-            "userId": DEFAULT_USER_ID,
-            "sessionId": "debug_session_123",
-            "newMessage": {
-                "role": "user",
-                "parts": [
-                    {
-                        "text": "Hello, this is a test message"
-                    }
-                ]
-            }
-        }
-        
-        response = requests.post(
-            f"{BACKEND_URL}/run",
-            json=test_payload,
-            headers={'Content-Type': 'application/json'},
-            timeout=30
+        test_payload = build_run_payload(
+            DEFAULT_APP_NAME,
+            DEFAULT_USER_ID,
+            "debug_session_123",
+            "Hello, this is a test message"
         )
         
+        response = backend.run(test_payload)
+        
         return jsonify({
             "test_payload": test_payload,
             "status_code": response.status_code,
@@ -959,27 +1119,134 @@ def debug_test_run():
 
 @app.route('/debug/sessions')
 def debug_sessions():
-    """Show created sessions"""
+    """Show created sessions, one page at a time (?cursor=...&limit=...), and the session pool"""
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    keys, next_cursor = created_sessions.page(request.args.get('cursor'), limit)
     return jsonify({
-        "created_sessions": list(created_sessions),
-        "count": len(created_sessions)
+        "created_sessions": keys,
+        "count": len(created_sessions),
+        "next_cursor": next_cursor,
+        "registry": created_sessions.stats(),
+        "queue": session_queue.stats(),
+        "pool": session_pool.stats() if session_pool else None
     })
 
+@app.route('/debug/cache')
+def debug_cache():
+    """Show response cache hit/miss counters"""
+    return jsonify({
+        "enabled": response_cache is not None,
+        "stats": response_cache.stats() if response_cache else None
+    })
+
+@app.route('/debug/admission')
+def debug_admission():
+    """Show admission control limits, admitted/rejected counters and store usage"""
+    return jsonify({
+        "enabled": admission is not None,
+        "stats": admission.stats() if admission else None
+    })
+
+@app.route('/debug/capture')
+def debug_capture():
+    """Show traffic capture counters (records written, dropped, pending)"""
+    return jsonify({
+        "enabled": traffic_capture is not None,
+        "stats": traffic_capture.stats() if traffic_capture else None
+    })
+
+@app.route('/debug/config')
+def debug_config():
+    """Show the effective settings and where each came from (env, file or default)"""
+    return jsonify({**settings.snapshot(), "logging": log_pipeline.stats()})
+
+@app.route('/debug/traces')
+def debug_traces():
+    """Show the slowest recent traces with their per-stage breakdown
+    
+    ``?route=POST /chat`` keeps one route, ``?limit=`` caps the list and
+    ``?trace_id=`` looks up a single trace instead.
+    """
+    if tracer is None:
+        return jsonify({"enabled": False, "traces": []})
+    trace_id = request.args.get('trace_id')
+    if trace_id:
+        traces = trace_collector.get(trace_id)
+    else:
+        limit = request.args.get('limit', 20, type=int)
+        traces = trace_collector.slowest(limit, name=request.args.get('route'))
+    return jsonify({
+        "enabled": True,
+        "sample_rate": tracer.sample_rate,
+        "collector": trace_collector.stats(),
+        "exporter": trace_exporter.stats() if trace_exporter else None,
+        "traces": [trace.to_dict() for trace in traces],
+    })
+
+@app.route('/debug/profile')
+def debug_profile():
+    """Profile the gateway for ?seconds=N, or until ?requests=N more requests finish
+    
+    Answers with collapsed stacks for a flame graph (only those, as text,
+    with ?format=collapsed), the functions most often on CPU and, with
+    ?memory=1, the allocation sites that grew most (tracemalloc).
+    """
+    if profiler is None:
+        return jsonify({
+            "success": False,
+            "error": "Profiling is disabled - set PROFILING_ENABLED=1"
+        }), 404
+    
+    try:
+        profile = profiler.start(
+            seconds=request.args.get('seconds', type=float),
+            requests=request.args.get('requests', type=int),
+            memory=request.args.get('memory') in ('1', 'true'),
+            top=request.args.get('top', type=int),
+        )
+    except ProfilerBusy as e:
+        return jsonify({"success": False, "error": str(e)}), 409
+    
+    result = profile.wait()
+    if request.args.get('format') == 'collapsed':
+        return Response(result["collapsed"], mimetype='text/plain')
+    return jsonify({"success": True, **result})
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics for gateway routes and backend calls"""
+    return Response(METRICS.render(), content_type=METRICS_CONTENT_TYPE)
+
 if __name__ == '__main__':
     print("🏥 Healthcare Chatbot Server Starting...")
-    print(f"🔗 Backend URL: {BACKEND_URL}")
-    print(f"🌐 Frontend URL: http://localhost:5000")
-    print(f"❤️  Health Check: http://localhost:5000/health")
-    print(f"🔧 Debug Backend: http://localhost:5000/debug/backend_status")
-    print(f"🧪 Test Session Creation: http://localhost:5000/debug/test_session_creation")
-    print(f"🧪 Test /run endpoint: http://localhost:5000/debug/test_run")
-    print(f"📋 View Sessions: http://localhost:5000/debug/sessions")
+    # A wildcard bind address is reached through localhost
+    base_url = f"http://{'localhost' if SERVER_HOST in ('0.0.0.0', '::') else SERVER_HOST}:{SERVER_PORT}"
+    print(f"🔗 Backend URL: {', '.join(BACKEND_URLS)}")
+    print(f"🌐 Frontend URL: {base_url}")
+    print(f"❤️  Health Check: {base_url}/health")
+    print(f"🔧 Debug Backend: {base_url}/debug/backend_status")
+    print(f"🧪 Test Session Creation: {base_url}/debug/test_session_creation")
+    print(f"🧪 Test /run endpoint: {base_url}/debug/test_run")
+    print(f"📋 View Sessions: {base_url}/debug/sessions")
+    print(f"🗄️  Response Cache: {base_url}/debug/cache")
+    print(f"📼 Traffic Capture: {base_url}/debug/capture")
+    print(f"🚦 Admission Control: {base_url}/debug/admission")
+    print(f"⚙️  Settings: {base_url}/debug/config")
+    print(f"🔍 Slowest traces: {base_url}/debug/traces")
+    print(f"🔥 Profiler (PROFILING_ENABLED=1): {base_url}/debug/profile?seconds=10")
+    print(f"📈 Metrics: {base_url}/metrics")
+    print(f"📡 Streaming chat: POST {base_url}/chat/stream")
+    print(f"📦 Batch chat: POST {base_url}/chat/batch (JSONL in, NDJSON out)")
+    print(f"⚡ Async mode: uvicorn asgi:app --host {SERVER_HOST} --port {SERVER_PORT}")
+    print("🚀 Production (multi-worker): python serve.py")
     print("\n" + "="*50)
     print("✅ Following Official Documentation Pattern:")
     print("   1. Create session first using POST /apps/{app}/users/{user}/sessions/{session}")
+    print("      (done automatically by the first /chat for a new session ID)")
     print("   2. Then use /run endpoint for chat")
     print(f"✅ Session IDs will be generated like: {123000000 + int(datetime.now().timestamp()) % 1000000}")
-    print("Make sure your backend is running on port 8000!")
+    print(f"Make sure your backend is running at {', '.join(BACKEND_URLS)}!")
     print("="*50 + "\n")
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Development server only; see serve.py for production
+    app.run(host=SERVER_HOST, port=SERVER_PORT, debug=SERVER_DEBUG)
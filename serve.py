@@ -0,0 +1,118 @@
+"""Production launcher for the healthcare chatbot gateway
+
+Validates the settings, then replaces itself with a multi-worker server:
+gunicorn with threaded (gthread) workers for the Flask app, or uvicorn
+worker processes for the ASGI app. Worker and thread counts, bind address
+and mode come from the SERVER_* settings (see gateway/config.py) and can be
+overridden on the command line:
+
+    python serve.py                                  # SERVER_MODE, default asgi
+    python serve.py --mode flask --workers 4 --threads 16
+    python serve.py --dry-run                        # print the command only
+"""
+import argparse
+import os
+import shlex
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def server_command(mode, host, port, workers, threads, backlog, graceful_timeout):
+    """argv that serves the gateway in ``mode`` ('flask' or 'asgi')"""
+    if mode == 'flask':
+        # No --preload: every worker imports the app itself, so its background
+        # threads (health probing, capture writer) start in the worker
+        return [
+            sys.executable, '-m', 'gunicorn', 'main:app',
+            '--chdir', HERE,
+            '--bind', f"{host}:{port}",
+            '--workers', str(workers),
+            '--worker-class', 'gthread',
+            '--threads', str(threads),
+            '--backlog', str(backlog),
+            '--graceful-timeout', str(graceful_timeout),
+        ]
+    return [
+        sys.executable, '-m', 'uvicorn', 'asgi:app',
+        '--app-dir', HERE,
+        '--host', host,
+        '--port', str(port),
+        '--workers', str(workers),
+        '--backlog', str(backlog),
+        '--timeout-graceful-shutdown', str(graceful_timeout),
+        '--no-access-log',
+    ]
+
+
+def shared_state_warnings(config, workers):
+    """Stores that each worker would keep to itself"""
+    if workers < 2:
+        return []
+    stores = [('SESSION_REGISTRY_URL', config.SESSION_REGISTRY_URL)]
+    if config.ADMISSION_CONTROL_ENABLED:
+        stores.append(('ADMISSION_STORE_URL', config.ADMISSION_STORE_URL))
+    warnings = [
+        f"{name}={url} is per worker; use a sqlite:/// URL to share it between the {workers} workers"
+        for name, url in stores if url == 'memory://'
+    ]
+    # Metrics are always kept per process (see gateway/metrics.py)
+    warnings.append(f"/metrics is per worker; each scrape shows the counters of one of the {workers} workers")
+    return warnings
+
+
+def shared_state_errors(config, workers):
+    """Settings that give wrong answers when each worker keeps its own store"""
+    if workers < 2 or config.SESSION_REGISTRY_URL != 'memory://':
+        return []
+    # A conversation's next turn on another worker would look like a first
+    # turn: answered from the cache, or bound to another pooled session,
+    # without its context
+    features = [name for name in ('RESPONSE_CACHE_ENABLED', 'SESSION_POOL_ENABLED') if getattr(config, name)]
+    return [
+        f"{name} needs a shared SESSION_REGISTRY_URL (sqlite:///) with {workers} workers; it is memory://"
+        for name in features
+    ]
+
+
+def main():
+    from gateway.settings import SettingsError
+
+    # Importing the config validates every setting; report all problems at once
+    try:
+        from gateway import config
+    except SettingsError as e:
+        sys.exit(str(e))
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=['flask', 'asgi'], default=config.SERVER_MODE)
+    parser.add_argument('--host', default=config.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=config.SERVER_PORT)
+    parser.add_argument('--workers', type=int, default=config.SERVER_WORKERS, help='worker processes')
+    parser.add_argument('--threads', type=int, default=config.SERVER_THREADS,
+                        help='threads per Flask worker (ignored in asgi mode)')
+    parser.add_argument('--dry-run', action='store_true', help='print the server command and exit')
+    args = parser.parse_args()
+
+    errors = shared_state_errors(config, args.workers)
+    if errors:
+        sys.exit('\n'.join(errors))
+    command = server_command(args.mode, args.host, args.port, args.workers, args.threads,
+                             config.SERVER_BACKLOG, config.SERVER_GRACEFUL_TIMEOUT)
+    for warning in shared_state_warnings(config, args.workers):
+        print(f"warning: {warning}", file=sys.stderr)
+    if args.mode == 'flask' and args.threads > config.BACKEND_POOL_SIZE:
+        print(f"warning: {args.threads} threads share a backend pool of {config.BACKEND_POOL_SIZE} "
+              f"connections per worker (BACKEND_POOL_SIZE)", file=sys.stderr)
+
+    print(shlex.join(command), file=sys.stderr)
+    if args.dry_run:
+        return
+    sys.stdout.flush()
+    sys.stderr.flush()
+    # Replace this process, so signals from the supervisor reach the server directly
+    os.execv(command[0], command)
+
+
+if __name__ == '__main__':
+    main()
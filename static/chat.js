@@ -0,0 +1,257 @@
+class HealthcareChatbot {
+    constructor() {
+        this.sessionId = this.generateSessionId();
+        this.userId = "user";
+        this.appName = "app";
+        this.backendUrl = ""; // Same server
+        this.sessionCreated = false;
+
+        this.initializeElements();
+        this.attachEventListeners();
+        this.checkServerStatus();
+        this.updateSessionDisplay();
+    }
+
+    generateSessionId() {
+        // Generate a session ID like 123456789
+        return Math.floor(100000000 + Math.random() * 900000000).toString();
+    }
+
+    generateIdempotencyKey() {
+        // randomUUID needs a secure context (https or localhost)
+        if (crypto.randomUUID) return crypto.randomUUID();
+        return Array.from(crypto.getRandomValues(new Uint8Array(16)), b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    initializeElements() {
+        this.chatForm = document.getElementById('chatForm');
+        this.chatInput = document.getElementById('chatInput');
+        this.sendButton = document.getElementById('sendButton');
+        this.chatMessages = document.getElementById('chatMessages');
+        this.typingIndicator = document.getElementById('typingIndicator');
+        this.errorMessage = document.getElementById('errorMessage');
+        this.statusIndicator = document.getElementById('statusIndicator');
+        this.sessionIdDisplay = document.getElementById('sessionIdDisplay');
+        this.sessionStatusText = document.getElementById('sessionStatusText');
+    }
+
+    updateSessionDisplay() {
+        this.sessionIdDisplay.textContent = this.sessionId;
+        this.sessionStatusText.textContent = this.sessionCreated ? 'Created' : 'Not Created';
+        this.sessionStatusText.style.color = this.sessionCreated ? '#2e7d32' : '#d32f2f';
+    }
+
+    attachEventListeners() {
+        this.chatForm.addEventListener('submit', (e) => this.handleSubmit(e));
+        this.chatInput.addEventListener('keypress', (e) => {
+            if (e.key === 'Enter' && !e.shiftKey) {
+                e.preventDefault();
+                this.handleSubmit(e);
+            }
+        });
+    }
+
+    async checkServerStatus() {
+        try {
+            const response = await fetch(`${this.backendUrl}/health`);
+            if (response.ok) {
+                this.updateStatus(true);
+            } else {
+                this.updateStatus(false);
+            }
+        } catch (error) {
+            this.updateStatus(false);
+            this.showError("Cannot connect to server. Please ensure the backend is running.");
+        }
+    }
+
+    updateStatus(connected) {
+        if (connected) {
+            this.statusIndicator.classList.add('connected');
+        } else {
+            this.statusIndicator.classList.remove('connected');
+        }
+    }
+
+    async handleSubmit(e) {
+        e.preventDefault();
+
+        const message = this.chatInput.value.trim();
+        if (!message) return;
+
+        this.chatInput.value = '';
+        this.setLoading(true);
+        this.hideError();
+
+        // Add user message to chat
+        this.addMessage(message, 'user');
+
+        try {
+            // Stream the answer into the chat as it is generated; the
+            // server creates the session on the first message. The key is
+            // the message's: its retries are answered once, not run again
+            await this.streamMessage(message, this.generateIdempotencyKey());
+
+        } catch (error) {
+            console.error('Error:', error);
+            this.showError(error.message || 'An error occurred. Please try again.');
+            this.addMessage("I'm sorry, I encountered an error. Please try again.", 'assistant');
+        } finally {
+            this.setLoading(false);
+        }
+    }
+
+    async postWithRetry(url, options, attempts = 3) {
+        for (let attempt = 1; ; attempt++) {
+            let response;
+            try {
+                response = await fetch(url, options);
+            } catch (error) {
+                // Network error: the request may have reached the server, so
+                // only a request with an Idempotency-Key is safe to resend
+                if (attempt >= attempts) throw error;
+                await new Promise(resolve => setTimeout(resolve, attempt * 500));
+                continue;
+            }
+            // Busy session or backend: wait as asked, then send the same request again
+            if ((response.status === 429 || response.status === 503) && attempt < attempts) {
+                const retryAfter = Number(response.headers.get('Retry-After')) || attempt;
+                await new Promise(resolve => setTimeout(resolve, Math.min(retryAfter, 5) * 1000));
+                continue;
+            }
+            return response;
+        }
+    }
+
+    async streamMessage(message, idempotencyKey) {
+        const response = await this.postWithRetry(`${this.backendUrl}/chat/stream`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Idempotency-Key': idempotencyKey
+            },
+            body: JSON.stringify({
+                app_name: this.appName,
+                user_id: this.userId,
+                session_id: this.sessionId,
+                message: message
+            })
+        });
+
+        if (!response.ok) {
+            const errorData = await response.json();
+            throw new Error('Failed to send message: ' + (errorData.error || 'Unknown error'));
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        let messageContent = null;
+
+        const render = (content) => {
+            if (!messageContent) {
+                // First bytes of the answer: replace the typing indicator with a bubble
+                this.typingIndicator.style.display = 'none';
+                messageContent = this.addMessage('', 'assistant');
+            }
+            messageContent.textContent = content;
+            this.scrollToBottom();
+        };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true }).replace(/\r\n/g, '\n');
+            const frames = buffer.split('\n\n');
+            buffer = frames.pop();
+
+            for (const frame of frames) {
+                const data = frame
+                    .split('\n')
+                    .filter(line => line.startsWith('data:'))
+                    .map(line => line.slice(5).trimStart())
+                    .join('\n');
+                if (!data) continue;
+
+                const event = JSON.parse(data);
+                if (event.type === 'delta') {
+                    text += event.text;
+                    render(text);
+                } else if (event.type === 'done') {
+                    // Keep the streamed text; fall back to the final answer if nothing streamed
+                    render(text || event.response || "I'm sorry, I couldn't process your request.");
+                    if (!this.sessionCreated) {
+                        this.sessionCreated = true;
+                        this.updateSessionDisplay();
+                    }
+                } else if (event.type === 'error') {
+                    throw new Error('Failed to send message: ' + event.error);
+                }
+            }
+        }
+    }
+
+    addMessage(content, sender) {
+        // Remove welcome message if it exists
+        const welcomeMessage = this.chatMessages.querySelector('.welcome-message');
+        if (welcomeMessage) {
+            welcomeMessage.remove();
+        }
+
+        const messageDiv = document.createElement('div');
+        messageDiv.className = `message ${sender}`;
+
+        const avatar = document.createElement('div');
+        avatar.className = 'message-avatar';
+        avatar.textContent = sender === 'user' ? '👤' : '🤖';
+
+        const messageContent = document.createElement('div');
+        messageContent.className = 'message-content';
+        messageContent.textContent = content;
+
+        messageDiv.appendChild(avatar);
+        messageDiv.appendChild(messageContent);
+
+        this.chatMessages.appendChild(messageDiv);
+        this.scrollToBottom();
+        return messageContent;
+    }
+
+    setLoading(loading) {
+        this.sendButton.disabled = loading;
+        this.chatInput.disabled = loading;
+
+        if (loading) {
+            this.sendButton.textContent = '...';
+            this.typingIndicator.style.display = 'flex';
+        } else {
+            this.sendButton.textContent = 'Send';
+            this.typingIndicator.style.display = 'none';
+        }
+
+        this.scrollToBottom();
+    }
+
+    showError(message) {
+        this.errorMessage.textContent = message;
+        this.errorMessage.style.display = 'block';
+        setTimeout(() => this.hideError(), 5000);
+    }
+
+    hideError() {
+        this.errorMessage.style.display = 'none';
+    }
+
+    scrollToBottom() {
+        setTimeout(() => {
+            this.chatMessages.scrollTop = this.chatMessages.scrollHeight;
+        }, 100);
+    }
+}
+
+// Initialize the chatbot when the page loads
+document.addEventListener('DOMContentLoaded', () => {
+    new HealthcareChatbot();
+});
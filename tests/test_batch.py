@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+
+from gateway.batch import BatchItem, parse_batch, run_batch, run_batch_async
+
+
+def items_for(sessions):
+    return [BatchItem(i, str(i), 'app', 'user', session, f"question {i}") for i, session in enumerate(sessions)]
+
+
+def collect(results, timeout=10.0):
+    """The results of run_batch, failing instead of hanging if it never finishes"""
+    collected = []
+    thread = threading.Thread(target=lambda: collected.extend(results), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), f"batch hung after {len(collected)} results"
+    return collected
+
+
+def test_single_session_with_slow_first_creation_finishes_in_order():
+    items = items_for(['s'] * 100)
+    answered = []
+
+    def create(item):
+        if item.index == 0:
+            time.sleep(0.5)
+
+    def answer(item):
+        answered.append(item.index)
+        return item.result(True)
+
+    results = collect(run_batch(items, create, answer, concurrency=8))
+    assert len(results) == 100
+    assert answered == list(range(100))
+
+
+def test_sessions_are_answered_in_file_order_and_concurrently():
+    items = items_for([f"s{i % 4}" for i in range(40)])
+    answered = {f"s{i}": [] for i in range(4)}
+    lock = threading.Lock()
+    active = [0, 0]
+
+    def answer(item):
+        with lock:
+            active[0] += 1
+            active[1] = max(active)
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+            answered[item.session_id].append(item.index)
+        return item.result(True)
+
+    results = collect(run_batch(items, lambda item: None, answer, concurrency=8))
+    assert len(results) == 40
+    for session, indexes in answered.items():
+        assert indexes == sorted(indexes)
+    assert active[1] > 1
+
+
+def test_failed_creation_passes_the_turn_on():
+    items = items_for(['s'] * 5)
+
+    def create(item):
+        if item.index == 1:
+            return item.result(False, error="creation failed")
+
+    results = collect(run_batch(items, create, lambda item: item.result(True), concurrency=4))
+    assert sorted((result["index"], result["success"]) for result in results) == [
+        (0, True), (1, False), (2, True), (3, True), (4, True),
+    ]
+
+
+def test_unusable_lines_get_an_error_result():
+    body = b'{"message": "hi"}\nnot json\n\n{"message": " "}\n'
+    items = list(parse_batch(body, 'b1', 'app', 'user'))
+    results = collect(run_batch(items, lambda item: None, lambda item: item.result(True), concurrency=2))
+    assert sorted((result["index"], result.get("error")) for result in results) == [
+        (0, None), (1, "Line is not a JSON object"), (2, "Message cannot be empty"),
+    ]
+
+
+def test_async_single_session_with_slow_first_creation_finishes_in_order():
+    items = items_for(['s'] * 100)
+    answered = []
+
+    async def create(item):
+        if item.index == 0:
+            await asyncio.sleep(0.5)
+
+    async def answer(item):
+        answered.append(item.index)
+        return item.result(True)
+
+    async def run():
+        return [result async for result in run_batch_async(items, create, answer, concurrency=8)]
+
+    results = asyncio.run(asyncio.wait_for(run(), 10.0))
+    assert len(results) == 100
+    assert answered == list(range(100))
@@ -0,0 +1,77 @@
+import pytest
+
+from gateway.circuit_breaker import CircuitBreaker, CircuitBreakerSet, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_opens_after_threshold_and_closes_after_a_trial():
+    clock = FakeClock()
+    breaker = CircuitBreaker('run', failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.before_call()
+    assert raised.value.retry_after_header == '10'
+
+    clock.now = 10
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one trial call at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()["rejected"] == 2
+
+
+def test_failed_trial_reopens():
+    clock = FakeClock()
+    breaker = CircuitBreaker('run', failure_threshold=1, reset_timeout=5, clock=clock)
+    breaker.record_failure()
+    clock.now = 5
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.is_open()
+    assert breaker.snapshot()["retry_after_seconds"] == 5
+
+
+def test_abandoned_trial_does_not_hold_the_circuit_half_open():
+    clock = FakeClock()
+    breaker = CircuitBreaker('run', failure_threshold=1, reset_timeout=5, clock=clock)
+    breaker.record_failure()
+    clock.now = 5
+    breaker.before_call()
+    clock.now = 10
+    breaker.before_call()
+
+
+def test_check_does_not_use_up_the_trial():
+    clock = FakeClock()
+    breaker = CircuitBreaker('run', failure_threshold=1, reset_timeout=5, clock=clock)
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    clock.now = 5
+    breaker.check()
+    breaker.before_call()
+
+
+def test_set_keeps_one_breaker_per_route_with_its_threshold():
+    breakers = CircuitBreakerSet(thresholds={'run': 1}, default_threshold=3)
+    assert breakers.for_route('run') is breakers.for_route('run')
+    assert breakers.for_route('run').failure_threshold == 1
+    assert breakers.for_route('list_apps').failure_threshold == 3
+    assert not breakers.any_open()
+    breakers.for_route('run').record_failure()
+    assert breakers.any_open()
+    assert list(breakers.snapshot()) == ['list_apps', 'run']
@@ -0,0 +1,53 @@
+import json
+
+from gateway.events import StreamingTextExtractor, summarize_events, summarize_run_body
+
+
+def model(text, partial=False):
+    event = {"author": "assistant", "content": {"role": "model", "parts": [{"text": text}]}}
+    if partial:
+        event["partial"] = True
+    return event
+
+
+def tool_call(name):
+    parts = [{"functionCall": {"name": name, "args": {}}}]
+    return {"author": "assistant", "content": {"role": "model", "parts": parts}}
+
+
+def tool_output(name, output):
+    return {"author": "assistant", "content": {"role": "user", "parts": [
+        {"functionResponse": {"name": name, "response": {"output": output}}},
+    ]}}
+
+
+RUN = [
+    {"author": "user", "content": {"role": "user", "parts": [{"text": "What helps a headache?"}]}},
+    model("Let me look that up."),
+    tool_call("lookup_condition"),
+    tool_output("lookup_condition", "Rest and fluids."),
+    model("Rest and drink water. "),
+]
+
+
+def test_chat_answers_with_every_model_turn():
+    # /chat used to answer with the last model turn only
+    summary = summarize_events(RUN)
+    assert summary.response() == "Let me look that up.\n\nRest and drink water."
+    assert summary.events_count == 5
+
+
+def test_run_body_and_stream_give_the_same_answer():
+    body = json.dumps(RUN).encode()
+    chunks = [body[i:i + 16] for i in range(0, len(body), 16)]
+    extractor = StreamingTextExtractor()
+    # Over /run_sse a model turn streams as partial events before its final one
+    events = [RUN[0], model("Let me ", partial=True)] + RUN[1:]
+    streamed = ''.join(extractor.feed(event) for event in events)
+    assert summarize_run_body(chunks).response() == extractor.summary().response() == streamed.strip()
+
+
+def test_tool_activity_stands_in_for_missing_text():
+    assert summarize_events([RUN[0], RUN[2], RUN[3]]).response() == "Rest and fluids."
+    assert "lookup_condition" in summarize_events([RUN[0], RUN[2]]).response()
+    assert not summarize_events({"error": "boom"}).valid
@@ -0,0 +1,51 @@
+import importlib
+import logging
+import os
+import sys
+
+import pytest
+
+from benchmarks.fake_adk import start_fake_backend
+
+
+@pytest.fixture(scope='module')
+def fake():
+    fake = start_fake_backend()
+    os.environ['BACKEND_URL'] = fake.url
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    handlers = logging.getLogger().handlers[:]
+    yield fake
+    # The gateways' log pipelines write to this module's captured stderr
+    for name in ('main', 'asgi'):
+        if name in sys.modules:
+            sys.modules[name].log_pipeline.stop()
+    if 'main' in sys.modules:
+        sys.modules['main'].shutdown()
+    logging.getLogger().handlers[:] = handlers
+    fake.shutdown()
+
+
+def chat_twice(post, session_id):
+    body = {"session_id": session_id, "message": "Is ibuprofen safe with a cold?"}
+    headers = {"Idempotency-Key": f"{session_id}-message-1"}
+    return post('/chat', body, headers), post('/chat', body, headers)
+
+
+def test_flask_runs_a_resent_message_once(fake):
+    client = importlib.import_module('main').app.test_client()
+    before = fake.calls['run']
+    first, second = chat_twice(lambda path, body, headers: client.post(path, json=body, headers=headers), 'flask')
+    assert fake.calls['run'] - before == 1
+    assert second.get_json()["deduplicated"] is True
+    assert second.get_json()["response"] == first.get_json()["response"]
+
+
+def test_asgi_runs_a_resent_message_once(fake):
+    from starlette.testclient import TestClient
+
+    with TestClient(importlib.import_module('asgi').app) as client:
+        before = fake.calls['run']
+        first, second = chat_twice(lambda path, body, headers: client.post(path, json=body, headers=headers), 'asgi')
+    assert fake.calls['run'] - before == 1
+    assert second.json()["deduplicated"] is True
+    assert second.json()["response"] == first.json()["response"]
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from gateway.json_stream import JSONArrayParser, NotAJSONArray
+
+DOCUMENT = [{"id": 1, "text": "héllo ✓"}, 2.5, -3e2, "a,]b", [], None, True, {"nested": [1, {"x": "]"}]}]
+
+
+def parse(body, size):
+    parser = JSONArrayParser()
+    items = []
+    for start in range(0, len(body), size):
+        items += parser.feed(body[start:start + size])
+    return items + parser.close()
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 10_000])
+def test_items_survive_any_chunking(size):
+    body = json.dumps(DOCUMENT, ensure_ascii=False).encode()
+    assert parse(body, size) == DOCUMENT
+
+
+def test_items_are_returned_as_soon_as_complete():
+    parser = JSONArrayParser()
+    assert parser.feed(b'[{"a": 1}, {"b"') == [{"a": 1}]
+    assert parser.feed(b': 2}, 1') == [{"b": 2}]
+    # The 1 may still be the start of 12 or 1.5
+    assert parser.feed(b'2') == []
+    assert parser.feed(b']') + parser.close() == [12]
+
+
+def test_empty_array():
+    parser = JSONArrayParser()
+    assert parser.feed(b' [ ] ') == []
+    assert parser.close() == []
+
+
+def test_an_error_object_is_not_an_array():
+    with pytest.raises(NotAJSONArray):
+        JSONArrayParser().feed(b'{"error": "boom"}')
+
+
+@pytest.mark.parametrize('body', [b'[1, 2', b'[{"a": ', b'[1 2]', b''])
+def test_malformed_or_truncated_bodies_raise(body):
+    parser = JSONArrayParser()
+    with pytest.raises(json.JSONDecodeError):
+        parser.feed(body)
+        parser.close()
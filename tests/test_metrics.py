@@ -0,0 +1,16 @@
+from gateway.metrics import Gauge, route_label
+
+
+def test_route_labels_agree_between_serving_modes():
+    assert route_label('/static/<path:filename>') == route_label('/static/{filename:path}') == '/static/{filename}'
+    assert route_label('/apps/<app>/users/<int:user>') == '/apps/{app}/users/{user}'
+    assert route_label('/chat/stream') == '/chat/stream'
+
+
+def test_gauge_function_is_read_when_rendered():
+    gauge = Gauge('test_gauge', 'A test gauge', ('name',))
+    state = {'value': 1}
+    gauge.set_function(lambda: state['value'], 'a')
+    assert gauge.value('a') == 1
+    state['value'] = 0
+    assert gauge.render()[-1] == 'test_gauge{name="a"} 0'
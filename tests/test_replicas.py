@@ -0,0 +1,119 @@
+import asyncio
+from types import SimpleNamespace
+
+import aiohttp
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from gateway.metrics import BACKEND_REPLICA_HEALTHY
+from gateway.replicas import AsyncBackendReplicaSet, BackendReplicaSet, HashRing, Replica
+
+
+def test_owner_is_first_in_preference_and_stable():
+    ring = HashRing(['a', 'b', 'c'])
+    again = HashRing(['c', 'b', 'a'])
+    for i in range(200):
+        key = f"app:user:{i}"
+        assert ring.preference(key)[0] == ring.owner(key) == again.owner(key)
+        assert sorted(ring.preference(key)) == ['a', 'b', 'c']
+
+
+def test_shares_are_even_and_sum_to_one():
+    shares = HashRing(['a', 'b', 'c', 'd']).shares()
+    assert abs(sum(shares.values()) - 1) < 1e-9
+    assert all(0.15 < share < 0.35 for share in shares.values())
+
+
+def test_adding_a_replica_only_moves_keys_to_it():
+    before, after = HashRing(['a', 'b', 'c']), HashRing(['a', 'b', 'c', 'd'])
+    keys = [f"app:user:{i}" for i in range(4000)]
+    moved = [key for key in keys if before.owner(key) != after.owner(key)]
+    assert all(after.owner(key) == 'd' for key in moved)
+    assert 0.15 < len(moved) / len(keys) < 0.35
+
+
+class FakeClient:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.circuit_open = False
+        self.breakers = SimpleNamespace(any_open=lambda: self.circuit_open)
+
+
+def test_replica_is_ejected_only_after_repeated_connect_failures():
+    replica = Replica('a', FakeClient('a'), probe=lambda: None, eject_after=3)
+    error = requests.exceptions.ConnectionError()
+    replica.record_call(error)
+    replica.record_call(error)
+    assert replica.available
+    replica.record_call(error)
+    assert not replica.available
+    # Failed calls never stretch the probe backoff
+    assert replica.consecutive_failures == 0
+    replica.record()
+    assert replica.available and replica.call_failures == 0
+
+
+def test_a_successful_call_resets_the_count():
+    replica = Replica('a', FakeClient('a'), probe=lambda: None, eject_after=2)
+    replica.record_call(requests.exceptions.ConnectionError())
+    replica.record_call()
+    replica.record_call(requests.exceptions.ConnectionError())
+    assert replica.available
+
+
+def test_call_falls_back_without_ejecting_at_first():
+    replicas = BackendReplicaSet([FakeClient('a'), FakeClient('b')], session_state=None, eject_after=2)
+    session = ('app', 'user', 's1')
+    owner = replicas._choose(session)
+
+    refused = MaxRetryError(None, '/run', NewConnectionError(None, 'refused'))
+
+    def call(client):
+        if client is owner.client:
+            raise requests.exceptions.ConnectionError(refused)
+        return 'ok'
+
+    replica, result = replicas._call(session, call)
+    assert result == 'ok' and replica is not owner
+    assert owner.available and owner.call_failures == 1
+    replicas._call(session, call)
+    assert not owner.available
+
+
+def test_healthy_gauge_follows_availability_including_open_circuits():
+    client = FakeClient('gauge-a')
+    replica = Replica('gauge-a', client, probe=lambda: None, eject_after=1)
+    assert BACKEND_REPLICA_HEALTHY.value('gauge-a') == 1
+    client.circuit_open = True
+    assert BACKEND_REPLICA_HEALTHY.value('gauge-a') == 0
+    client.circuit_open = False
+    replica.record_call(requests.exceptions.ConnectionError())
+    assert BACKEND_REPLICA_HEALTHY.value('gauge-a') == 0
+
+
+def test_async_call_fails_over_on_a_connect_timeout():
+    replicas = AsyncBackendReplicaSet([FakeClient('a'), FakeClient('b')], session_state=None, eject_after=2)
+    session = ('app', 'user', 's1')
+    owner = replicas._choose(session)
+
+    async def call(client):
+        if client is owner.client:
+            raise aiohttp.ConnectionTimeoutError('connect timed out')
+        return 'ok'
+
+    replica, result = asyncio.run(replicas._call(session, call))
+    assert result == 'ok' and replica is not owner
+    assert owner.call_failures == 1
+
+
+def test_set_status_is_connected_while_a_replica_is_available():
+    replicas = BackendReplicaSet([FakeClient('a'), FakeClient('b')], session_state=None, eject_after=1)
+    assert replicas.status()["checked_at"] is None
+    first, second = replicas.replicas
+    first.record(RuntimeError('down'))
+    second.record()
+    status = replicas.status()
+    assert status["backend_connected"] and status["consecutive_failures"] == 0
+    assert status["last_error"] == 'RuntimeError: down'
+    second.record_call(requests.exceptions.ConnectionError())
+    assert not replicas.status()["backend_connected"]
@@ -0,0 +1,65 @@
+from gateway.response_cache import ResponseCache, normalize_question
+from gateway.session_registry import InMemorySessionRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalized_questions_share_an_entry():
+    assert normalize_question("What are the symptoms of FLU??") == normalize_question("what are the symptoms of flu")
+    assert ResponseCache.key('app', "Café?") == ResponseCache.key('app', "cafe")
+    assert ResponseCache.key('app', "flu") != ResponseCache.key('other', "flu")
+
+
+def test_only_first_turns_of_new_sessions_use_the_cache():
+    cache = ResponseCache(InMemorySessionRegistry())
+    cache.record_new_session('s1')
+    cache_key, cached = cache.lookup('app', 's1', "flu?")
+    assert cached is None
+    cache.record_turn('s1', cache_key, {"response": "rest", "events_count": 1})
+    assert cache.lookup('app', 's1', "flu?") == (None, None)
+    # A session the gateway did not just create (or has forgotten) may have context
+    assert cache.lookup('app', 's2', "Flu") == (None, None)
+    cache.record_new_session('s3')
+    assert cache.lookup('app', 's3', "Flu")[1] == {"response": "rest", "events_count": 1}
+
+
+def test_cached_first_turn_is_kept_for_the_agent_until_sent():
+    cache = ResponseCache(InMemorySessionRegistry())
+    cache.set(cache.key('app', "flu?"), {"response": "rest", "events_count": 1})
+    cache.record_new_session('s1')
+    assert cache.lookup('app', 's1', "Flu")[1] is not None
+    assert cache.pending_turn('s1') == "Flu"
+    # The next turn is not answered from the cache, but after the first one is sent
+    assert cache.lookup('app', 's1', "flu?") == (None, None)
+    cache.record_turn('s1')
+    assert cache.pending_turn('s1') is None
+
+
+def test_first_turns_are_asked_once_pending_ones_fill_the_registry():
+    cache = ResponseCache(InMemorySessionRegistry(max_size=1))
+    cache.set(cache.key('app', "flu?"), {"response": "rest", "events_count": 1})
+    cache.record_new_session('s1')
+    cache.lookup('app', 's1', "flu")
+    cache.record_new_session('s2')
+    assert cache.lookup('app', 's2', "flu")[1] is None
+    assert cache.pending_turn('s1') == "flu"
+
+
+def test_entries_expire_and_are_evicted_least_recently_used_first():
+    clock = FakeClock()
+    cache = ResponseCache(InMemorySessionRegistry(), max_size=2, ttl=10, clock=clock)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    clock.now = 11
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert (stats["evicted_lru"], stats["evicted_expired"]) == (1, 1)
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from gateway.session_queue import AsyncSessionQueue, SessionBusyError, SessionQueue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_turns_of_a_session_run_in_arrival_order():
+    queue = SessionQueue()
+    first = queue.enter('s')
+    order = []
+
+    def later(i):
+        turn = queue.enter('s')
+        order.append(i)
+        turn.release()
+
+    threads = []
+    for i in range(3):
+        threads.append(threading.Thread(target=later, args=(i,)))
+        threads[-1].start()
+        time.sleep(0.05)
+    assert order == []
+    first.release()
+    for thread in threads:
+        thread.join(5)
+    assert order == [0, 1, 2]
+    assert queue.stats()["sessions"] == 0
+
+
+def test_repeated_message_without_idempotency_key_runs_again():
+    queue = SessionQueue()
+    for _ in range(2):
+        turn = queue.enter('s')
+        assert not turn.deduplicated
+        turn.result = {"response": "yes"}
+        turn.release()
+    assert queue.executed == 2
+    assert queue.deduplicated == 0
+
+
+def test_retry_with_the_same_idempotency_key_shares_the_answer():
+    queue = SessionQueue()
+    turn = queue.enter('s', 'key-1')
+    shared = []
+    retry = threading.Thread(target=lambda: shared.append(queue.enter('s', 'key-1')))
+    retry.start()
+    time.sleep(0.05)
+    turn.result = {"response": "answer"}
+    turn.release()
+    retry.join(5)
+    assert shared[0].deduplicated
+    assert shared[0].result == {"response": "answer"}
+    assert not queue.enter('s', 'key-2').deduplicated
+
+
+def test_dedup_window_runs_from_the_original_arrival():
+    clock = FakeClock()
+    queue = SessionQueue(dedup_window=5.0, clock=clock)
+    turn = queue.enter('s', 'key')
+    clock.now = 4.0
+    turn.result = {"response": "answer"}
+    turn.release()
+    clock.now = 4.5
+    assert queue.enter('s', 'key').deduplicated
+    # 6 s after the original arrived, though only 2 s after it was answered
+    clock.now = 6.0
+    retry = queue.enter('s', 'key')
+    assert not retry.deduplicated
+    retry.release()
+    assert queue.stats()["recent_answers"] == 0
+
+
+def test_failed_turn_is_not_shared():
+    queue = SessionQueue()
+    queue.enter('s', 'key').release()
+    turn = queue.enter('s', 'key')
+    assert not turn.deduplicated
+    turn.release()
+
+
+def test_full_lane_is_rejected():
+    queue = SessionQueue(max_depth=0)
+    queue.enter('s')
+    with pytest.raises(SessionBusyError) as error:
+        queue.enter('s', timeout=0.1)
+    assert error.value.reason == 'full'
+
+
+def test_waiting_too_long_times_out_and_leaves_the_lane():
+    queue = SessionQueue()
+    first = queue.enter('s')
+    with pytest.raises(SessionBusyError) as error:
+        queue.enter('s', timeout=0.05)
+    assert error.value.reason == 'timeout'
+    first.release()
+    assert queue.stats()["sessions"] == 0
+
+
+def test_async_cancelled_waiter_does_not_block_the_turns_behind_it():
+    async def run():
+        queue = AsyncSessionQueue()
+        first = await queue.enter('s')
+        cancelled = asyncio.ensure_future(queue.enter('s'))
+        behind = asyncio.ensure_future(queue.enter('s'))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        first.release()
+        turn = await asyncio.wait_for(behind, 1)
+        turn.release()
+        return queue.stats()
+
+    stats = asyncio.run(run())
+    assert stats["sessions"] == 0
+    assert stats["abandoned"] == 1
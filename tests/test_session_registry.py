@@ -0,0 +1,96 @@
+import pytest
+
+from gateway.session_registry import InMemorySessionRegistry, RegistryFullError, SqliteSessionRegistry
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_registry(kind, tmp_path, max_size):
+    clock = FakeClock(1000.0)
+    if kind == 'memory':
+        registry = InMemorySessionRegistry(max_size=max_size, ttl=10, clock=clock)
+    else:
+        registry = SqliteSessionRegistry(
+            str(tmp_path / 'registry.db'), max_size=max_size, ttl=10, trim_interval=1, clock=clock
+        )
+    registry.clock = clock
+    return registry
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def registry(request, tmp_path):
+    return make_registry(request.param, tmp_path, max_size=1000)
+
+
+def test_bound_backend_session_ids(registry):
+    registry.add('a')
+    registry.add('b', 'pool-1')
+    assert registry.get('a') == ''
+    assert registry.get('b') == 'pool-1'
+    assert registry.get('c') is None
+    assert 'a' in registry and 'c' not in registry
+
+
+def test_entries_expire_after_the_ttl_unless_used(registry):
+    registry.add('a')
+    registry.add('b')
+    registry.clock.now += 8
+    assert 'a' in registry
+    registry.clock.now += 8
+    assert 'a' in registry
+    assert 'b' not in registry
+
+
+def test_pages_neither_skip_nor_repeat_keys_while_entries_are_used(registry):
+    keys = [f"app:user:s{i:03d}" for i in range(50)]
+    for key in keys:
+        registry.add(key)
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = registry.page(cursor, limit=7)
+        seen += page
+        # Live traffic touches entries between pages
+        for key in keys[::3]:
+            registry.get(key)
+        if cursor is None:
+            break
+    assert seen == sorted(keys)
+
+
+def test_memory_registry_evicts_least_recently_used():
+    registry = InMemorySessionRegistry(max_size=2, ttl=10, clock=FakeClock())
+    registry.add('a')
+    registry.add('b')
+    registry.get('a')
+    registry.add('c')
+    assert registry.get('b') is None
+    assert registry.get('a') == '' and registry.get('c') == ''
+    assert registry.stats()["evicted_lru"] == 1
+
+
+@pytest.mark.parametrize('kind', ['memory', 'sqlite'])
+def test_bindings_are_never_evicted_to_make_room(kind, tmp_path):
+    registry = make_registry(kind, tmp_path, max_size=2)
+    registry.add('a', 'pool-1')
+    registry.add('b', 'pool-2')
+    registry.add('c')
+    assert registry.get('a') == 'pool-1' and registry.get('b') == 'pool-2'
+    with pytest.raises(RegistryFullError):
+        registry.add('d', 'pool-3')
+    assert registry.get('d') is None
+    # Rebinding a bound key needs no room, and unused bindings still expire
+    registry.add('a', 'pool-1')
+    registry.clock.now += 8
+    registry.get('a')
+    registry.clock.now += 8
+    registry.add('d', 'pool-3')
+    assert registry.get('b') is None
+    assert registry.get('a') == 'pool-1' and registry.get('d') == 'pool-3'
+    assert registry.stats()["bound"] == 2
@@ -0,0 +1,34 @@
+import pytest
+
+from gateway.settings import Settings, SettingsError
+
+
+def test_mapping_overrides_some_keys_from_the_environment():
+    settings = Settings({"LEVELS": "gzip=5"})
+    assert settings.mapping("LEVELS", {"br": 4, "gzip": 6}, minimum=0) == {"br": 4, "gzip": 5}
+    settings.check()
+
+
+@pytest.mark.parametrize("raw", ["gzip=10", "br=12", "gzip=-1", "zstd=3"])
+def test_mapping_bounds_each_key(raw):
+    settings = Settings({"LEVELS": raw})
+    assert settings.mapping("LEVELS", {"br": 4, "gzip": 6}, minimum=0, maximum={"br": 11, "gzip": 9}) == {
+        "br": 4, "gzip": 6,
+    }
+    with pytest.raises(SettingsError):
+        settings.check()
+
+
+def test_problems_are_reported_together():
+    settings = Settings({"PORT": "http", "RATIO": "2.5", "MODE": "fast"})
+    settings.integer("PORT", 5000)
+    settings.number("RATIO", 1.0, maximum=1)
+    settings.choice("MODE", "asgi", ("asgi", "flask"))
+    with pytest.raises(SettingsError) as error:
+        settings.check()
+    assert len(error.value.problems) == 3
+
+
+def test_string_list_from_the_environment():
+    assert Settings({"URLS": " a, b,,c "}).string_list("URLS", []) == ["a", "b", "c"]
+    assert Settings({}).string_list("URLS", ["x"]) == ["x"]
@@ -0,0 +1,32 @@
+from gateway.traffic_capture import TrafficCapture
+
+
+class ListWriter:
+    path = 'memory'
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+
+def finish(capture, body):
+    capture.finish('/chat', 'POST', body, 200, 0.0, 0.01, [])
+    return capture.writer.records[-1]
+
+
+def test_chat_messages_are_redacted_by_default():
+    capture = TrafficCapture(ListWriter())
+    record = finish(capture, {"session_id": "s", "message": "I have chest pain"})
+    assert record["body"] == {"session_id": "s", "message": "x" * len("I have chest pain")}
+    assert record["redacted"] is True
+    record = finish(capture, {"session_id": "s"})
+    assert record["body"] == {"session_id": "s"} and "redacted" not in record
+
+
+def test_full_chat_text_is_kept_and_logged_at_startup(caplog):
+    capture = TrafficCapture(ListWriter(), chat_text='full')
+    assert "unredacted" in caplog.text
+    record = finish(capture, {"session_id": "s", "message": "I have chest pain"})
+    assert record["body"]["message"] == "I have chest pain"